@@ -2,7 +2,7 @@ import os
 import re
 import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from src.llm_client import get_chat_openai
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
@@ -15,7 +15,7 @@ except ImportError:
 
 # 1. ЗАГРУЗКА
 load_dotenv()
-llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
+llm = get_chat_openai(temperature=0, model="gpt-3.5-turbo")
 
 # --- ФУНКЦИЯ ПОИСКА (Инструмент) ---
 def run_search_tool(query):
@@ -0,0 +1,145 @@
+"""
+Адаптивная глубина (src.adaptive_depth.DepthPolicy) против фиксированной: попадание нужного чанка в контекст и задержка.
+
+Тот же путь, что в rag_production: векторная и ключевая ноги -> RRF -> Cross-Encoder по голове -> N чанков в GPT.
+    фиксированная  ноги по K, реранкинг головы, N чанков
+    адаптивная     ноги сразу по 2K (не больше MAX_K), решение по top-K векторных оценок, срез до K решения;
+                   confident — лидер первым, без реранкинга и confident_n чанков, flat — глубже (2K)
+Вопросы смоделированы: у каждого один нужный чанк среди пула, три типа вопросов
+    лёгкий   нужный чанк с явным отрывом по векторной близости
+    обычный  нужный чанк чуть выше остальных, место в топе случайно
+    трудный  векторные оценки плоские, нужный чанк глубоко; ключевая нога находит его выше
+Задержка считается по модели (мс), без sleep: ноги параллельно (rtt + на документ), реранкинг
+(вызов + на пару), разбор промпта GPT (на чанк). Попадание — нужный чанк среди N чанков контекста.
+
+Сначала сравнение при порогах по умолчанию и две строки-контроля:
+    без flat        K никогда не расширяется — сколько попадания даёт ветка flat
+    без flat, ноги по K  то же, но ноги возвращают K, а не 2K — сколько задержки стоит запас под flat
+затем каждый порог по отдельности (остальные по умолчанию): видно, где попадание начинает падать,
+а где выигрыш по задержке пропадает.
+
+Запуск:  python -m benchmarks.bench_adaptive_depth --questions 2000 --easy 0.4 --hard 0.2
+"""
+import argparse
+import inspect
+
+import numpy as np
+
+from src.adaptive_depth import DepthPolicy, leader_first
+from src.fusion import rrf_fusion
+
+DEFAULTS = {name: p.default for name, p in inspect.signature(DepthPolicy).parameters.items()
+            if name in ("margin", "min_top_score", "flat_entropy", "temperature")}
+SWEEP = {
+    "margin": [0.02, 0.04, 0.08, 0.12, 0.16],
+    "min_top_score": [0.35, 0.4, 0.45, 0.5, 0.55],
+    "flat_entropy": [0.6, 0.7, 0.8, 0.9],
+    "temperature": [0.02, 0.05, 0.1, 0.2],
+}
+
+
+def make_question(kind, pool, rng):
+    """(векторный список, ключевой список): документы {"id", "similarity"}, лучшие первыми; нужный — id 0."""
+    similarity = 0.35 + 0.03 * rng.standard_normal(pool)
+    if kind == "easy":
+        similarity[0] = similarity[1:].max() + rng.uniform(0.08, 0.25)
+        keyword_rank = rng.integers(0, 15)
+    elif kind == "normal":
+        similarity[0] = np.sort(similarity[1:])[-3] + rng.uniform(-0.02, 0.06)
+        keyword_rank = rng.integers(0, 15)
+    else:
+        similarity[0] = np.sort(similarity[1:])[-rng.integers(8, 30)]
+        keyword_rank = rng.integers(0, 6)
+    vector = [{"id": int(i), "similarity": float(similarity[i])} for i in np.argsort(-similarity)]
+    others = [int(i) for i in rng.permutation(np.arange(1, pool))]
+    keyword = [{"id": i} for i in others[:keyword_rank] + [0] + others[keyword_rank:]]
+    return vector, keyword
+
+
+def rerank(candidates, head, top_n, rng, noise):
+    """Cross-Encoder: нужный чанк оценивается выше остальных, но с шумом."""
+    head = candidates[:head]
+    scores = [(1.5 if doc["id"] == 0 else 0.0) + noise * rng.standard_normal() for doc in head]
+    return [head[i] for i in np.argsort(scores)[::-1][:top_n]]
+
+
+def answer(vector, keyword, decision, args, rng):
+    """(попал ли нужный чанк в контекст, задержка в мс) для готового решения о глубине."""
+    k, n = decision["k"], decision["n"]
+    candidates = rrf_fusion(vector[:k], keyword[:k])
+    if decision["action"] == "confident":
+        candidates = leader_first(candidates, vector[0])
+    if decision["rerank"]:
+        final = rerank(candidates, args.head, n, rng, args.rerank_noise)
+        rerank_ms = args.call_ms + args.pair_ms * min(args.head, len(candidates))
+    else:
+        final = candidates[:n]
+        rerank_ms = 0.0
+    return any(doc["id"] == 0 for doc in final), rerank_ms + args.chunk_ms * len(final)
+
+
+def run(questions, policy, args, seed, fetch_k=None):
+    """fetch_k — сколько документов возвращают ноги у адаптивной глубины (по умолчанию deep_k, как в rag_production)."""
+    rng = np.random.default_rng(seed)
+    hits, latency, actions = [], [], {}
+    for vector, keyword in questions:
+        if policy is None:
+            decision = {"action": "fixed", "k": args.k, "n": args.n, "rerank": True}
+            fetched = args.k
+        else:
+            decision = policy.decide([d["similarity"] for d in vector[:args.k]], args.k)
+            fetched = fetch_k or policy.deep_k(args.k)
+        hit, ms = answer(vector, keyword, decision, args, rng)
+        hits.append(hit)
+        latency.append(args.rtt_ms + args.doc_ms * fetched + ms)
+        actions[decision["action"]] = actions.get(decision["action"], 0) + 1
+    return np.mean(hits), np.array(latency), actions
+
+
+def row(name, hit_rate, latency, actions, total):
+    shares = ", ".join(f"{action} {count / total:.0%}" for action, count in sorted(actions.items()))
+    print(f"{name:<28} {hit_rate:>10.3f} {latency.mean():>10.1f} {np.percentile(latency, 95):>9.1f}   {shares}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--pool", type=int, default=60, help="Документов в корпусе на вопрос")
+    parser.add_argument("--easy", type=float, default=0.4, help="Доля лёгких вопросов")
+    parser.add_argument("--hard", type=float, default=0.2, help="Доля трудных вопросов")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-k", type=int, default=40)
+    parser.add_argument("--n", type=int, default=3)
+    parser.add_argument("--confident-n", type=int, default=2)
+    parser.add_argument("--head", type=int, default=10, help="Сколько кандидатов RRF видит Cross-Encoder")
+    parser.add_argument("--rerank-noise", type=float, default=0.5)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Сетевой обмен одной ноги")
+    parser.add_argument("--doc-ms", type=float, default=0.5, help="Время ноги на каждый возвращённый документ")
+    parser.add_argument("--call-ms", type=float, default=15.0, help="Накладные расходы на вызов Cross-Encoder")
+    parser.add_argument("--pair-ms", type=float, default=8.0, help="Cross-Encoder на одну пару")
+    parser.add_argument("--chunk-ms", type=float, default=40.0, help="Разбор промпта GPT на один чанк контекста")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    kinds = rng.choice(["easy", "normal", "hard"], size=args.questions,
+                       p=[args.easy, 1 - args.easy - args.hard, args.hard])
+    questions = [make_question(kind, args.pool, rng) for kind in kinds]
+
+    def policy(**overrides):
+        return DepthPolicy(base_k=args.k, max_k=args.max_k, base_n=args.n, confident_n=args.confident_n,
+                           **{**DEFAULTS, **overrides})
+
+    print(f"Вопросов {args.questions} (лёгких {args.easy:.0%}, трудных {args.hard:.0%}), K={args.k}, "
+          f"MAX_K={args.max_k}, N={args.n}, голова реранкинга {args.head}")
+    print(f"{'режим':<28} {'попадание':>10} {'среднее, мс':>10} {'p95, мс':>9}   решения")
+    row("фиксированная", *run(questions, None, args, seed=1), args.questions)
+    row("адаптивная (по умолчанию)", *run(questions, policy(), args, seed=1), args.questions)
+    no_flat = policy(flat_entropy=float("inf"))
+    row("  без flat", *run(questions, no_flat, args, seed=1), args.questions)
+    row("  без flat, ноги по K", *run(questions, no_flat, args, seed=1, fetch_k=args.k), args.questions)
+
+    print("\nПороги по одному (остальные по умолчанию, * — значение по умолчанию):")
+    for name, values in SWEEP.items():
+        for value in values:
+            mark = "*" if value == DEFAULTS[name] else " "
+            row(f"{mark} {name}={value}", *run(questions, policy(**{name: value}), args, seed=1), args.questions)
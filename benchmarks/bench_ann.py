@@ -0,0 +1,117 @@
+"""
+Бенчмарк режимов индекса (flat / hnsw / ivf / binary): recall@10 против запросов в секунду.
+
+Синтетический корпус (по умолчанию 1M x 384, кластеризованный, как реальные эмбеддинги)
+пишется в MmapVectorStore, индексы строятся и сохраняются рядом с ним.
+
+Запуск:  python -m benchmarks.bench_ann --n 1000000 --dim 384 --queries 200 --dir data/bench_ann
+"""
+import argparse
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from src.ann_index import open_index
+from src.mmap_store import MmapVectorStore
+
+# Сетка параметров поиска для каждого режима
+SEARCH_GRID = {
+    "flat": [{}],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+    "ivf": [{"nprobe": p} for p in (4, 8, 16, 32, 64)],
+    "binary": [{"rescore": r} for r in (5, 10, 20, 50)],
+}
+
+
+def synthetic(n, dim, n_clusters, rng, latent_dim=48):
+    """
+    Кластеры в пространстве малой размерности, спроецированные в dim:
+    у реальных эмбеддингов внутренняя размерность тоже намного меньше 384.
+    Генератор проекции фиксирован, чтобы корпус и запросы были из одного распределения.
+    """
+    structure = np.random.default_rng(0)
+    centers = structure.standard_normal((n_clusters, latent_dim)).astype(np.float32)
+    projection = structure.standard_normal((latent_dim, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    latent = centers[labels] + 0.5 * rng.standard_normal((n, latent_dim)).astype(np.float32)
+    vectors = latent @ projection + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_store(path, n, dim, n_clusters, batch=50_000):
+    store = MmapVectorStore(path, dim=dim, dtype="float16")
+    if store.count == n:
+        print(f"💾 Корпус уже на диске: {path}")
+        return store
+    print(f"🧪 Генерирую корпус {n} x {dim} в {path}...")
+    rng = np.random.default_rng(42)
+    for start in range(store.count, n, batch):
+        size = min(batch, n - start)
+        vectors = synthetic(size, dim, n_clusters, rng)
+        ids = [str(uuid.UUID(int=i)) for i in range(start, start + size)]
+        store.upsert(ids, vectors, [{"row": i} for i in range(start, start + size)])
+        print(f"   {start + size}/{n}")
+    return store
+
+
+def ground_truth(store, queries, k):
+    """Точный top-k для всех запросов за один проход по хранилищу."""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    block = 65536
+    for start in range(0, store.count, block):
+        end = min(start + block, store.count)
+        scores = queries @ np.asarray(store.vectors[start:end], dtype=np.float32).T
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), scores.shape)], axis=1)
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top, axis=1)
+        best_rows = np.take_along_axis(all_rows, top, axis=1)
+    return best_rows
+
+
+def index_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=list(SEARCH_GRID), choices=list(SEARCH_GRID))
+    parser.add_argument("--dir", default="data/bench_ann")
+    parser.add_argument("--flat-queries", type=int, default=20, help="Точный перебор медленный — меряем на части запросов")
+    args = parser.parse_args()
+
+    store = build_store(args.dir, args.n, args.dim, args.clusters)
+    queries = synthetic(args.queries, args.dim, args.clusters, np.random.default_rng(7))
+    truth = ground_truth(store, queries, args.k)
+
+    print(f"{'режим':<8} {'параметры':<18} {'recall@10':>10} {'QPS':>10} {'сборка, с':>10} {'на диске, МБ':>13}")
+    for mode in args.modes:
+        start = time.time()
+        try:
+            index = open_index(store, mode)
+        except ImportError as e:
+            print(f"{mode:<8} пропущен: {e}")
+            continue
+        build_sec = time.time() - start
+        size_mb = index_size(index.path) / 2**20
+
+        for params in SEARCH_GRID[mode]:
+            index.params.update(params)
+            n_queries = args.flat_queries if mode == "flat" else len(queries)
+            found = []
+            start = time.perf_counter()
+            for q in queries[:n_queries]:
+                rows, _ = index.search(q, k=args.k)
+                found.append(rows)
+            qps = n_queries / (time.perf_counter() - start)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth[:n_queries])])
+            label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{mode:<8} {label:<18} {recall:>10.3f} {qps:>10.1f} {build_sec:>10.1f} {size_mb:>13.1f}")
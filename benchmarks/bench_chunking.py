@@ -0,0 +1,152 @@
+"""
+Воспроизводимый бенчмарк стратегий чанкинга (fixed / recursive / tokens / semantic).
+
+Для каждой стратегии считает: скорость нарезки, время эмбеддинга, размер индекса,
+recall@k и MRR по эталону вопрос -> страницы, перцентили задержки запроса.
+Результат в CSV или JSON — удобно сравнивать между коммитами.
+
+Запуск:
+    python -m benchmarks.bench_chunking --pdf constitution.pdf --gold benchmarks/gold/constitution_qa.jsonl \
+        --embedder st --out bench_chunking.json
+"""
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import CharacterTextSplitter
+
+from src.splitter import split_documents, split_documents_semantic
+
+STRATEGIES = ["fixed", "recursive", "tokens", "semantic"]
+
+
+class SentenceTransformerEmbedder:
+    """all-MiniLM-L6-v2 локально, с тем же интерфейсом, что у Embeddings LangChain."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        from src.embedding_cache import cached_encoder
+        self.model = cached_encoder(SentenceTransformer(model_name), model_name)
+
+    def embed_documents(self, texts):
+        return self.model.encode(list(texts), batch_size=64).tolist()
+
+    def embed_query(self, text):
+        return self.model.encode(text).tolist()
+
+
+def load_embedder(name):
+    if name == "st":
+        return SentenceTransformerEmbedder()
+    from src.vectorstore import get_embeddings
+    return get_embeddings()
+
+
+def chunk(strategy, docs, embedder):
+    if strategy == "fixed":
+        # Как в chunking_lab: 1000 символов, без перекрытия, режем где попало
+        return CharacterTextSplitter(separator="", chunk_size=1000, chunk_overlap=0).split_documents(docs)
+    if strategy == "semantic":
+        return split_documents_semantic(docs, embeddings=embedder)
+    return split_documents(docs, mode=strategy)
+
+
+def percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def run(strategy, docs, gold, embedder, k, batch_size):
+    start = time.perf_counter()
+    chunks = chunk(strategy, docs, embedder)
+    chunk_sec = time.perf_counter() - start
+
+    texts = [c.page_content for c in chunks]
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embedder.embed_documents(texts[i:i + batch_size]))
+    embed_sec = time.perf_counter() - start
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    # PyPDFLoader нумерует страницы с 0, в эталоне — как в PDF, с 1
+    chunk_pages = np.array([c.metadata.get("page", 0) + 1 for c in chunks])
+
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for item in gold:
+        t = time.perf_counter()
+        query = np.asarray(embedder.embed_query(item["question"]), dtype=np.float32)
+        scores = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        top = top[np.argsort(-scores[top])]
+        latencies.append(time.perf_counter() - t)
+
+        relevant = np.isin(chunk_pages[top], item["pages"])
+        if relevant.any():
+            hits += 1
+            reciprocal_ranks.append(1.0 / (int(np.argmax(relevant)) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+
+    return {
+        "strategy": strategy,
+        "pages": len(docs),
+        "chunks": len(chunks),
+        "avg_chars": round(sum(map(len, texts)) / max(len(texts), 1), 1),
+        "chunk_sec": round(chunk_sec, 4),
+        "pages_per_sec": round(len(docs) / chunk_sec, 1) if chunk_sec else None,
+        "embed_sec": round(embed_sec, 4),
+        "chunks_per_sec": round(len(chunks) / embed_sec, 1) if embed_sec else None,
+        "index_bytes": int(matrix.nbytes),
+        "k": k,
+        "recall_at_k": round(hits / len(gold), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "latency_p50_ms": percentile_ms(latencies, 50),
+        "latency_p95_ms": percentile_ms(latencies, 95),
+        "latency_p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def save(results, path):
+    path = Path(path)
+    if path.suffix == ".csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="constitution.pdf")
+    parser.add_argument("--gold", default="benchmarks/gold/constitution_qa.jsonl")
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES, choices=STRATEGIES)
+    parser.add_argument("--embedder", choices=["ollama", "st"], default="ollama",
+                        help="ollama — all-minilm через Ollama, st — all-MiniLM-L6-v2 через sentence-transformers")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--out", help="Файл результата (.json или .csv)")
+    args = parser.parse_args()
+
+    docs = PyPDFLoader(args.pdf).load()
+    with open(args.gold, encoding="utf-8") as f:
+        gold = [json.loads(line) for line in f if line.strip()]
+    embedder = load_embedder(args.embedder)
+
+    results = [run(s, docs, gold, embedder, args.k, args.batch_size) for s in args.strategies]
+
+    columns = ["strategy", "chunks", "avg_chars", "pages_per_sec", "embed_sec", "index_bytes",
+               "recall_at_k", "mrr", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms"]
+    print(" | ".join(columns))
+    for r in results:
+        print(" | ".join(str(r[c]) for c in columns))
+    if args.out:
+        save(results, args.out)
+        print(f"💾 Результаты сохранены в {args.out}")
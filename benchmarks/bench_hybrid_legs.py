@@ -0,0 +1,71 @@
+"""
+Последовательные и параллельные ноги гибридного поиска против локальной заглушки RPC.
+
+Заглушка отвечает на match_documents и kw_match_documents с заданной задержкой,
+поэтому видно, что параллельный поиск стоит max(ноги), а не сумму.
+
+Запуск:  python -m benchmarks.bench_hybrid_legs --vector-latency 0.15 --keyword-latency 0.25 --timeout 1.0
+"""
+import argparse
+import time
+
+import numpy as np
+from supabase import create_client
+
+from benchmarks.stubs import start_stub, SupabaseStubHandler
+from src.retrieval import run_legs, format_leg_stats
+
+
+def make_legs(client):
+    vector = [0.0] * 384
+    return {
+        "vector": lambda: client.rpc("match_documents", {
+            "query_embedding": vector, "match_threshold": 0.1, "match_count": 10,
+        }).execute().data,
+        "keyword": lambda: client.rpc("kw_match_documents", {
+            "query_text": "Статья 10", "match_count": 10,
+        }).execute().data,
+    }
+
+
+def report(name, seconds):
+    ms = np.array(seconds) * 1000
+    print(f"{name:<14} среднее {ms.mean():8.1f} мс | p50 {np.percentile(ms, 50):8.1f} | p95 {np.percentile(ms, 95):8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vector-latency", type=float, default=0.15)
+    parser.add_argument("--keyword-latency", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=1.0, help="Таймаут ноги; меньше задержки — проверка деградации")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(SupabaseStubHandler, rpc_latency={
+        "match_documents": args.vector_latency,
+        "kw_match_documents": args.keyword_latency,
+    })
+    legs = make_legs(create_client(base_url, "stub.stub.stub"))
+
+    # Прогрев соединений
+    for fn in legs.values():
+        fn()
+
+    sequential, concurrent = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        for fn in legs.values():
+            fn()
+        sequential.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results, stats = run_legs(legs, timeout=args.timeout)
+        concurrent.append(time.perf_counter() - start)
+
+    print(f"Задержки заглушки: vector={args.vector_latency}s, keyword={args.keyword_latency}s "
+          f"(сумма {args.vector_latency + args.keyword_latency:.2f}s, максимум {max(args.vector_latency, args.keyword_latency):.2f}s)")
+    report("последовательно", sequential)
+    report("параллельно", concurrent)
+    print(f"Последний запуск: {format_leg_stats(stats)}; документов: "
+          + ", ".join(f"{k}={len(v)}" for k, v in results.items()))
+    server.shutdown()
@@ -0,0 +1,89 @@
+"""
+Полный реранкинг всех кандидатов против каскадного (src.rerank.CascadeReranker): p50/p95 задержки и совпадение топ-N.
+
+Cross-Encoder смоделирован: время = накладные расходы на вызов + время на пару
+(по умолчанию как у ms-marco-MiniLM-L-6-v2 на CPU), оценка = истинная релевантность + шум.
+Порядок RRF — та же релевантность с более сильным шумом, как у дешёвого этапа.
+Часть вопросов повторяется, чтобы был виден кеш оценок.
+
+Запуск:  python -m benchmarks.bench_rerank --questions 200 --candidates 20 --budget-ms 100 --head 10
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from src.rerank import CascadeReranker
+
+
+class SimulatedCrossEncoder:
+    def __init__(self, relevance, call_ms, pair_ms, noise=0.1):
+        self.relevance = relevance  # {текст документа: истинная релевантность}
+        self.call_ms = call_ms
+        self.pair_ms = pair_ms
+        self.noise = noise
+
+    def predict(self, pairs):
+        time.sleep((self.call_ms + self.pair_ms * len(pairs)) / 1000)
+        # Шум детерминирован по паре: повторная оценка даёт то же число
+        return [
+            self.relevance[text] + self.noise * random.Random(hash((question, text))).gauss(0, 1)
+            for question, text in pairs
+        ]
+
+
+def make_questions(n_questions, n_candidates, prior_noise, repeat, rng):
+    questions, relevance = [], {}
+    for q in range(n_questions):
+        if questions and rng.random() < repeat:
+            questions.append(questions[rng.integers(len(questions))])
+            continue
+        truth = rng.standard_normal(n_candidates)
+        docs = [{"id": f"q{q}-d{i}", "content": f"вопрос {q}, документ {i}"} for i in range(n_candidates)]
+        relevance.update({doc["content"]: float(t) for doc, t in zip(docs, truth)})
+        prior = truth + prior_noise * rng.standard_normal(n_candidates)
+        questions.append((f"вопрос {q}", [docs[i] for i in np.argsort(-prior)]))
+    return questions, relevance
+
+
+def percentile(values, p):
+    return float(np.percentile(np.array(values) * 1000, p))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=20, help="Кандидатов после RRF")
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--head", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--call-ms", type=float, default=5.0, help="Накладные расходы на вызов predict")
+    parser.add_argument("--pair-ms", type=float, default=4.0, help="Время на одну пару")
+    parser.add_argument("--prior-noise", type=float, default=0.7, help="Насколько RRF хуже Cross-Encoder")
+    parser.add_argument("--repeat", type=float, default=0.2, help="Доля повторных вопросов")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    questions, relevance = make_questions(args.questions, args.candidates, args.prior_noise, args.repeat, rng)
+    model = SimulatedCrossEncoder(relevance, args.call_ms, args.pair_ms)
+    cascade = CascadeReranker(model, head_size=args.head, budget_ms=args.budget_ms, batch_size=args.batch)
+
+    full_times, cascade_times, overlaps, budget_hits = [], [], [], 0
+    for question, candidates in questions:
+        start = time.perf_counter()
+        scores = model.predict([[question, doc["content"]] for doc in candidates])
+        full_top = [candidates[i]["id"] for i in np.argsort(scores)[::-1][:args.top_n]]
+        full_times.append(time.perf_counter() - start)
+
+        ranked, info = cascade.rerank(question, candidates, top_n=args.top_n)
+        cascade_times.append(info["seconds"])
+        budget_hits += info["budget_hit"]
+        overlaps.append(len(set(full_top) & {item["doc"]["id"] for item in ranked}) / args.top_n)
+
+    print(f"{'режим':<10} {'p50, мс':>9} {'p95, мс':>9} {'совпадение топ-' + str(args.top_n):>18}")
+    print(f"{'полный':<10} {percentile(full_times, 50):>9.1f} {percentile(full_times, 95):>9.1f} {1.0:>18.3f}")
+    print(f"{'каскад':<10} {percentile(cascade_times, 50):>9.1f} {percentile(cascade_times, 95):>9.1f} "
+          f"{np.mean(overlaps):>18.3f}")
+    print(f"Бюджет исчерпан в {budget_hits}/{len(questions)} вопросах, пар в кеше: {len(cascade.cache)}")
@@ -0,0 +1,77 @@
+"""
+Шардированный поиск (src/sharded_search.py): QPS и p99 в зависимости от числа шардов.
+
+Корпус тот же, что у bench_ann (синтетический, в MmapVectorStore; уже сгенерированный переиспользуется).
+Для каждого числа шардов два замера:
+    последовательно   один запрос за раз — задержка одного вопроса (p50 / p99)
+    под нагрузкой     --concurrency потоков-клиентов — пропускная способность (QPS) и p99
+Точность сверяется с точным top-k в одном процессе: при полных ответах шардов совпадение 1.000.
+
+Запуск:  python -m benchmarks.bench_sharded --n 2000000 --shards 1 2 4 8 --dir data/bench_ann
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.bench_ann import build_store, synthetic
+from src.sharded_search import ShardedSearch, search_range
+
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def timed(fn, query):
+    start = time.perf_counter()
+    rows = fn(query)
+    return rows, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({s for s in (1, 2, 4, 8, 16, cpus) if s <= cpus}))
+    parser.add_argument("--concurrency", type=int, default=16, help="Потоков-клиентов в замере под нагрузкой")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Таймаут шарда, с")
+    parser.add_argument("--dir", default="data/bench_ann")
+    args = parser.parse_args()
+
+    store = build_store(args.dir, args.n, args.dim, args.clusters)
+    queries = synthetic(args.queries, args.dim, args.clusters, np.random.default_rng(7))
+
+    # Без шардов: тот же точный перебор в текущем процессе
+    single = lambda q: search_range(store, q[None], [args.k], 0, store.count)[0][0]
+    truth, seconds = zip(*(timed(single, q) for q in queries))
+    p50, p99 = percentiles(seconds)
+    print(f"Корпус {store.count} x {store.dim}, запросов {len(queries)}, K={args.k}, ядер {cpus}")
+    print(f"{'шарды':>6} {'p50, мс':>9} {'p99, мс':>9} {'QPS':>9} {'p99 под нагр.':>14} {'совпадение':>11} {'частичных':>10}")
+    print(f"{'-':>6} {p50:>9.1f} {p99:>9.1f} {1 / np.mean(seconds):>9.1f} {'-':>14} {1.0:>11.3f} {'-':>10}")
+
+    for shards in args.shards:
+        with ShardedSearch(args.dir, shards, timeout=args.timeout) as sharded:
+            search = lambda q: sharded.search_rows(q, k=args.k)[0]
+            for q in queries[:5]:
+                search(q)  # Прогрев: страницы в page cache, воркеры запущены
+
+            found, seconds = zip(*(timed(search, q) for q in queries))
+            p50, p99 = percentiles(seconds)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                loaded = list(pool.map(lambda q: timed(search, q), np.repeat(queries, 2, axis=0)))
+            qps = len(loaded) / (time.perf_counter() - start)
+            _, load_p99 = percentiles([s for _, s in loaded])
+
+            overlap = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            partial = sharded.counters["partial"]
+        print(f"{shards:>6} {p50:>9.1f} {p99:>9.1f} {qps:>9.1f} {load_p99:>14.1f} {overlap:>11.3f} {partial:>10}")
@@ -0,0 +1,54 @@
+"""
+Микро-бенчмарк: RecursiveCharacterTextSplitter (символы) против чанкинга по токенам.
+
+Запуск:  python -m benchmarks.bench_splitter --pdf constitution.pdf --pages 1000
+"""
+import argparse
+import time
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+from src.config import CHUNK_TOKENS
+from src.splitter import split_documents, get_tokenizer
+
+
+def make_corpus(pdf_path, n_pages):
+    """Повторяет страницы PDF, пока не наберётся n_pages."""
+    pages = PyPDFLoader(pdf_path).load()
+    return [
+        Document(page_content=pages[i % len(pages)].page_content, metadata={"source": pdf_path, "page": i})
+        for i in range(n_pages)
+    ]
+
+
+def measure(mode, docs, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = split_documents(docs, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return chunks, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="constitution.pdf")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = make_corpus(args.pdf, args.pages)
+    tokenizer = get_tokenizer()
+    page_tokens = sum(len(e.ids) for e in tokenizer.encode_batch([d.page_content for d in docs], add_special_tokens=False))
+
+    print(f"📚 Корпус: {len(docs)} стр., {page_tokens} токенов, лимит модели {CHUNK_TOKENS} токенов на чанк")
+    print(f"{'режим':<10} {'сек/100 стр':>12} {'чанков':>8} {'ср. токенов':>12} {'обрезано чанков':>16} "
+          f"{'потеряно токенов':>17} {'эмбеддится токенов':>19}")
+    for mode in ["recursive", "tokens"]:
+        chunks, seconds = measure(mode, docs, args.repeats)
+        lengths = [len(e.ids) for e in tokenizer.encode_batch([c.page_content for c in chunks], add_special_tokens=False)]
+        truncated = sum(1 for n in lengths if n > CHUNK_TOKENS)
+        lost = sum(n - CHUNK_TOKENS for n in lengths if n > CHUNK_TOKENS)
+        embedded = sum(min(n, CHUNK_TOKENS) for n in lengths)
+        print(f"{mode:<10} {seconds / len(docs) * 100:>12.4f} {len(chunks):>8} {sum(lengths) / len(lengths):>12.1f} "
+              f"{truncated / len(chunks):>15.1%} {lost / sum(lengths):>16.1%} {embedded / page_tokens:>18.2f}x")
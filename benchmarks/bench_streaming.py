@@ -0,0 +1,54 @@
+"""
+Стриминг ответа RAG-чата против локальной заглушки Ollama: время до первого токена, токены/сек, полное время.
+
+Заглушка отдаёт заранее заданные токены с паузами, эмбеддинги — детерминированные,
+поиск идёт по нескольким страницам в памяти. Проверяется вся цепочка src.rag_chain
+с настоящим OllamaLLM, но без модели и без Chroma.
+
+Запуск:  python -m benchmarks.bench_streaming --latency 0.4 --token-latency 0.03 --questions 5
+"""
+import argparse
+import os
+
+from benchmarks.stubs import start_stub, OllamaStubHandler
+
+PAGES = [
+    "Единственным источником государственной власти является народ.",
+    "Республика Казахстан является унитарным государством с президентской формой правления.",
+    "Государственным языком Республики Казахстан является казахский язык.",
+]
+
+QUESTIONS = [
+    "Кто является источником власти?",
+    "Какая форма правления?",
+    "Какой язык государственный?",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.4, help="Задержка до первого токена, сек")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Пауза между токенами, сек")
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS))
+    args = parser.parse_args()
+
+    server, base_url = start_stub(OllamaStubHandler, latency=args.latency, token_latency=args.token_latency)
+    # Адрес Ollama читается в src.config при импорте
+    os.environ["OLLAMA_BASE_URL"] = base_url
+
+    from langchain_core.documents import Document
+    from langchain_core.vectorstores import InMemoryVectorStore
+    from src.rag_chain import create_rag_chain, stream_answer_with_sources
+    from src.vectorstore import get_embeddings
+
+    docs = [Document(page_content=text, metadata={"page": i + 1}) for i, text in enumerate(PAGES)]
+    retriever = InMemoryVectorStore.from_documents(docs, get_embeddings()).as_retriever(search_kwargs={"k": 2})
+    chain, _ = create_rag_chain(retriever)
+
+    print(f"{'вопрос':<36} {'TTFT, с':>8} {'ток/с':>8} {'токенов':>8} {'всего, с':>9}")
+    for i in range(args.questions):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        _, _, timings = stream_answer_with_sources(chain, question)
+        print(f"{question[:36]:<36} {timings['ttft']:>8.3f} {timings['tokens_per_sec']:>8.1f} "
+              f"{timings['tokens']:>8} {timings['total']:>9.3f}")
+    server.shutdown()
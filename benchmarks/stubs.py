@@ -0,0 +1,277 @@
+"""
+Локальные заглушки внешних сервисов для замеров без сети.
+
+Запуск:  python -m benchmarks.stubs supabase --port 54321 --latency 0.05 --fail-rate 0.1
+Потом:   SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=stub.stub.stub python ingest_supabase.py
+
+         python -m benchmarks.stubs ollama --port 11435 --latency 0.5 --token-latency 0.03
+Потом:   OLLAMA_BASE_URL=http://127.0.0.1:11435 python -m src.main_rag
+
+         python -m benchmarks.stubs openai --port 8008 --latency 0.3 --throttle-rate 0.1
+Потом:   OPENAI_BASE_URL=http://127.0.0.1:8008/v1 OPENAI_API_KEY=stub python rag_production.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # Заполняется в фабрике: latency, fail_rate, stats
+    server_config = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Клиент не дождался ответа (таймаут, отменённый хедж)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else None
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _simulate(self, latency=None):
+        """Задержка сети и случайные 503, как у перегруженного API."""
+        cfg = self.server_config
+        latency = cfg.get("latency", 0.0) if latency is None else latency
+        if latency:
+            time.sleep(latency)
+        if random.random() < cfg.get("fail_rate", 0.0):
+            self._send_json(503, {"message": "stub: service unavailable"})
+            return False
+        return True
+
+
+class SupabaseStubHandler(_StubHandler):
+    """
+    PostgREST-подобный эндпоинт:
+    POST /rest/v1/<table> считает вставленные строки,
+    POST /rest/v1/rpc/<функция> отвечает фиктивными документами с задержкой rpc_latency[функция].
+    """
+
+    def do_POST(self):
+        payload = self._read_json()
+        cfg = self.server_config
+        stats = cfg["stats"]
+        if self.path.startswith("/rest/v1/rpc/"):
+            name = self.path.rsplit("/", 1)[-1].split("?")[0]
+            if not self._simulate(cfg.get("rpc_latency", {}).get(name)):
+                return
+            count = int((payload or {}).get("match_count", 5))
+            self._send_json(200, [
+                {
+                    "id": f"{name}-{i}",
+                    "content": f"Фиктивный документ {i} от {name}",
+                    "metadata": {"page": i},
+                    "similarity": round(0.9 - 0.05 * i, 3),
+                }
+                for i in range(count)
+            ])
+            return
+        if not self._simulate():
+            return
+        rows = payload if isinstance(payload, list) else [payload]
+        with stats["lock"]:
+            stats["requests"] += 1
+            stats["rows"] += len(rows)
+        self._send_json(201, [])
+
+
+class OllamaStubHandler(_StubHandler):
+    """
+    Ollama API:
+    POST /api/generate и /api/chat стримят заранее заданные токены (NDJSON, как настоящий сервер):
+    первый — через latency, следующие — через token_latency;
+    POST /api/embed возвращает детерминированные векторы (по хешу текста), размерность embed_dim.
+    """
+
+    DEFAULT_TOKENS = ["Согласно ", "документу", ", ", "единственным ", "источником ", "власти ",
+                      "является ", "народ", "."]
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self._send_json(200, {"models": []})
+        elif self.path.startswith("/api/version"):
+            self._send_json(200, {"version": "stub"})
+        else:
+            self._send_json(404, {"error": "stub: not found"})
+
+    def do_POST(self):
+        payload = self._read_json() or {}
+        cfg = self.server_config
+        path = self.path.split("?")[0]
+        if path == "/api/embed":
+            if not self._simulate(cfg.get("embed_latency", 0.0)):
+                return
+            texts = payload.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send_json(200, {"model": payload.get("model"), "embeddings": [self._embed(t) for t in texts]})
+            return
+        if path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "stub: not found"})
+            return
+        if not self._simulate():
+            return
+
+        tokens = cfg.get("tokens") or self.DEFAULT_TOKENS
+        with cfg["stats"]["lock"]:
+            cfg["stats"]["requests"] += 1
+            cfg["stats"]["rows"] += len(tokens)
+
+        def chunk(text, done):
+            body = {"model": payload.get("model"), "created_at": "1970-01-01T00:00:00Z", "done": done}
+            if path == "/api/chat":
+                body["message"] = {"role": "assistant", "content": text}
+            else:
+                body["response"] = text
+            if done:
+                body.update(done_reason="stop", eval_count=len(tokens), prompt_eval_count=0)
+            return body
+
+        if payload.get("stream", True) is False:
+            self._send_json(200, chunk("".join(tokens), True))
+            return
+
+        # HTTP/1.0 без Content-Length: тело читается до закрытия соединения, строки уходят сразу
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i and cfg.get("token_latency"):
+                time.sleep(cfg["token_latency"])
+            self._write_line(chunk(token, False))
+        self._write_line(chunk("", True))
+
+    def _write_line(self, body):
+        self.wfile.write((json.dumps(body, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _embed(self, text):
+        dim = self.server_config.get("embed_dim", 384)
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        rng = random.Random(seed)
+        return [rng.gauss(0.0, 1.0) for _ in range(dim)]
+
+
+class OpenAIStubHandler(_StubHandler):
+    """
+    OpenAI-совместимый /v1/chat/completions:
+    отвечает через latency (доля slow_rate запросов — через slow_latency, "хвост" задержек),
+    доля throttle_rate получает 429 с Retry-After, доля fail_rate — 503.
+    stream=true отдаётся как SSE (data: {...}), иначе JSON с usage.
+    """
+
+    def do_POST(self):
+        payload = self._read_json() or {}
+        cfg = self.server_config
+        if self.path.split("?")[0] not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "stub: not found"}})
+            return
+        with cfg["stats"]["lock"]:
+            cfg["stats"]["requests"] += 1
+        if random.random() < cfg.get("throttle_rate", 0.0):
+            data = json.dumps({"error": {"message": "stub: rate limit", "type": "rate_limit_exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Retry-After", str(cfg.get("retry_after", 0.05)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        slow = random.random() < cfg.get("slow_rate", 0.0)
+        if not self._simulate(cfg.get("slow_latency", 1.0) if slow else None):
+            return
+
+        tokens = cfg.get("tokens") or OllamaStubHandler.DEFAULT_TOKENS
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in payload.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        with cfg["stats"]["lock"]:
+            cfg["stats"]["rows"] += len(tokens)
+        base = {"id": "chatcmpl-stub", "created": 0, "model": payload.get("model", "stub")}
+
+        if not payload.get("stream"):
+            self._send_json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "".join(tokens)},
+            }]})
+            return
+
+        # SSE до закрытия соединения (HTTP/1.0), как стрим у OpenAI
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i and cfg.get("token_latency"):
+                time.sleep(cfg["token_latency"])
+            self._write_event({**base, "object": "chat.completion.chunk", "choices": [{
+                "index": 0, "finish_reason": None, "delta": {"content": token},
+            }]})
+        self._write_event({**base, "object": "chat.completion.chunk", "choices": [{
+            "index": 0, "finish_reason": "stop", "delta": {},
+        }]})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _write_event(self, body):
+        self.wfile.write(("data: " + json.dumps(body, ensure_ascii=False) + "\n\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+def start_stub(handler_cls, port=0, **config):
+    """
+    Запускает заглушку в фоновом потоке.
+    Возвращает (server, base_url); остановка — server.shutdown().
+    """
+    config.setdefault("stats", {"lock": threading.Lock(), "requests": 0, "rows": 0})
+    handler = type(handler_cls.__name__, (handler_cls,), {"server_config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+STUBS = {
+    "supabase": SupabaseStubHandler,
+    "ollama": OllamaStubHandler,
+    "openai": OpenAIStubHandler,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальные заглушки для бенчмарков")
+    parser.add_argument("stub", choices=sorted(STUBS))
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, сек")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="ollama/openai: пауза между токенами, сек")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="openai: доля ответов 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="openai: доля медленных ответов")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="openai: задержка медленного ответа, сек")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(STUBS[args.stub], args.port, latency=args.latency, fail_rate=args.fail_rate,
+                                  token_latency=args.token_latency, throttle_rate=args.throttle_rate,
+                                  slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"🧪 Заглушка '{args.stub}' слушает {base_url} (Ctrl+C для выхода)")
+    try:
+        while True:
+            time.sleep(5)
+            stats = server.RequestHandlerClass.server_config["stats"]
+            print(f"   запросов: {stats['requests']}, строк: {stats['rows']}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,12 +1,15 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from src.backends import get_client
 from sentence_transformers import SentenceTransformer
+from src.embedding_cache import cached_encoder
+from src.fusion import rrf_fusion  # ФУНКЦИЯ 3: RRF (Слияние результатов)
 
 # 1. Настройки
 load_dotenv()
-supabase: Client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Supabase, локальный индекс в памяти процесса (RETRIEVAL_BACKEND=local) или Postgres напрямую (postgres)
+supabase = get_client()
+model = cached_encoder(SentenceTransformer("all-MiniLM-L6-v2"), "all-MiniLM-L6-v2")
 
 # --- ФУНКЦИЯ 1: Векторный поиск (По смыслу) ---
 def search_vectors(query):
@@ -26,34 +29,6 @@ def search_keywords(query):
     }).execute()
     return response.data if response.data else []
 
-# --- ФУНКЦИЯ 3: RRF (Слияние результатов) ---
-def rrf_fusion(semantic_results, keyword_results, k=60):
-    fused_scores = {}
-    doc_content = {} 
-
-    # Обрабатываем векторные результаты
-    for rank, doc in enumerate(semantic_results):
-        doc_id = doc['id']
-        doc_content[doc_id] = doc 
-        if doc_id not in fused_scores: fused_scores[doc_id] = 0
-        fused_scores[doc_id] += 1 / (rank + k)
-
-    # Обрабатываем ключевые результаты
-    for rank, doc in enumerate(keyword_results):
-        doc_id = doc['id']
-        doc_content[doc_id] = doc
-        if doc_id not in fused_scores: fused_scores[doc_id] = 0
-        fused_scores[doc_id] += 1 / (rank + k)
-
-    # Сортировка
-    sorted_ids = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    final_results = []
-    for doc_id, score in sorted_ids:
-        final_results.append(doc_content[doc_id])
-    
-    return final_results
-
 # --- ЗАПУСК ---
 if __name__ == "__main__":
     # Тест: ищем точное совпадение "Статья 10"
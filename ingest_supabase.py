@@ -1,25 +1,109 @@
 import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from src.backends import get_client
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
+from src.embedding_cache import cached_encoder, all_stats as embed_cache_stats
 
 # 1. Загружаем ключи из .env
 load_dotenv()
 url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
+backend = os.environ.get("RETRIEVAL_BACKEND", "supabase")
 
-if not url or not key:
+if backend == "supabase" and (not url or not key):
     print("❌ Ошибка: Не найдены ключи в файле .env!")
     exit()
 
-# 2. Подключаемся к Supabase
-supabase: Client = create_client(url, key)
+# 2. Подключаемся к Supabase (или к локальному индексу: RETRIEVAL_BACKEND=local)
+supabase = get_client(backend)
 
 # 3. Настройки (Файл и Модель)
 PDF_PATH = "constitution.pdf"
 MODEL_NAME = "all-MiniLM-L6-v2"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# 4. Настройки загрузки (можно переопределить в .env)
+ENCODE_BATCH_SIZE = int(os.environ.get("INGEST_ENCODE_BATCH", 64))    # Сколько текстов за один вызов encode
+UPLOAD_BATCH_SIZE = int(os.environ.get("INGEST_UPLOAD_BATCH", 200))   # Сколько строк в одном insert
+UPLOAD_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", 4))     # Сколько insert-запросов одновременно
+MAX_RETRIES = int(os.environ.get("INGEST_MAX_RETRIES", 5))
+CHECKPOINT_PATH = os.environ.get("INGEST_CHECKPOINT", "ingest_checkpoint.json")
+# Версия корпуса: по её смене rag_production.py сбрасывает кеш ответов
+CORPUS_VERSION_FILE = os.environ.get("CORPUS_VERSION_FILE", "corpus_version.txt")
+
+
+def file_fingerprint(path):
+    """Отпечаток файла + настроек: если что-то поменялось, старый чекпоинт не годится."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(f"{MODEL_NAME}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{UPLOAD_BATCH_SIZE}".encode())
+    return h.hexdigest()
+
+
+def load_checkpoint(fingerprint):
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("fingerprint") == fingerprint:
+            return checkpoint
+        print("⚠️ Чекпоинт от другого файла/настроек — начинаю заново.")
+    return {"fingerprint": fingerprint, "done": []}
+
+
+def save_checkpoint(checkpoint):
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def row_id(chunk) -> int:
+    """
+    Стабильный id строки (60 бит, влезает в bigint): источник, страница, смещение и текст чанка.
+    Повторная отправка той же пачки даёт те же id, и upsert не создаёт дублей.
+    """
+    meta = chunk.metadata
+    key = f"{meta.get('source')}|{meta.get('page')}|{meta.get('start_index')}|{chunk.page_content}"
+    return int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def upsert_with_retry(rows):
+    """
+    Один upsert в Supabase с повторами (экспоненциальная пауза + джиттер).
+    Идемпотентен: если первая попытка записала строки, а ответ потерялся, повтор их не задублирует.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            supabase.table("documents").upsert(rows, ignore_duplicates=True).execute()
+            return
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = min(30, 0.5 * 2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️ Ошибка загрузки ({type(e).__name__}: {str(e)[:80]}), повтор через {delay:.1f} сек...")
+            time.sleep(delay)
+
+
+def finish_ingest(fingerprint):
+    """Всё загружено — чекпоинт больше не нужен, а закешированные ответы устарели."""
+    if hasattr(supabase, "compact"):
+        supabase.compact()  # Локальный индекс: сегменты пачек -> один
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    with open(CORPUS_VERSION_FILE, "w", encoding="utf-8") as f:
+        f.write(fingerprint)
+
 
 def ingest_data():
     print(f"📄 Читаю файл: {PDF_PATH}")
@@ -30,32 +114,84 @@ def ingest_data():
     # Загрузка и нарезка
     loader = PyPDFLoader(PDF_PATH)
     docs = loader.load()
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+    # start_index в metadata: по нему соседние найденные чанки склеиваются без повтора перекрытия
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True)
     chunks = splitter.split_documents(docs)
     print(f"🧩 Нарезано на {len(chunks)} частей.")
 
-    # Векторизация
-    print("🧠 Генерирую векторы...")
-    model = SentenceTransformer(MODEL_NAME)
-    
-    # Готовим данные для отправки
-    data_to_upload = []
-    for chunk in chunks:
-        text = chunk.page_content
-        vector = model.encode(text).tolist() # Превращаем в список [0.1, -0.5...]
-        
-        data_to_upload.append({
-            "content": text,
-            "metadata": chunk.metadata,
-            "embedding": vector
-        })
-
-    # Отправка в Supabase
-    print("☁️ Загружаю в облако Supabase...")
-    response = supabase.table("documents").insert(data_to_upload).execute()
-    
+    # Делим на пачки для загрузки и проверяем, что уже было загружено
+    fingerprint = file_fingerprint(PDF_PATH)
+    checkpoint = load_checkpoint(fingerprint)
+    done = set(checkpoint["done"])
+    batches = [chunks[i:i + UPLOAD_BATCH_SIZE] for i in range(0, len(chunks), UPLOAD_BATCH_SIZE)]
+    pending = [i for i in range(len(batches)) if i not in done]
+    if done:
+        print(f"⏩ Продолжаю с чекпоинта: {len(done)}/{len(batches)} пачек уже в облаке.")
+    if not pending:
+        finish_ingest(fingerprint)
+        print("✅ Всё уже загружено.")
+        return
+
+    # Векторизация + отправка: пока одна пачка кодируется, предыдущие уже летят в Supabase
+    print(f"🧠 Генерирую векторы и загружаю в облако ({len(pending)} пачек по {UPLOAD_BATCH_SIZE})...")
+    model = cached_encoder(SentenceTransformer(MODEL_NAME), MODEL_NAME)
+
+    lock = threading.Lock()
+    stats = {"encode_time": 0.0, "encoded": 0, "upload_time": 0.0, "uploaded": 0}
+
+    def upload(batch_index, rows):
+        t = time.time()
+        upsert_with_retry(rows)
+        with lock:
+            stats["upload_time"] += time.time() - t
+            done.add(batch_index)
+            checkpoint["done"] = sorted(done)
+            save_checkpoint(checkpoint)
+            stats["uploaded"] += len(rows)
+
+    upload_start = time.time()
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as pool:
+        for batch_index in pending:
+            batch = batches[batch_index]
+            texts = [chunk.page_content for chunk in batch]
+
+            t = time.time()
+            vectors = model.encode(texts, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+            stats["encode_time"] += time.time() - t
+            stats["encoded"] += len(texts)
+
+            rows = [
+                {"id": row_id(chunk), "content": text, "metadata": chunk.metadata, "embedding": vector.tolist()}
+                for text, chunk, vector in zip(texts, batch, vectors)
+            ]
+
+            # Ограничиваем число пачек в полёте, чтобы не держать всё в памяти
+            if len(in_flight) >= UPLOAD_CONCURRENCY * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+            in_flight.add(pool.submit(upload, batch_index, rows))
+
+        for future in in_flight:
+            future.result()
+    total_time = time.time() - upload_start
+
+    # Отчёт о пропускной способности
+    encode_rate = stats["encoded"] / stats["encode_time"] if stats["encode_time"] else 0.0
+    upload_rate = stats["uploaded"] / stats["upload_time"] if stats["upload_time"] else 0.0
+    print("📊 Пропускная способность:")
+    print(f"   Encode: {stats['encoded']} чанков за {stats['encode_time']:.2f} сек ({encode_rate:.1f} чанков/сек)")
+    print(f"   Upload: {stats['uploaded']} чанков за {stats['upload_time']:.2f} сек запросов "
+          f"({upload_rate:.1f} чанков/сек на поток, потоков: {UPLOAD_CONCURRENCY})")
+    print(f"   Всего: {total_time:.2f} сек ({stats['uploaded'] / total_time:.1f} чанков/сек)")
+    for cache_stats in embed_cache_stats():
+        print(f"   Кеш эмбеддингов {cache_stats['model']}: hits={cache_stats['hits']} misses={cache_stats['misses']} "
+              f"({cache_stats['hit_rate']:.0%})")
+
+    finish_ingest(fingerprint)
     print("✅ Успешно! Данные теперь в облаке.")
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    ingest_data()
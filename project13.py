@@ -3,11 +3,11 @@ import re
 import datetime
 import math
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from src.llm_client import get_chat_openai
 
 # 1. ЗАГРУЗКА
 load_dotenv()
-llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
+llm = get_chat_openai(temperature=0, model="gpt-3.5-turbo")
 
 # --- ИНСТРУМЕНТЫ (TOOLS) ---
 
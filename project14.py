@@ -1,13 +1,13 @@
 import os
 import time
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from src.llm_client import get_chat_openai
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 # 1. ЗАГРУЗКА
 load_dotenv()
-llm = ChatOpenAI(temperature=0.7, model="gpt-3.5-turbo") # Температура повыше для креатива
+llm = get_chat_openai(temperature=0.7, model="gpt-3.5-turbo") # Температура повыше для креатива
 
 # --- РОЛИ (УЗЛЫ ГРАФА) ---
 
@@ -2,7 +2,9 @@ import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from src.embedding_cache import cached_encoder
+from src.llm_client import get_openai_client
+from src.context_packer import pack_context, format_stats
 
 # 1. Загрузка настроек
 load_dotenv()
@@ -13,10 +15,13 @@ supabase_key = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(supabase_url, supabase_key)
 
 # Настраиваем OpenAI (ChatGPT)
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+openai_client = get_openai_client()  # Общий пул, лимиты RPM/TPM, повторы на 429/5xx
 
 # Настраиваем модель для поиска (та же, что и при загрузке)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = cached_encoder(SentenceTransformer("all-MiniLM-L6-v2"), "all-MiniLM-L6-v2")
+
+GPT_MODEL = "gpt-3.5-turbo"
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", 3000))  # Бюджет контекста для GPT, токенов
 
 def ask_bot(question):
     print(f"\n🤔 Вы спросили: {question}")
@@ -33,7 +38,10 @@ def ask_bot(question):
     # Собираем контекст
     context_text = ""
     if response.data:
-        for doc in response.data:
+        # Склеиваем перекрывающиеся чанки и укладываемся в бюджет токенов
+        packed_docs, context_stats = pack_context(response.data, budget_tokens=CONTEXT_TOKENS, model=GPT_MODEL)
+        print(f"✂️ Контекст: {format_stats(context_stats)}")
+        for doc in packed_docs:
             context_text += doc['content'] + "\n---\n"
     else:
         context_text = "Информации в базе не найдено."
@@ -53,7 +61,7 @@ def ask_bot(question):
                 "content": f"Контекст:\n{context_text}\n\nВопрос: {question}"
             }
         ],
-        model="gpt-3.5-turbo", # Это дешевая и быстрая модель
+        model=GPT_MODEL, # Это дешевая и быстрая модель
     )
 
     # 3. Вывод ответа
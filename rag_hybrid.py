@@ -1,14 +1,23 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from src.backends import get_client
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from src.embedding_cache import cached_encoder
+from src.llm_client import get_openai_client
+from src.context_packer import pack_context, format_stats
+from src.retrieval import run_legs, format_leg_stats
+from src.pg_backend import pipelined_legs
+from src.fusion import fuse
 
 # 1. Настройки
 load_dotenv()
-supabase: Client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Supabase, локальный индекс в памяти процесса (RETRIEVAL_BACKEND=local) или Postgres напрямую (postgres)
+supabase = get_client()
+openai_client = get_openai_client()  # Общий пул, лимиты RPM/TPM, повторы на 429/5xx
+model = cached_encoder(SentenceTransformer("all-MiniLM-L6-v2"), "all-MiniLM-L6-v2")
+RETRIEVAL_TIMEOUT = float(os.environ.get("RETRIEVAL_TIMEOUT", 5))  # Таймаут каждой ноги поиска, сек
+GPT_MODEL = "gpt-3.5-turbo"
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", 3000))  # Бюджет контекста для GPT, токенов
 
 # --- ПОИСКОВЫЕ ФУНКЦИИ ---
 def search_vectors(query):
@@ -28,46 +37,37 @@ def search_keywords(query):
     return response.data if response.data else []
 
 def rrf_fusion(semantic_results, keyword_results, k=60):
-    fused_scores = {}
-    doc_content = {} 
-
-    # Сливаем два списка
-    for doc_list in [semantic_results, keyword_results]:
-        for rank, doc in enumerate(doc_list):
-            doc_id = doc['id']
-            doc_content[doc_id] = doc 
-            if doc_id not in fused_scores: fused_scores[doc_id] = 0
-            fused_scores[doc_id] += 1 / (rank + k)
-
-    # Сортируем
-    sorted_ids = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-    
     # Возвращаем топ-5 лучших
-    final_results = []
-    for doc_id, score in sorted_ids[:5]:
-        final_results.append(doc_content[doc_id])
-    
-    return final_results
+    return fuse([semantic_results, keyword_results], method="rrf", k=k, limit=5)
 
 # --- ГЛАВНАЯ ФУНКЦИЯ RAG ---
 def ask_hybrid_bot(question):
     print(f"\n👤 Вопрос: {question}")
     print("SEARCHING... Запускаю гибридный поиск...")
     
-    # 1. Параллельный поиск
-    vec_res = search_vectors(question)
-    kw_res = search_keywords(question)
-    
+    # 1. Параллельный поиск (обе ноги одновременно, упавшая/медленная не блокирует ответ)
+    if hasattr(supabase, "search_both"):
+        # Postgres напрямую: обе ноги одним пайплайном
+        legs, leg_stats = pipelined_legs(supabase, model.encode(question), question, 0.3, 10)
+    else:
+        legs, leg_stats = run_legs({
+            "vector": lambda: search_vectors(question),
+            "keyword": lambda: search_keywords(question),
+        }, timeout=RETRIEVAL_TIMEOUT)
+    print(f"⏱️ Поиск: {format_leg_stats(leg_stats)}")
+
     # 2. RRF Слияние
-    top_docs = rrf_fusion(vec_res, kw_res)
+    top_docs = rrf_fusion(legs["vector"], legs["keyword"])
     
     if not top_docs:
         print("❌ Ничего не найдено.")
         return
 
     # 3. Собираем контекст
+    packed_docs, context_stats = pack_context(top_docs, budget_tokens=CONTEXT_TOKENS, model=GPT_MODEL)
+    print(f"✂️ Контекст: {format_stats(context_stats)}")
     context_text = ""
-    for doc in top_docs:
+    for doc in packed_docs:
         context_text += doc['content'] + "\n---\n"
         
     print("🧠 THINKING... Генерирую ответ...")
@@ -78,7 +78,7 @@ def ask_hybrid_bot(question):
             {"role": "system", "content": "Ты юрист. Отвечай кратко и точно, используя только контекст."},
             {"role": "user", "content": f"Контекст:\n{context_text}\n\nВопрос: {question}"}
         ],
-        model="gpt-3.5-turbo",
+        model=GPT_MODEL,
     )
     
     print("\n" + "="*50)
@@ -1,145 +1,379 @@
 import os
 import time
 import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from src.backends import get_client
 from sentence_transformers import SentenceTransformer, CrossEncoder
-from openai import OpenAI
-from cachetools import TTLCache
+from src.llm_client import get_openai_client, format_metrics
+from src.context_packer import pack_context, format_stats
+from src.embedding_cache import cached_encoder, all_stats as embed_cache_stats
+from src.retrieval import run_legs, format_leg_stats
+from src.pg_backend import pipelined_legs
+from src.semantic_cache import SemanticCache, read_corpus_version
+from src.rerank import CascadeReranker
+from src.fusion import rrf_fusion  # RRF из прошлого урока, возвращает весь список
+from src.adaptive_depth import DepthPolicy, leader_first
 
 # 1. ЗАГРУЗКА НАСТРОЕК
 load_dotenv()
-supabase: Client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Supabase, локальный индекс в памяти процесса (RETRIEVAL_BACKEND=local) или Postgres напрямую (postgres)
+supabase = get_client()
+openai_client = get_openai_client()  # Общий пул, лимиты RPM/TPM, повторы на 429/5xx
 
 # Читаем конфиг из .env
 RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "false").lower() == "true"
 USE_CACHE = os.environ.get("USE_CACHE", "false").lower() == "true"
 TOP_K = int(os.environ.get("RETRIEVAL_K", 10)) # Сколько искать
 TOP_N = int(os.environ.get("RERANK_N", 3))     # Сколько оставлять
+ADAPTIVE_DEPTH = os.environ.get("ADAPTIVE_DEPTH", "false").lower() == "true"  # K и реранкинг по форме оценок
+MAX_K = int(os.environ.get("RETRIEVAL_K_MAX", 40))  # До скольки расширять поиск, если оценки плоские
+DEPTH_LOG = os.environ.get("DEPTH_LOG")  # JSONL-лог решений для подбора порогов (пусто = не писать)
+RETRIEVAL_TIMEOUT = float(os.environ.get("RETRIEVAL_TIMEOUT", 5))  # Таймаут каждой ноги поиска, сек
+GPT_MODEL = "gpt-3.5-turbo"
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", 3000))  # Бюджет контекста для GPT, токенов
+RERANK_HEAD = int(os.environ.get("RERANK_HEAD", 10))              # Сколько лучших кандидатов RRF видит Cross-Encoder
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", 200))  # Бюджет реранкинга, мс
+RERANK_BATCH = int(os.environ.get("RERANK_BATCH", 16))
+CACHE_THRESHOLD = float(os.environ.get("CACHE_THRESHOLD", 0.9))   # Косинусная близость для попадания в кеш
+CACHE_MAXSIZE = int(os.environ.get("CACHE_MAXSIZE", 5000))
+CACHE_PATH = os.environ.get("CACHE_PATH")                         # Папка для сохранения кеша (пусто = только в памяти)
+CORPUS_VERSION_FILE = os.environ.get("CORPUS_VERSION_FILE", "corpus_version.txt")  # Пишет ingest_supabase.py
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 64))                # Пакетный режим: вопросов в одной пачке
+BATCH_RETRIEVAL_CONCURRENCY = int(os.environ.get("BATCH_RETRIEVAL_CONCURRENCY", 16))  # Одновременных поисков
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", 8))       # Одновременных запросов к GPT
 
 # 2. ИНИЦИАЛИЗАЦИЯ МОДЕЛЕЙ
 print("⏳ Загружаю модели (это может занять время)...")
 # Модель для быстрого поиска (Bi-Encoder)
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+embed_model = cached_encoder(SentenceTransformer("all-MiniLM-L6-v2"), "all-MiniLM-L6-v2")
 # Модель для точной сортировки (Cross-Encoder) - она умнее, но медленнее
 rerank_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Каскад: хвост RRF отбрасывается, голова оценивается в пределах бюджета, оценки пар кешируются
+reranker = CascadeReranker(rerank_model, head_size=RERANK_HEAD, budget_ms=RERANK_BUDGET_MS, batch_size=RERANK_BATCH)
 
-# 3. НАСТРОЙКА КЕША (Храним до 100 ответов, живут CACHE_TTL секунд)
-cache = TTLCache(maxsize=100, ttl=int(os.environ.get("CACHE_TTL", 60)))
+# 3. НАСТРОЙКА КЕША (Семантический: перефразированный вопрос тоже попадает, ответы живут CACHE_TTL секунд)
+cache = SemanticCache(
+    threshold=CACHE_THRESHOLD,
+    maxsize=CACHE_MAXSIZE,
+    ttl=int(os.environ.get("CACHE_TTL", 60)),
+    persist_path=CACHE_PATH,
+    version=read_corpus_version(CORPUS_VERSION_FILE),
+)
+
+# 4. АДАПТИВНАЯ ГЛУБИНА (явный лидер — без реранкинга и меньше чанков; плоские оценки — шире поиск)
+depth_policy = DepthPolicy(base_k=TOP_K, max_k=MAX_K, base_n=TOP_N, confident_n=max(1, TOP_N - 1),
+                           log_path=DEPTH_LOG)
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
-def search_vectors(query):
-    vector = embed_model.encode(query).tolist()
+def search_vectors(query, vector=None, k=TOP_K):
+    # vector — уже посчитанный эмбеддинг вопроса (его считает проверка кеша)
+    if vector is None:
+        vector = embed_model.encode(query)
     response = supabase.rpc("match_documents", {
-        "query_embedding": vector,
+        "query_embedding": vector.tolist(),
         "match_threshold": 0.1, # Порог ниже, чтобы набрать кандидатов для сортировки
-        "match_count": TOP_K
+        "match_count": k
     }).execute()
     return response.data if response.data else []
 
-def search_keywords(query):
+def search_keywords(query, k=TOP_K):
     response = supabase.rpc("kw_match_documents", {
         "query_text": query,
-        "match_count": TOP_K
+        "match_count": k
     }).execute()
     return response.data if response.data else []
 
-# Функция RRF из прошлого урока
-def rrf_fusion(semantic_results, keyword_results, k=60):
-    fused_scores = {}
-    doc_content = {} 
+def print_cache_stats():
+    if not USE_CACHE:
+        return
+    stats = cache.stats()
+    print(f"🗃️ Кеш ответов: hits={stats['hits']} (похожих: {stats['semantic_hits']}) misses={stats['misses']} "
+          f"near-miss={stats['near_misses']} ({stats['hit_rate']:.0%}), записей: {stats['entries']}")
+
+def generate_answer(question, docs):
+    """
+    Собирает контекст из документов и спрашивает GPT.
+    Возвращает (ответ, документы контекста, статистика контекста): источники — ровно то, что видел GPT.
+    """
+    # Склеиваем перекрывающиеся чанки, убираем дубликаты и укладываемся в бюджет токенов
+    packed_docs, context_stats = pack_context(docs, budget_tokens=CONTEXT_TOKENS, model=GPT_MODEL)
+    context_text = "\n---\n".join([d['content'] for d in packed_docs])
     
-    for doc_list in [semantic_results, keyword_results]:
-        for rank, doc in enumerate(doc_list):
-            doc_id = doc['id']
-            doc_content[doc_id] = doc 
-            if doc_id not in fused_scores: fused_scores[doc_id] = 0
-            fused_scores[doc_id] += 1 / (rank + k)
-            
-    sorted_ids = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-    return [doc_content[doc_id] for doc_id, score in sorted_ids] # Возвращаем весь список
+    response = openai_client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": "Ты эксперт. Отвечай используя контекст."},
+            {"role": "user", "content": f"Контекст:\n{context_text}\n\nВопрос: {question}"}
+        ],
+        model=GPT_MODEL,
+    )
+    return response.choices[0].message.content, packed_docs, context_stats
 
 # --- ГЛАВНАЯ ЛОГИКА (PIPELINE) ---
+# Этапы общие для чата и пакетного режима: кеш ответов, поиск с адаптивной глубиной и каскадным
+# реранкингом, генерация, запись в кеш и лог глубины. Чат печатает подробности, пакетный режим — итоги.
+
+def check_cache(question, query_vector):
+    """(ответ из кеша или None, info поиска в кеше); без USE_CACHE — (None, None)."""
+    if not USE_CACHE:
+        return None, None
+    # Документы переиндексированы — старые ответы сбрасываются
+    cache.ensure_version(read_corpus_version(CORPUS_VERSION_FILE))
+    return cache.lookup(question, query_vector)
+
+def retrieve_candidates(question, query_vector, executor=None):
+    """
+    Поиск одного вопроса без реранкинга. executor — пул для ног поиска (пакетный режим даёт свой).
+    Возвращает (кандидаты RRF, решение о глубине, info): info = {"candidates", "legs" (статистика ног)}.
+    """
+    def retrieve(k):
+        if hasattr(supabase, "search_both"):
+            # Postgres напрямую: обе ноги одним пайплайном, один сетевой обмен
+            return pipelined_legs(supabase, query_vector, question, 0.1, k)
+        # Векторный и ключевой поиск идут параллельно: ждём max(ноги), а не сумму
+        return run_legs({
+            "vector": lambda: search_vectors(question, query_vector, k),
+            "keyword": lambda: search_keywords(question, k),
+        }, timeout=RETRIEVAL_TIMEOUT, executor=executor)
+
+    # С адаптивной глубиной ноги сразу возвращают K для плоских оценок (deep_k) — у всех вопросов, ведь решение
+    # принимается по их ответу; при плоских оценках берём глубже из того же ответа, у остальных лишнее отбрасывается
+    legs, leg_stats = retrieve(depth_policy.deep_k(TOP_K) if ADAPTIVE_DEPTH else TOP_K)
+    decision = {"action": "fixed", "k": TOP_K, "n": TOP_N, "rerank": RERANK_ENABLED}
+    if ADAPTIVE_DEPTH:
+        decision = depth_policy.decide([d.get('similarity', 0.0) for d in legs["vector"][:TOP_K]], TOP_K)
+        legs = {name: docs[:decision["k"]] for name, docs in legs.items()}
+    # Объединяем через RRF
+    candidates = rrf_fusion(legs["vector"], legs["keyword"])
+    if decision["action"] == "confident":
+        candidates = leader_first(candidates, legs["vector"][0])
+    return candidates, decision, {"candidates": len(candidates), "legs": leg_stats}
+
+def needs_rerank(candidates, decision):
+    return RERANK_ENABLED and decision["rerank"] and bool(candidates)
+
+def retrieve_context(question, query_vector):
+    """
+    Поиск и реранкинг одного вопроса (чат).
+    Возвращает (документы для контекста, решение о глубине, info):
+    info = {"candidates", "legs", "rerank" (info CascadeReranker или None), "best"}.
+    """
+    candidates, decision, info = retrieve_candidates(question, query_vector)
+    info.update(rerank=None, best=None)
+    if needs_rerank(candidates, decision):
+        # Кандидаты уже отсортированы RRF: Cross-Encoder оценивает только голову и оставляет ТОП-N
+        ranked_docs, info["rerank"] = reranker.rerank(question, candidates, top_n=decision["n"])
+        # Первая пачка оценивается всегда, поэтому у лучшего документа оценка есть
+        info["best"] = ranked_docs[0]['score']
+        return [item['doc'] for item in ranked_docs], decision, info
+    return candidates[:decision["n"]], decision, info # Просто берем первые попавшиеся
+
+def remember_answer(question, query_vector, answer, packed_docs, decision, seconds, retrieval_seconds):
+    """Ответ — в кеш (сохраняет на диск вызывающий), решение о глубине — в лог."""
+    sources = [d['id'] for d in packed_docs]
+    if USE_CACHE:
+        cache.store(question, query_vector, answer, sources=sources)
+    if ADAPTIVE_DEPTH:
+        depth_policy.log(question, decision, seconds=seconds, retrieval_seconds=retrieval_seconds, sources=sources)
 
 def ask_smart_bot(question):
     start_time = time.time() # Засекаем время
     print(f"\n👤 Вопрос: {question}")
 
     # 1. ПРОВЕРКА КЕША
-    if USE_CACHE and question in cache:
-        print(f"⚡ CACHE HIT! Ответ найден в памяти.")
+    # Эмбеддинг вопроса считаем один раз: он нужен и кешу, и векторному поиску
+    query_vector = embed_model.encode(question)
+    cached_answer, info = check_cache(question, query_vector)
+    if cached_answer is not None:
+        if info["type"] == "exact":
+            print(f"⚡ CACHE HIT! Ответ найден в памяти.")
+        else:
+            print(f"⚡ CACHE HIT (похожий вопрос, близость {info['similarity']:.3f}): {info['question']}")
         print("="*50)
-        print(f"🤖 ОТВЕТ:\n{cache[question]}")
+        print(f"🤖 ОТВЕТ:\n{cached_answer}")
         print("="*50)
         print(f"⏱️ Время ответа: {time.time() - start_time:.4f} сек (Мгновенно!)")
+        print_cache_stats()
         return
+    if info and info["type"] == "near_miss":
+        print(f"🤏 Почти попали в кеш (близость {info['similarity']:.3f} < {CACHE_THRESHOLD}): {info['question']}")
 
-    # 2. ПОИСК (RETRIEVAL)
+    # 2. ПОИСК (RETRIEVAL) И 3. ПЕРЕРАНЖИРОВАНИЕ (RERANKING)
     t1 = time.time()
-    vec_res = search_vectors(question)
-    kw_res = search_keywords(question)
-    # Объединяем через RRF
-    candidates = rrf_fusion(vec_res, kw_res)
-    print(f"🔍 Найдено кандидатов: {len(candidates)} (за {time.time() - t1:.4f} сек)")
-
-    # 3. ПЕРЕРАНЖИРОВАНИЕ (RERANKING)
-    final_docs = candidates
-    if RERANK_ENABLED and candidates:
-        t2 = time.time()
-        print("⚖️  Запускаю Re-ranking (Cross-Encoder)...")
-        
-        # Готовим пары [Вопрос, Текст] для нейросети
-        pairs = [[question, doc['content']] for doc in candidates]
-        
-        # Нейросеть оценивает, насколько текст отвечает на вопрос
-        scores = rerank_model.predict(pairs)
-        
-        # Прикрепляем оценки к документам и сортируем
-        ranked_docs = []
-        for i, doc in enumerate(candidates):
-            ranked_docs.append({'doc': doc, 'score': scores[i]})
-        
-        # Сортируем по оценке (от высокой к низкой)
-        ranked_docs = sorted(ranked_docs, key=lambda x: x['score'], reverse=True)
-        
-        # Оставляем только ТОП-N лучших
-        final_docs = [item['doc'] for item in ranked_docs[:TOP_N]]
-        
-        print(f"✅ Re-ranking завершен за {time.time() - t2:.4f} сек.")
-        print(f"   Лучший документ (Score: {ranked_docs[0]['score']:.4f}): {final_docs[0]['content'][:50]}...")
-    else:
-        final_docs = candidates[:TOP_N] # Просто берем первые попавшиеся
+    final_docs, decision, info = retrieve_context(question, query_vector)
+    if ADAPTIVE_DEPTH:
+        print(f"🎚️ Глубина: {decision['action']} (отрыв {decision['margin']:.3f}, энтропия {decision['entropy']:.2f}) "
+              f"→ K={decision['k']}, N={decision['n']}, реранкинг: {'да' if decision['rerank'] else 'нет'}")
+    print(f"🔍 Найдено кандидатов: {info['candidates']} ({format_leg_stats(info['legs'])})")
+    if info["rerank"]:
+        rerank = info["rerank"]
+        print(f"⚖️  Re-ranking (Cross-Encoder) за {rerank['seconds']:.4f} сек. "
+              f"(оценено: {rerank['scored']}, из кеша: {rerank['cached']}, отброшено: {rerank['pruned']}"
+              f"{', бюджет исчерпан' if rerank['budget_hit'] else ''})")
+        print(f"   Лучший документ (Score: {info['best']:.4f}): {final_docs[0]['content'][:50]}...")
+    print(f"⏱️ Поиск и реранкинг: {time.time() - t1:.4f} сек")
 
     # 4. ГЕНЕРАЦИЯ (GENERATION)
     t3 = time.time()
     print("🧠 Генерирую ответ через GPT...")
     
-    context_text = "\n---\n".join([d['content'] for d in final_docs])
-    
-    response = openai_client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": "Ты эксперт. Отвечай используя контекст."},
-            {"role": "user", "content": f"Контекст:\n{context_text}\n\nВопрос: {question}"}
-        ],
-        model="gpt-3.5-turbo",
-    )
-    answer = response.choices[0].message.content
-    
+    answer, packed_docs, context_stats = generate_answer(question, final_docs)
+    print(f"✂️ Контекст: {format_stats(context_stats)}")
+
+    total_time = time.time() - start_time
     # Сохраняем в кеш
+    remember_answer(question, query_vector, answer, packed_docs, decision, total_time, t3 - start_time)
     if USE_CACHE:
-        cache[question] = answer
+        cache.save()
 
-    total_time = time.time() - start_time
     print("\n" + "="*50)
     print(f"🤖 ОТВЕТ:\n{answer}")
     print("="*50)
     print(f"⏱️ Полное время: {total_time:.4f} сек")
     print(f"📊 Метрики: Поиск={t3-start_time:.2f}s | GPT={total_time-(t3-start_time):.2f}s")
+    for stats in embed_cache_stats():
+        print(f"🗄️ Кеш эмбеддингов {stats['model']}: hits={stats['hits']} misses={stats['misses']} ({stats['hit_rate']:.0%})")
+    print_cache_stats()
+
+# --- ПАКЕТНЫЙ РЕЖИМ ---
+
+def read_questions(path):
+    """JSONL: строка — {"id": ..., "question": "..."} или просто "вопрос"."""
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            item.setdefault("id", i)
+            yield item
+
+def answer_batch(items, retrieval_pool, legs_pool, llm_pool):
+    """
+    Одна пачка через те же этапы, что и чат: один encode на пачку, затем кеш, параллельный поиск
+    (ноги — в своём пуле legs_pool), один predict Cross-Encoder на пары всех вопросов и параллельные запросы к GPT.
+    """
+    questions = [item["question"] for item in items]
+    timings = {}
+
+    # 1. Все вопросы пачки — одним вызовом модели
+    t = time.time()
+    vectors = embed_model.encode(questions, batch_size=len(questions))
+    timings["encode"] = time.time() - t
+
+    # 2. Кеш ответов: найденные в нём дальше не идут
+    cached = [check_cache(question, vector)[0] for question, vector in zip(questions, vectors)]
+    pending = [i for i, answer in enumerate(cached) if answer is None]
+
+    # 3. Поиск: все вопросы сразу, у каждого обе ноги параллельно
+    t = time.time()
+    def retrieve(i):
+        start = time.time()
+        candidates, decision, _ = retrieve_candidates(questions[i], vectors[i], executor=legs_pool)
+        return candidates, decision, time.time() - start
+    retrieved = dict(zip(pending, retrieval_pool.map(retrieve, pending)))
+    timings["retrieve"] = time.time() - t
+
+    # 4. Реранкинг: головы всех вопросов, которым он нужен, — одним predict (оценки кешируются)
+    t = time.time()
+    final = {i: candidates[:decision["n"]] for i, (candidates, decision, _) in retrieved.items()}
+    to_rerank = [i for i, (candidates, decision, _) in retrieved.items() if needs_rerank(candidates, decision)]
+    ranked = reranker.rerank_many([(questions[i], retrieved[i][0], retrieved[i][1]["n"]) for i in to_rerank])
+    for i, (ranked_docs, _) in zip(to_rerank, ranked):
+        final[i] = [item['doc'] for item in ranked_docs]
+    timings["rerank"] = time.time() - t
+
+    # 5. Генерация: до LLM_CONCURRENCY запросов одновременно
+    t = time.time()
+    def generate(i):
+        docs = final[i]
+        start = time.time()
+        try:
+            answer, packed_docs, _ = generate_answer(questions[i], docs)
+            return answer, packed_docs, None, time.time() - start
+        except Exception as e:
+            return None, docs, f"{type(e).__name__}: {str(e)[:200]}", time.time() - start
+    generated = dict(zip(pending, llm_pool.map(generate, pending)))
+    timings["generate"] = time.time() - t
+
+    # encode и реранкинг общие на пачку: на вопрос приходится их доля; поиск и GPT — свои у каждого вопроса
+    encode_share = timings["encode"] / len(items)
+    rerank_share = timings["rerank"] / len(pending) if pending else 0.0
+    records = []
+    for i, item in enumerate(items):
+        if cached[i] is not None:
+            records.append({**item, "answer": cached[i], "error": None, "sources": [], "cached": True,
+                            "timings": {"encode": encode_share}})
+            continue
+        _, decision, retrieve_seconds = retrieved[i]
+        answer, docs, error, llm_seconds = generated[i]
+        if error is None:
+            remember_answer(questions[i], vectors[i], answer, docs, decision,
+                            retrieve_seconds + rerank_share + llm_seconds, retrieve_seconds + rerank_share)
+        records.append({
+            **item,
+            "answer": answer,
+            "error": error,
+            "sources": [d['id'] for d in docs],
+            "cached": False,
+            "timings": {
+                "encode": encode_share,
+                "retrieve": retrieve_seconds,
+                "rerank": rerank_share,
+                "generate": llm_seconds,
+            },
+        })
+    if USE_CACHE:
+        cache.save()
+    return records, timings
+
+def ask_batch(input_path, output_path, batch_size=BATCH_SIZE, llm_concurrency=LLM_CONCURRENCY):
+    print(f"📦 Пакетный режим: {input_path} → {output_path} (пачки по {batch_size}, GPT параллельно: {llm_concurrency})")
+    start = time.time()
+    totals = {"encode": 0.0, "retrieve": 0.0, "rerank": 0.0, "generate": 0.0}
+    answered, failed, from_cache = 0, 0, 0
+    items = list(read_questions(input_path))
+    # У каждого поиска две ноги: свой пул на обе, чтобы ноги не ждали потоков общего пула и не теряли таймаут
+    with ThreadPoolExecutor(max_workers=BATCH_RETRIEVAL_CONCURRENCY) as retrieval_pool, \
+         ThreadPoolExecutor(max_workers=2 * BATCH_RETRIEVAL_CONCURRENCY, thread_name_prefix="batch-legs") as legs_pool, \
+         ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool, \
+         open(output_path, "w", encoding="utf-8") as out:
+        for b in range(0, len(items), batch_size):
+            records, timings = answer_batch(items[b:b + batch_size], retrieval_pool, legs_pool, llm_pool)
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                answered += record["error"] is None
+                failed += record["error"] is not None
+                from_cache += record["cached"]
+            out.flush()
+            for stage, seconds in timings.items():
+                totals[stage] += seconds
+            elapsed = time.time() - start
+            print(f"   {b + len(records)}/{len(items)} вопросов, {(b + len(records)) / elapsed * 60:.0f} вопр/мин")
+
+    total_time = time.time() - start
+    print("📊 Итого:")
+    print(f"   Вопросов: {len(items)} (ответов: {answered}, из кеша: {from_cache}, ошибок: {failed}) "
+          f"за {total_time:.1f} сек → {len(items) / total_time * 60:.0f} вопросов/мин")
+    print("   Этапы: " + " | ".join(f"{stage}={seconds:.1f}s" for stage, seconds in totals.items()))
+    print(f"   GPT: {format_metrics()}")
+    print_cache_stats()
 
 if __name__ == "__main__":
-    while True:
-        q = input("\nВведите вопрос (или 'exit'): ")
-        if q.lower() == 'exit': break
-        ask_smart_bot(q)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="RAG-бот: интерактивный чат или пакетная обработка вопросов")
+    parser.add_argument("--batch", metavar="QUESTIONS.jsonl", help="Файл с вопросами (JSONL) для пакетного режима")
+    parser.add_argument("--out", default="answers.jsonl", help="Куда писать ответы в пакетном режиме")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.batch:
+        ask_batch(args.batch, args.out, args.batch_size, args.llm_concurrency)
+    else:
+        while True:
+            q = input("\nВведите вопрос (или 'exit'): ")
+            if q.lower() == 'exit': break
+            ask_smart_bot(q)
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from sentence_transformers import SentenceTransformer
+from src.embedding_cache import cached_encoder
 
 # 1. Загрузка настроек
 load_dotenv()
@@ -10,7 +11,7 @@ key = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
 # 2. Загружаем ту же модель (чтобы "язык" запроса совпадал с базой)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = cached_encoder(SentenceTransformer("all-MiniLM-L6-v2"), "all-MiniLM-L6-v2")
 
 def search(query):
     print(f"\n🔎 Вопрос: '{query}'")
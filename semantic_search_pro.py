@@ -1,9 +1,24 @@
 import os
+import re
+import json
+import uuid
+import queue
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pypdf import PdfReader
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import Distance, VectorParams, PointStruct, FilterSelector
 from sentence_transformers import SentenceTransformer
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.embedding_cache import cached_encoder
+from src.mmap_store import MmapVectorStore, Hit
+from src.ann_index import open_index
+from src.collection_manager import CollectionManager
+from src.sharded_search import ShardedSearch
+from src.payload_index import PAYLOAD_FIELDS, document_id, document_date, parse_filter_args, qdrant_filter, qdrant_schema
 
 # --- НАСТРОЙКИ ---
 COLLECTION_NAME = "kaspi_report"
@@ -11,25 +26,277 @@ MODEL_NAME = "all-MiniLM-L6-v2"
 # Ищем файл рядом со скриптом. Если у вас он в папке data, поменяйте на "data/docs/..."
 PDF_PATH = "data/docs/sample.pdf"
 
+# Персистентный режим: папка с memory-mapped хранилищем (пусто = Qdrant в памяти)
+STORE_DIR = os.environ.get("VECTOR_STORE_DIR", "")
+STORE_DTYPE = os.environ.get("VECTOR_STORE_DTYPE", "float16")  # float16 или int8
+# Индекс поиска в персистентном режиме: flat | hnsw | ivf | binary (см. src/ann_index.py)
+INDEX_MODE = os.environ.get("INDEX_MODE", "flat")
+INDEX_PARAMS = json.loads(os.environ.get("INDEX_PARAMS", "{}"))  # например {"ef_search": 128}
+
+# Много коллекций (по одной на клиента): папка, где каждая коллекция — своё хранилище (см. src/collection_manager.py).
+# Коллекции открываются при первом вопросе и вытесняются по LRU при превышении лимита памяти
+COLLECTIONS_DIR = os.environ.get("COLLECTIONS_DIR", "")
+COLLECTIONS_MEMORY_MB = float(os.environ.get("COLLECTIONS_MEMORY_MB", 1024))
+COLLECTIONS_ACCESS_LOG = os.environ.get("COLLECTIONS_ACCESS_LOG", "")  # пусто = <COLLECTIONS_DIR>/access.jsonl
+
+# Шардированный поиск в персистентном режиме: хранилище делится между процессами (см. src/sharded_search.py).
+# 0 = выключен; запросы без фильтров идут во все шарды, шард, не уложившийся в SHARD_TIMEOUT, пропускается
+SEARCH_SHARDS = int(os.environ.get("SEARCH_SHARDS", 0))
+SHARD_TIMEOUT = float(os.environ.get("SHARD_TIMEOUT", 1.0))
+
+# Настройки конвейера индексации (process_pdf)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+PAGES_PER_TASK = 8        # Сколько страниц парсит один процесс за задачу
+PARSE_WORKERS = os.cpu_count() or 2
+ENCODE_BATCH = 64         # Сколько чанков кодируем за один вызов encode
+UPSERT_BATCH = 256        # Сколько точек записываем в базу за раз
+QUEUE_SIZE = 4            # Ёмкость очередей между стадиями (в пачках)
+
+# Пространство имён для стабильных id точек
+POINT_NAMESPACE = uuid.UUID("6f1c1b8e-3f7a-4c1e-9a55-2f4b8d0c7e11")
+
+
+def point_id(source: str, page: int, index: int, text: str) -> str:
+    """
+    Стабильный id точки: одинаковый чанк при повторной загрузке
+    перезаписывает старую точку, а не дублирует её.
+    """
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{source}|{page}|{index}|{digest}"))
+
+
+# Нумерованный заголовок ("2.1 Итоги", "IV. Риски") или со служебным словом в начале
+_HEADING = re.compile(r"^(\d+(\.\d+)*\.?\s|[IVX]+\.\s|(раздел|глава|статья|section|chapter|part|item)\b)", re.I)
+_MINOR_WORDS = {"и", "в", "во", "на", "по", "с", "о", "от", "для", "of", "and", "the", "in", "on", "for", "to", "a"}
+SECTION_LOOKBACK = 3  # На сколько страниц назад искать заголовок для первой страницы задачи
+
+
+def detect_heading(line: str):
+    """Строка похожа на заголовок раздела: короткая, без точки в конце, нумерованная / КАПСОМ / С Заглавных."""
+    line = line.strip()
+    if not 3 <= len(line) <= 80 or line[-1] in ".,;":
+        return None
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3:
+        return None
+    if _HEADING.match(line) or sum(c.isupper() for c in letters) >= 0.6 * len(letters):
+        return line
+    words = line.split()
+    if 2 <= len(words) <= 8 and not any(c.isdigit() for c in line) \
+            and all(w[0].isupper() for w in words if w.lower() not in _MINOR_WORDS):
+        return line
+    return None
+
+
+def page_headings(text: str):
+    """[(смещение в тексте, заголовок)] по строкам страницы."""
+    headings, position = [], 0
+    for line in text.splitlines(keepends=True):
+        heading = detect_heading(line)
+        if heading:
+            headings.append((position, heading))
+        position += len(line)
+    return headings
+
+
+def chunk_sections(text: str, pieces, section=None):
+    """
+    Раздел каждого чанка страницы: последний заголовок не позже начала чанка
+    (section — раздел, открытый на предыдущих страницах). Возвращает (разделы, раздел в конце страницы).
+    """
+    headings = page_headings(text)
+    sections, cursor, h = [], 0, 0
+    for piece in pieces:
+        offset = text.find(piece, cursor)
+        offset = cursor if offset < 0 else offset
+        cursor = offset + 1
+        while h < len(headings) and headings[h][0] <= offset:
+            section = headings[h][1]
+            h += 1
+        sections.append(section)
+    return sections, headings[-1][1] if headings else section
+
+
+def make_payload(text: str, page: int, source: str, section=None):
+    """Payload точки: текст + поля для фильтров (см. src/payload_index.py)."""
+    payload = {"text": text, "page": page, "source": source, "doc_id": document_id(source)}
+    date = document_date(source)
+    if section:
+        payload["section"] = section
+    if date:
+        payload["date"] = date
+    return payload
+
+
+def extract_pages(file_path: str, start: int, end: int):
+    """
+    Стадия 1 (в отдельном процессе): читает страницы [start, end) и режет их на чанки.
+    """
+    reader = PdfReader(file_path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    source = os.path.basename(file_path)
+    # Раздел мог начаться на страницах предыдущей задачи
+    section = None
+    for page_index in range(start - 1, max(-1, start - 1 - SECTION_LOOKBACK), -1):
+        headings = page_headings(reader.pages[page_index].extract_text() or "")
+        if headings:
+            section = headings[-1][1]
+            break
+    chunks = []
+    for page_index in range(start, end):
+        text = reader.pages[page_index].extract_text() or ""
+        pieces = splitter.split_text(text)
+        sections, section = chunk_sections(text, pieces, section)
+        for i, (piece, piece_section) in enumerate(zip(pieces, sections)):
+            chunks.append({
+                "id": point_id(source, page_index + 1, i, piece),
+                "payload": make_payload(piece, page_index + 1, source, piece_section),
+            })
+    return chunks
+
+_DONE = object()  # Сигнал "стадия закончила работу"
+
 class VectorSearchEngine:
-    def __init__(self):
+    def __init__(self, store_dir: str = STORE_DIR, store_dtype: str = STORE_DTYPE,
+                 index_mode: str = INDEX_MODE, index_params: dict = None,
+                 collections_dir: str = COLLECTIONS_DIR, collection: str = COLLECTION_NAME,
+                 shards: int = SEARCH_SHARDS):
         print("⏳ Загружаю нейросеть (если запускаете первый раз, это займет минуту)...")
-        self.model = SentenceTransformer(MODEL_NAME)
+        self.model = cached_encoder(SentenceTransformer(MODEL_NAME), MODEL_NAME)
         self.vector_size = 384
-        
+
+        self.store = None
+        self.collections = None
+        self.collection = collection  # Коллекция по умолчанию, если в вызове не указана другая
+        self.index_mode = index_mode
+        self.index_params = index_params if index_params is not None else INDEX_PARAMS
+        self._index = None
+        self.shards = shards
+        self._sharded = None
+        if collections_dir:
+            # Много коллекций: на старте ничего не открываем, самые частые прогреваются в фоне
+            self.collections = CollectionManager(
+                collections_dir, dim=self.vector_size, dtype=store_dtype, index_mode=index_mode,
+                index_params=self.index_params, memory_limit_mb=COLLECTIONS_MEMORY_MB,
+                access_log=COLLECTIONS_ACCESS_LOG or None,
+            )
+            self.collections.start_warming()
+            print(f"🗂️ Коллекции в {collections_dir}, лимит памяти {COLLECTIONS_MEMORY_MB:.0f} МБ")
+            return
+        if store_dir:
+            # Персистентный режим: просто отображаем файлы в память, без повторной индексации
+            self.store = MmapVectorStore(store_dir, dim=self.vector_size, dtype=store_dtype)
+            print(f"💾 Хранилище {store_dir}: {self.store.count} векторов ({self.store.meta['dtype']})")
+            return
+
         # Запускаем базу в памяти
         self.client = QdrantClient(":memory:")
-        
+        self._ensure_qdrant_collection(self.collection)
+
+    def _ensure_qdrant_collection(self, name: str):
         # Проверяем, есть ли коллекция, если нет — создаем
-        if not self.client.collection_exists(COLLECTION_NAME):
+        if not self.client.collection_exists(name):
             self.client.create_collection(
-                collection_name=COLLECTION_NAME,
+                collection_name=name,
                 vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
             )
+            # Payload-индексы: фильтр применяется при обходе HNSW, а не перебором после поиска
+            for field in PAYLOAD_FIELDS:
+                self.client.create_payload_index(name, field_name=field, field_schema=qdrant_schema(field))
+
+    def is_indexed(self, collection: str = None) -> bool:
+        """Есть ли уже данные (в персистентном режиме — с прошлых запусков)."""
+        collection = collection or self.collection
+        if self.collections is not None:
+            return self.collections.count(collection) > 0
+        if self.store is not None:
+            return self.store.count > 0
+        if not self.client.collection_exists(collection):
+            return False
+        return self.client.count(collection_name=collection).count > 0
+
+    @property
+    def index(self):
+        """ANN-индекс над хранилищем: строится при первом поиске или грузится с диска."""
+        if self._index is None:
+            self._index = open_index(self.store, self.index_mode, **self.index_params)
+        return self._index
+
+    @property
+    def sharded(self):
+        """Процессы-шарды над хранилищем: запускаются при первом поиске, после загрузки данных."""
+        if self._sharded is None:
+            self._sharded = ShardedSearch(self.store.path, self.shards, timeout=SHARD_TIMEOUT).start()
+        return self._sharded
+
+    def close(self):
+        if self._sharded is not None:
+            self._sharded.close()
+            self._sharded = None
+        if self.collections is not None:
+            self.collections.close()  # Дописывает накопленный журнал обращений
+
+    @contextmanager
+    def _local(self, collection: str = None):
+        """
+        with: (хранилище, ANN-индекс) для поиска в персистентном режиме; None, если коллекции нет.
+        Пока with не закончился, вытеснение коллекцию не закроет.
+        """
+        if self.collections is None:
+            yield self.store, self.index if self.store.count else None
+            return
+        collection = collection or self.collection
+        if not self.collections.exists(collection):
+            yield None
+            return
+        with self.collections.use(collection) as opened:
+            yield opened.store, opened.index if opened.store.count else None
+
+    def upsert(self, ids, vectors, payloads, collection: str = None):
+        collection = collection or self.collection
+        if self.collections is not None:
+            with self.collections.use(collection, create=True, with_index=False, record=False) as opened:
+                opened.store.upsert(ids, vectors, payloads)
+                opened.invalidate()  # Данные изменились — индекс перестроится при следующем поиске
+            return
+        if self.store is not None:
+            self.store.upsert(ids, vectors, payloads)
+            self._index = None  # Данные изменились — индекс перестроится при следующем поиске
+            self.close()  # Диапазоны шардов тоже (перезапустятся при следующем поиске)
+            return
+        self._ensure_qdrant_collection(collection)
+        points = [
+            PointStruct(id=i, vector=list(map(float, v)), payload=p)
+            for i, v, p in zip(ids, vectors, payloads)
+        ]
+        self.client.upsert(collection_name=collection, points=points)
 
-    def process_pdf(self, file_path: str):
+    def delete(self, filters: dict, collection: str = None):
+        """Удаляет точки под фильтром по payload (например, старые чанки страницы перед перезагрузкой)."""
+        collection = collection or self.collection
+        if self.collections is not None:
+            if self.collections.exists(collection):
+                with self.collections.use(collection, with_index=False, record=False) as opened:
+                    if opened.store.delete(filters):
+                        opened.invalidate()
+            return
+        if self.store is not None:
+            if self.store.delete(filters):
+                self._index = None
+                self.close()
+            return
+        if self.client.collection_exists(collection):
+            self.client.delete(collection_name=collection,
+                               points_selector=FilterSelector(filter=qdrant_filter(filters)))
+
+    def process_pdf(self, file_path: str, pipelined: bool = True, collection: str = None):
         print(f"📄 Пробую открыть файл: {file_path}")
-        
+
+        if os.path.exists(file_path) and pipelined:
+            self.process_pdf_pipelined(file_path, collection)
+            return
+
         if not os.path.exists(file_path):
             print(f"⚠️ Файл не найден! Создаю тестовые данные, чтобы показать, как это работает...")
             # Создаем фейковые данные, если PDF нет
@@ -39,57 +306,226 @@ class VectorSearchEngine:
                 "Net income increased by 12% year-over-year.",
                 "The supply of smartphones remains subject to temporary disruption in Kazakhstan."
             ]
-            chunks = [{"text": t, "page": 1} for t in texts]
+            source = "demo"
+            chunks = [make_payload(t, 1, source) for t in texts]
         else:
             # Если файл есть — читаем его
             loader = PyPDFLoader(file_path)
             docs = loader.load()
-            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            split_docs = splitter.split_documents(docs)
-            chunks = [{"text": d.page_content, "page": d.metadata.get("page", 0)+1} for d in split_docs]
+            splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+            source = os.path.basename(file_path)
+            chunks, section = [], None
+            for doc in docs:
+                pieces = splitter.split_text(doc.page_content)
+                sections, section = chunk_sections(doc.page_content, pieces, section)
+                page = doc.metadata.get("page", 0) + 1
+                chunks.extend(make_payload(t, page, source, s) for t, s in zip(pieces, sections))
             print(f"🧩 Документ разбит на {len(chunks)} фрагментов.")
 
         # Векторизация
         print("🚀 Превращаю текст в векторы...")
-        points = []
-        for i, item in enumerate(chunks):
+        ids, vectors, payloads = [], [], []
+        page_chunks = {}
+        for item in chunks:
             text = item["text"]
-            vector = self.model.encode(text).tolist()
-            
-            points.append(PointStruct(
-                id=i,
-                vector=vector,
-                payload={"text": text, "page": item["page"]}
-            ))
-            
-        self.client.upsert(collection_name=COLLECTION_NAME, points=points)
-        print(f"✅ Готово! В базе {len(points)} векторов.")
-
-    def search(self, query: str):
+            # Номер чанка внутри страницы, как в extract_pages: id не зависят от режима загрузки
+            i = page_chunks.get(item["page"], 0)
+            page_chunks[item["page"]] = i + 1
+            ids.append(point_id(source, item["page"], i, text))
+            vectors.append(self.model.encode(text))
+            payloads.append(item)
+
+        # Весь документ загружается одним upsert — старые чанки источника (изменённых и исчезнувших страниц) убираем
+        self.delete({"source": source}, collection)
+        self.upsert(ids, vectors, payloads, collection)
+        print(f"✅ Готово! В базе {len(ids)} векторов.")
+
+    def process_pdf_pipelined(self, file_path: str, collection: str = None):
+        """
+        Потоковая индексация в три стадии, связанные ограниченными очередями:
+        1) парсинг страниц и нарезка в пуле процессов,
+        2) пакетное кодирование,
+        3) пакетный upsert в Qdrant или персистентное хранилище.
+        Память не растёт с размером PDF, а парсинг идёт параллельно с эмбеддингом.
+        Старые чанки страницы удаляются перед записью её первых новых чанков.
+        """
+        total_pages = len(PdfReader(file_path).pages)
+        source = os.path.basename(file_path)
+        cleared_pages = set()
+        print(f"🏭 Конвейер: {total_pages} стр., процессов парсинга: {PARSE_WORKERS}")
+
+        chunk_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        vector_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        errors = []
+
+        # put/get с таймаутом, чтобы стадия не зависла, если соседняя упала
+        def put(q, item):
+            while not errors:
+                try:
+                    q.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def get(q):
+            while True:
+                try:
+                    return q.get(timeout=0.5)
+                except queue.Empty:
+                    if errors:
+                        return _DONE
+
+        def produce():
+            try:
+                with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+                    in_flight = set()
+                    for start in range(0, total_pages, PAGES_PER_TASK):
+                        end = min(start + PAGES_PER_TASK, total_pages)
+                        # Не больше 2 задач на процесс в полёте — память остаётся ровной
+                        if len(in_flight) >= PARSE_WORKERS * 2:
+                            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in finished:
+                                put(chunk_queue, future.result())
+                        in_flight.add(pool.submit(extract_pages, file_path, start, end))
+                    for future in in_flight:
+                        put(chunk_queue, future.result())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(chunk_queue, _DONE)
+
+        def encode():
+            try:
+                buffer = []
+                while True:
+                    item = get(chunk_queue)
+                    if item is not _DONE:
+                        buffer.extend(item)
+                    while len(buffer) >= ENCODE_BATCH or (item is _DONE and buffer):
+                        batch, buffer = buffer[:ENCODE_BATCH], buffer[ENCODE_BATCH:]
+                        vectors = self.model.encode([c["payload"]["text"] for c in batch], batch_size=ENCODE_BATCH)
+                        put(vector_queue, (batch, vectors))
+                    if item is _DONE:
+                        break
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(vector_queue, _DONE)
+
+        threads = [threading.Thread(target=produce, daemon=True), threading.Thread(target=encode, daemon=True)]
+        for t in threads:
+            t.start()
+
+        # Стадия 3: upsert в текущем потоке
+        total = 0
+        ids, vectors, payloads = [], [], []
+        try:
+            while True:
+                item = get(vector_queue)
+                if item is not _DONE:
+                    batch, batch_vectors = item
+                    for chunk, vector in zip(batch, batch_vectors):
+                        ids.append(chunk["id"])
+                        vectors.append(vector)
+                        payloads.append(chunk["payload"])
+                if len(ids) >= UPSERT_BATCH or (item is _DONE and ids):
+                    # Чанки одной страницы могут попасть в две пачки — страницу чистим один раз, до первой
+                    new_pages = sorted({p["page"] for p in payloads} - cleared_pages)
+                    if new_pages:
+                        self.delete({"source": source, "page": new_pages}, collection)
+                        cleared_pages.update(new_pages)
+                    self.upsert(ids, vectors, payloads, collection)
+                    total += len(ids)
+                    ids, vectors, payloads = [], [], []
+                    print(f"   ⬆️ Загружено точек: {total}")
+                if item is _DONE:
+                    break
+        except Exception as e:
+            errors.append(e)
+
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        # Страницы, где теперь нет текста, и страницы за концом документа (он стал короче)
+        empty_pages = [p for p in range(1, total_pages + 1) if p not in cleared_pages]
+        if empty_pages:
+            self.delete({"source": source, "page": empty_pages}, collection)
+        self.delete({"source": source, "page": {"gt": total_pages}}, collection)
+        print(f"✅ Готово! Загружено {total} векторов (повторная загрузка перезаписывает те же id).")
+
+    def search(self, query: str, filters: dict = None, collection: str = None):
+        """
+        filters — условия по payload (doc_id, source, section, page, date), см. src/payload_index.py.
+        collection — в какой коллекции искать (по умолчанию self.collection).
+        """
         if not query: return
-        print(f"\n🔎 Ищу: '{query}'")
+        collection = collection or self.collection
+        print(f"\n🔎 Ищу: '{query}'" + (f" | фильтр: {filters}" if filters else "")
+              + (f" | коллекция: {collection}" if self.collections is not None else ""))
         query_vector = self.model.encode(query).tolist()
-        
-        # ИСПРАВЛЕНИЕ: Используем query_points вместо search
-        hits = self.client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=3,
-            with_payload=True
-        ).points
+
+        if self.store is not None and self.shards and not filters:
+            # Запрос во все шарды, общий top-3 слиянием их ответов
+            result = self.sharded.search(query_vector, k=3)
+            if result.answered < result.shards:
+                print(f"⏱️ Ответили {result.answered} из {result.shards} шардов — результат частичный")
+            hits = result.hits
+        elif self.store is not None or self.collections is not None:
+            with self._local(collection) as local:
+                if local is None or local[1] is None:
+                    print(f"❌ Коллекция '{collection}' пуста или не найдена.")
+                    return
+                store, index = local
+                rows = None
+                if filters:
+                    # Сначала отбираем строки по столбцам payload, близость считается только для них
+                    rows = store.filter_rows(filters)
+                    print(f"🧮 Под фильтр попало {len(rows)} из {store.count} векторов "
+                          f"({len(rows) / max(store.count, 1):.1%})")
+                    if not len(rows):
+                        print("❌ Ничего не найдено.")
+                        return
+                rows, scores = index.search(query_vector, k=3, rows=rows)
+                hits = [Hit(store.point_id(r), float(s), store.payload(r)) for r, s in zip(rows, scores)]
+        else:
+            if not self.client.collection_exists(collection):
+                print(f"❌ Коллекция '{collection}' не найдена.")
+                return
+            # ИСПРАВЛЕНИЕ: Используем query_points вместо search
+            hits = self.client.query_points(
+                collection_name=collection,
+                query=query_vector,
+                query_filter=qdrant_filter(filters),
+                limit=3,
+                with_payload=True
+            ).points
         
         print("=" * 50)
         for hit in hits:
-            print(f"🎯 Точность: {hit.score:.3f} | Стр. {hit.payload['page']}")
+            section = f" | {hit.payload['section']}" if hit.payload.get("section") else ""
+            print(f"🎯 Точность: {hit.score:.3f} | Стр. {hit.payload['page']}{section}")
             print(f"📄 ...{hit.payload['text'][:200].replace(chr(10), ' ')}...")
             print("-" * 50)
 
 if __name__ == "__main__":
     app = VectorSearchEngine()
-    app.process_pdf(PDF_PATH)
+    if app.is_indexed():
+        print("⚡ Индекс уже на диске — пропускаю загрузку PDF.")
+    else:
+        app.process_pdf(PDF_PATH)
     
     print("\n💡 Теперь можно задавать вопросы (на английском или русском).")
+    print("   Фильтр пишется в вопросе: 'выручка @doc_id=kaspi-3q-2025 @page=3..10 @section=Итоги,Риски'")
+    print("   Другая коллекция: 'выручка @collection=client-42'")
     while True:
         q = input("\nВаш вопрос (или 'q' для выхода): ")
         if q.lower() in ['q', 'exit']: break
-        app.search(q)
\ No newline at end of file
+        try:
+            query, filters = parse_filter_args(q)
+            app.search(query, filters, collection=filters.pop("collection", None))
+        except ValueError as e:
+            # Опечатка в фильтре не должна ронять чат
+            print(f"⚠️ {e}")
+            print("   Пример: 'выручка @doc_id=kaspi-3q-2025 @page=3..10 @section=Итоги,Риски @collection=client-42'")
+    app.close()
@@ -0,0 +1,115 @@
+"""
+Адаптивная глубина поиска: сколько кандидатов искать и нужен ли реранкинг, решается по форме оценок.
+
+По косинусным оценкам векторного поиска (у RRF оценки зависят только от рангов и почти всегда плоские):
+    confident  явный лидер (отрыв top1 - top2 >= margin и top1 >= min_top_score):
+               реранкинг пропускаем, лидер идёт первым (leader_first), в контекст — меньше чанков (confident_n)
+    flat       оценки ровные (нормированная энтропия softmax(top-k / temperature) >= flat_entropy):
+               берём больше кандидатов (deep_k: 2K, не больше max_k)
+    normal     всё как раньше: K, реранкинг, N
+
+Решение принимается по ответу ног, поэтому ноги сразу возвращают deep_k(K) документов — у всех вопросов,
+и у confident тоже: лишние документы стоят времени передачи, повторный поиск для flat стоил бы ещё
+одного сетевого обмена. Сколько стоит этот запас, видно в бенчмарке (строка "ноги по K").
+
+Включается явно (ADAPTIVE_DEPTH=true в rag_production). Пороги по умолчанию подобраны
+на модели в benchmarks/bench_adaptive_depth.py: попадание в контекст не ниже, чем у фиксированной глубины,
+средняя задержка ниже. temperature подобрана так, чтобы энтропия различала обычные и плоские оценки
+(при 0.05 почти любые оценки без явного лидера выглядят плоскими).
+Если задан log_path, каждое решение дописывается в JSONL-лог, чтобы подбирать пороги на своих вопросах:
+    python -m src.adaptive_depth <лог.jsonl>
+"""
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from .fusion import doc_key
+
+
+def score_shape(scores, temperature: float = 0.02):
+    """Отрыв лидера и нормированная энтропия (0 — один явный лидер, 1 — все равны)."""
+    scores = np.sort(np.asarray(scores, dtype=np.float64))[::-1]
+    if len(scores) == 0:
+        return {"top": 0.0, "margin": 0.0, "entropy": 1.0}
+    if len(scores) == 1:
+        return {"top": float(scores[0]), "margin": float(scores[0]), "entropy": 0.0}
+    weights = np.exp((scores - scores[0]) / temperature)
+    p = weights / weights.sum()
+    entropy = float(-(p * np.log(p + 1e-12)).sum() / np.log(len(p)))
+    return {"top": float(scores[0]), "margin": float(scores[0] - scores[1]), "entropy": entropy}
+
+
+def leader_first(candidates, leader):
+    """Кандидаты RRF с лидером векторного поиска в начале: без реранкинга RRF может опустить его ниже N."""
+    if leader is None:
+        return candidates
+    key = doc_key(leader)
+    return [leader] + [doc for doc in candidates if doc_key(doc) != key]
+
+
+class DepthPolicy:
+    def __init__(self, base_k: int = 10, max_k: int = 40, base_n: int = 3, confident_n: int = 2,
+                 margin: float = 0.08, min_top_score: float = 0.45, flat_entropy: float = 0.7,
+                 temperature: float = 0.02, log_path=None):
+        self.base_k = base_k
+        self.max_k = max_k
+        self.base_n = base_n
+        self.confident_n = confident_n
+        self.margin = margin
+        self.min_top_score = min_top_score
+        self.flat_entropy = flat_entropy
+        self.temperature = temperature
+        self.log_path = log_path
+        self.lock = threading.Lock()
+
+    def deep_k(self, k: int) -> int:
+        """K для плоских оценок: столько ноги возвращают сразу, чтобы не повторять поиск."""
+        return min(self.max_k, k * 2)
+
+    def decide(self, scores, k: int):
+        """
+        scores — оценки векторного поиска (similarity), k — с каким K они получены.
+        Возвращает {"action", "k", "n", "rerank", "top", "margin", "entropy"}.
+        """
+        shape = score_shape(scores, self.temperature)
+        if not len(scores):
+            # Векторная нога не ответила — судить не по чему
+            return {"action": "normal", "k": k, "n": self.base_n, "rerank": True, **shape}
+        if shape["margin"] >= self.margin and shape["top"] >= self.min_top_score:
+            return {"action": "confident", "k": k, "n": self.confident_n, "rerank": False, **shape}
+        if shape["entropy"] >= self.flat_entropy and k < self.max_k:
+            return {"action": "flat", "k": self.deep_k(k), "n": self.base_n, "rerank": True, **shape}
+        return {"action": "normal", "k": k, "n": self.base_n, "rerank": True, **shape}
+
+    def log(self, question: str, decision: dict, **extra):
+        if not self.log_path:
+            return
+        record = {"time": time.time(), "question": question, **decision, **extra}
+        with self.lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def summarize(log_path):
+    """Сколько вопросов на каждое решение и среднее время ответа по ним."""
+    groups = defaultdict(list)
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            groups[record["action"]].append(record)
+    total = sum(len(records) for records in groups.values())
+    print(f"{'решение':<10} {'вопросов':>9} {'доля':>6} {'K':>5} {'N':>4} {'время, с':>9}")
+    for action, records in sorted(groups.items()):
+        seconds = [r["seconds"] for r in records if "seconds" in r]
+        print(f"{action:<10} {len(records):>9} {len(records) / total:>6.0%} "
+              f"{np.mean([r['k'] for r in records]):>5.1f} {np.mean([r['n'] for r in records]):>4.1f} "
+              f"{np.mean(seconds) if seconds else float('nan'):>9.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Использование: python -m src.adaptive_depth <лог.jsonl>")
+    summarize(sys.argv[1])
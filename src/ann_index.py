@@ -0,0 +1,314 @@
+"""
+Индексы приближённого поиска поверх MmapVectorStore.
+
+Режимы:
+    flat    точный перебор всех векторов
+    hnsw    граф HNSW (hnswlib), параметры M / ef_construction / ef_search
+    ivf     инвертированные списки с обученным грубым квантизатором (k-means), параметры nlist / nprobe
+    binary  бинарные коды (знак компонент) + отбор по расстоянию Хэмминга и точный пересчёт в float
+
+Индекс строится один раз и сохраняется в <папка хранилища>/index/<режим>/,
+при следующем запуске просто загружается, если версия содержимого хранилища та же
+(перезапись векторов без изменения их числа тоже меняет версию).
+
+Фильтр по payload приходит в search(..., rows=...) готовым списком строк-кандидатов
+(MmapVectorStore.filter_rows). Если кандидатов мало (<= FILTER_EXACT_FRACTION от всех строк),
+точно пересчитываются только они — это дешевле обхода индекса; иначе индекс обходит только разрешённые строки.
+"""
+import json
+import shutil
+import time
+
+import numpy as np
+
+BUILD_BLOCK = 65536  # Сколько строк читаем из хранилища за раз при построении
+FILTER_EXACT_FRACTION = 0.1  # Доля строк под фильтром, ниже которой считаем точно только их
+
+
+def _top(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _empty():
+    """Ответ поиска по пустому хранилищу: нет строк и оценок."""
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def iter_blocks(store, block=BUILD_BLOCK):
+    """Векторы хранилища блоками в float32 (с учётом масштаба int8)."""
+    for start in range(0, store.count, block):
+        end = min(start + block, store.count)
+        vectors = np.asarray(store.vectors[start:end], dtype=np.float32)
+        yield start, vectors * store.scales[start:end, None]
+
+
+class AnnIndex:
+    name = ""
+
+    def __init__(self, store, **params):
+        self.store = store
+        self.params = params
+
+    @property
+    def path(self):
+        return self.store.path / "index" / self.name
+
+    def build(self):
+        pass
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"count": self.store.count, "version": self.store.version, "params": self.build_params()}, f)
+
+    def load(self):
+        pass
+
+    def build_params(self):
+        """Параметры, от которых зависит построенный индекс (в отличие от параметров поиска)."""
+        return {}
+
+    def is_saved(self):
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return False
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return (meta["count"] == self.store.count and meta.get("version") == self.store.version
+                and meta["params"] == self.build_params())
+
+    def search(self, query, k: int = 10, rows=None):
+        """
+        Возвращает (строки хранилища, близость), по убыванию близости.
+        rows — строки-кандидаты после фильтра (по возрастанию) или None для поиска по всем.
+        """
+        raise NotImplementedError
+
+    def exact(self, query, k, rows):
+        """Точный пересчёт только строк-кандидатов."""
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = self.store.scores(query, rows=rows)
+        top = _top(scores, k)
+        return rows[top], scores[top]
+
+    def prefer_exact(self, rows):
+        return rows is not None and len(rows) <= FILTER_EXACT_FRACTION * self.store.count
+
+    def allowed(self, rows):
+        mask = np.zeros(self.store.count, dtype=bool)
+        mask[rows] = True
+        return mask
+
+
+class FlatIndex(AnnIndex):
+    name = "flat"
+
+    def search(self, query, k=10, rows=None):
+        if rows is not None:
+            return self.exact(query, k, rows)
+        scores = self.store.scores(query)
+        top = _top(scores, k)
+        return top, scores[top]
+
+
+class HNSWIndex(AnnIndex):
+    name = "hnsw"
+
+    def build_params(self):
+        return {"M": self.params.get("M", 16), "ef_construction": self.params.get("ef_construction", 200)}
+
+    def build(self):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("Для режима hnsw нужен пакет hnswlib: pip install hnswlib")
+        self.index = hnswlib.Index(space="ip", dim=self.store.dim)
+        self.index.init_index(max_elements=max(self.store.count, 1), **self.build_params())
+        for start, vectors in iter_blocks(self.store):
+            self.index.add_items(vectors, np.arange(start, start + len(vectors)))
+
+    def save(self):
+        super().save()
+        self.index.save_index(str(self.path / "hnsw.bin"))
+
+    def load(self):
+        import hnswlib
+        self.index = hnswlib.Index(space="ip", dim=self.store.dim)
+        self.index.load_index(str(self.path / "hnsw.bin"), max_elements=max(self.store.count, 1))
+
+    def search(self, query, k=10, rows=None):
+        if not self.store.count:
+            return _empty()
+        if rows is not None and (self.prefer_exact(rows) or len(rows) <= k):
+            return self.exact(query, k, rows)
+        k = min(k, self.store.count)
+        self.index.set_ef(max(self.params.get("ef_search", 64), k))
+        if rows is None:
+            labels, distances = self.index.knn_query(_normalize(query), k=k)
+        else:
+            # Фильтр внутри обхода графа: запрещённые узлы проходятся, но не попадают в ответ
+            mask = self.allowed(rows)
+            try:
+                labels, distances = self.index.knn_query(_normalize(query), k=k, filter=lambda label: mask[label])
+            except RuntimeError:
+                # Граф не нашёл k разрешённых узлов за ef шагов — считаем кандидатов точно
+                return self.exact(query, k, rows)
+        # В пространстве "ip" hnswlib возвращает 1 - скалярное произведение
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+
+class IVFIndex(AnnIndex):
+    name = "ivf"
+
+    def build_params(self):
+        return {
+            "nlist": self.params.get("nlist", 1024),
+            "train_size": self.params.get("train_size", 100_000),
+            "iterations": self.params.get("iterations", 10),
+        }
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def build(self):
+        params = self.build_params()
+        n = self.store.count
+        nlist = min(params["nlist"], n)
+        rng = np.random.default_rng(0)
+        if not n:
+            # Пустое хранилище: ни одного списка, поиск вернёт пустой ответ
+            self.centroids = np.empty((0, self.store.dim), dtype=np.float32)
+            self.order = np.empty(0, dtype=np.int64)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.list_vectors = np.empty((0, self.store.dim), dtype=np.float16)
+            return
+
+        # 1. Обучаем грубый квантизатор (сферический k-means) на выборке
+        sample_rows = np.sort(rng.choice(n, size=min(n, params["train_size"]), replace=False))
+        sample = np.asarray(self.store.vectors[sample_rows], dtype=np.float32) * self.store.scales[sample_rows, None]
+        self.centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(params["iterations"]):
+            assignment = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            # Пустые кластеры пересаживаем на случайные точки выборки
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            self.centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        # 2. Раскладываем все векторы по спискам
+        assignment = np.empty(n, dtype=np.int32)
+        for start, vectors in iter_blocks(self.store):
+            assignment[start:start + len(vectors)] = self._assign(vectors)
+        self.order = np.argsort(assignment, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=nlist))))
+
+        # 3. Копия векторов в порядке списков — при поиске читаем подряд, а не вразброс
+        self.list_vectors = np.empty((n, self.store.dim), dtype=np.float16)
+        for start in range(0, n, BUILD_BLOCK):
+            rows = self.order[start:start + BUILD_BLOCK]
+            block = np.asarray(self.store.vectors[np.sort(rows)], dtype=np.float32)
+            block *= self.store.scales[np.sort(rows), None]
+            # np.sort для последовательного чтения, затем возвращаем порядок списков
+            self.list_vectors[start:start + len(rows)] = block[np.argsort(np.argsort(rows))]
+
+    def save(self):
+        super().save()
+        np.save(self.path / "centroids.npy", self.centroids)
+        np.save(self.path / "order.npy", self.order)
+        np.save(self.path / "offsets.npy", self.offsets)
+        np.save(self.path / "list_vectors.npy", self.list_vectors)
+
+    def load(self):
+        self.centroids = np.load(self.path / "centroids.npy")
+        self.order = np.load(self.path / "order.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy")
+        self.list_vectors = np.load(self.path / "list_vectors.npy", mmap_mode="r")
+
+    def search(self, query, k=10, rows=None):
+        if not self.store.count:
+            return _empty()
+        if self.prefer_exact(rows):
+            return self.exact(query, k, rows)
+        q = _normalize(query)
+        nprobe = min(self.params.get("nprobe", 16), len(self.centroids))
+        lists = _top(self.centroids @ q, nprobe)
+        positions = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if rows is not None:
+            # Из просмотренных списков считаем только разрешённые строки
+            positions = positions[self.allowed(rows)[self.order[positions]]]
+        scores = np.asarray(self.list_vectors[positions], dtype=np.float32) @ q
+        top = _top(scores, k)
+        return np.asarray(self.order[positions[top]], dtype=np.int64), scores[top]
+
+
+class BinaryIndex(AnnIndex):
+    name = "binary"
+
+    def build(self):
+        self.codes = np.empty((self.store.count, (self.store.dim + 7) // 8), dtype=np.uint8)
+        for start, vectors in iter_blocks(self.store):
+            self.codes[start:start + len(vectors)] = np.packbits(vectors > 0, axis=1)
+
+    def save(self):
+        super().save()
+        np.save(self.path / "codes.npy", self.codes)
+
+    def load(self):
+        self.codes = np.load(self.path / "codes.npy", mmap_mode="r")
+
+    def search(self, query, k=10, rows=None):
+        if not self.store.count:
+            return _empty()
+        if rows is not None and len(rows) <= k * self.params.get("rescore", 10):
+            return self.exact(query, k, rows)
+        q = _normalize(query)
+        code = np.packbits(q > 0)
+        # 1. Грубый отбор по Хэммингу (только среди строк под фильтром), 2. точный пересчёт по float-векторам
+        codes = self.codes if rows is None else self.codes[rows]
+        hamming = np.bitwise_count(np.bitwise_xor(codes, code)).sum(axis=1, dtype=np.int32)
+        n_candidates = min(k * self.params.get("rescore", 10), len(hamming))
+        candidates = np.sort(np.argpartition(hamming, n_candidates - 1)[:n_candidates])
+        if rows is not None:
+            candidates = np.asarray(rows)[candidates]
+        scores = self.store.scores(q, rows=candidates)
+        top = _top(scores, k)
+        return candidates[top].astype(np.int64), scores[top]
+
+
+INDEX_MODES = {
+    "flat": FlatIndex,
+    "hnsw": HNSWIndex,
+    "ivf": IVFIndex,
+    "binary": BinaryIndex,
+}
+
+
+def open_index(store, mode: str = "flat", rebuild: bool = False, **params):
+    """
+    Загружает индекс с диска или строит и сохраняет его.
+    Параметры поиска (ef_search, nprobe, rescore) можно менять без перестройки.
+    """
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Неизвестный режим индекса: {mode}. Доступны: {', '.join(INDEX_MODES)}")
+    index = INDEX_MODES[mode](store, **params)
+    if index.is_saved() and not rebuild:
+        index.load()
+        return index
+    print(f"🏗️ Строю индекс '{mode}' по {store.count} векторам...")
+    start = time.time()
+    if index.path.exists():
+        shutil.rmtree(index.path)
+    index.build()
+    index.save()
+    print(f"✅ Индекс '{mode}' построен за {time.time() - start:.1f} сек")
+    return index
@@ -0,0 +1,87 @@
+"""
+Выбор бэкенда поиска для скриптов на Supabase: RETRIEVAL_BACKEND=supabase (по умолчанию), local или postgres.
+
+get_client() возвращает объект с тем же интерфейсом, что и клиент Supabase в наших скриптах:
+    client.rpc("match_documents" | "kw_match_documents", params).execute().data
+    client.table("documents").insert(rows).execute()
+    client.table("documents").upsert(rows, ignore_duplicates=True).execute()   # строки со своим "id"
+поэтому search_vectors / search_keywords / ingest не меняются, меняется только создание клиента.
+"""
+import os
+from collections import namedtuple
+
+from .local_hybrid import LocalHybridIndex
+
+Response = namedtuple("Response", ["data"])
+
+
+class _Call:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return Response(self.fn())
+
+
+class _LocalTable:
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, rows, ignore_duplicates: bool = False):
+        # Индекс только дописывается: строка с уже известным id пропускается (у такого id тот же текст)
+        return self.insert(rows)
+
+    def insert(self, rows):
+        rows = rows if isinstance(rows, list) else [rows]
+
+        def insert_and_save():
+            # Сохраняем сразу (на диск дописывается только эта пачка, отдельным сегментом):
+            # чекпоинт загрузки считает пачку записанной после execute()
+            ids = self.index.add(rows)
+            self.index.save()
+            return [{"id": doc_id} for doc_id in ids]
+        return _Call(insert_and_save)
+
+
+class LocalClient:
+    """Supabase-подобный клиент поверх LocalHybridIndex: поиск без сети, в памяти процесса."""
+
+    def __init__(self, path):
+        self.index = LocalHybridIndex(path)
+
+    def rpc(self, name, params):
+        if name == "match_documents":
+            return _Call(lambda: self.index.match_documents(
+                params["query_embedding"], params.get("match_threshold", 0.0), params.get("match_count", 5)))
+        if name == "kw_match_documents":
+            return _Call(lambda: self.index.kw_match_documents(params["query_text"], params.get("match_count", 5)))
+        raise ValueError(f"Локальный бэкенд не знает RPC '{name}'")
+
+    def compact(self):
+        """Сливает сегменты индекса в один — после загрузки, чтобы следующий старт читал меньше файлов."""
+        self.index.compact()
+
+    def table(self, name):
+        if name != "documents":
+            raise ValueError(f"Локальный бэкенд хранит только таблицу documents, а не '{name}'")
+        return _LocalTable(self.index)
+
+
+def get_client(backend: str = None):
+    # Переменные читаются при вызове, а не при импорте: скрипты делают load_dotenv() после импортов
+    backend = backend or os.environ.get("RETRIEVAL_BACKEND", "supabase")
+    if backend == "local":
+        return LocalClient(os.environ.get("LOCAL_INDEX_DIR", "data/local_hybrid"))
+    if backend == "postgres":
+        # Напрямую в Postgres/pgvector, минуя REST (см. src/pg_backend.py)
+        from .pg_backend import PostgresClient
+        return PostgresClient(
+            os.environ.get("PG_DSN"),
+            min_size=int(os.environ.get("PG_POOL_MIN", 1)),
+            max_size=int(os.environ.get("PG_POOL_MAX", 10)),
+            statement_timeout=float(os.environ.get("RETRIEVAL_TIMEOUT", 5)),
+        )
+    if backend == "supabase":
+        from supabase import create_client
+        return create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+    raise ValueError(f"Неизвестный RETRIEVAL_BACKEND: {backend}. Доступны: supabase, local, postgres")
@@ -0,0 +1,376 @@
+"""
+Много именованных коллекций (по одной на клиента) в одном процессе.
+
+Папка коллекций:
+    <root>/<имя>/            отдельный MmapVectorStore (meta.json, vectors.bin, ...) и его index/<режим>/
+    <root>/access.jsonl      журнал обращений {"time", "collection"} (путь настраивается)
+
+- старт не зависит от числа коллекций: при создании менеджера ничего не открывается и не сканируется;
+- коллекция открывается при первом обращении (mmap файлов + загрузка/построение ANN-индекса);
+- открытые коллекции вытесняются по LRU, как только их суммарный объём превышает memory_limit_mb;
+  вытесненная закрывается сразу или, если по ней идёт поиск (use()), после его окончания;
+- обращения копятся в памяти и дописываются в журнал пачкой (ACCESS_LOG_FLUSH штук или раз в
+  ACCESS_LOG_FLUSH_SECONDS), журнал длиннее ACCESS_LOG_MAX строк ужимается до последних ACCESS_LOG_WINDOW;
+- warm() в фоне открывает самые частые коллекции из журнала (частота с затуханием по half_life),
+  пока они помещаются в лимит, и читает их векторы, чтобы страницы были в page cache до первого вопроса.
+
+Объём коллекции считается по данным, которые поиск реально трогает: count строк всех столбцов
+хранилища + файлы индекса. Payload'ы читаются точечно по найденным строкам и в лимит не входят.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from .ann_index import open_index
+from .mmap_store import MmapVectorStore
+
+_NAME = re.compile(r"^[\w\-]+$")
+ACCESS_LOG_WINDOW = 100_000  # Сколько последних записей журнала учитываем при прогреве
+ACCESS_LOG_MAX = 2 * ACCESS_LOG_WINDOW  # Длиннее журнал ужимается до последних ACCESS_LOG_WINDOW строк
+ACCESS_LOG_FLUSH = 1000      # Сколько обращений копим в памяти до дозаписи в журнал
+ACCESS_LOG_FLUSH_SECONDS = 10.0  # ...но не дольше стольких секунд
+PREFETCH_BLOCK = 65536       # Сколько строк читаем за раз при прогреве page cache
+
+
+def _dir_bytes(path: Path) -> int:
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _row_bytes(meta: dict, payload_columns: int) -> int:
+    """Байт на строку: вектор + scale (4) + id (16) + offsets (16) + столбцы payload-индекса (по 4)."""
+    return meta["dim"] * np.dtype(meta["dtype"]).itemsize + 4 + 16 + 16 + 4 * payload_columns
+
+
+class Collection:
+    """Одна коллекция: хранилище + лениво открываемый ANN-индекс."""
+
+    def __init__(self, name: str, path, dim: int = 384, dtype: str = "float16", create: bool = False,
+                 index_mode: str = "flat", index_params: dict = None):
+        self.name = name
+        # Без create размерность не передаём: отсутствующая коллекция даёт FileNotFoundError
+        self.store = MmapVectorStore(path, dim=dim if create else None, dtype=dtype)
+        self.index_mode = index_mode
+        self.index_params = index_params or {}
+        self._index = None
+        self._index_bytes = 0
+        self._users = 0         # Сколько поисков сейчас держат коллекцию (use())
+        self._retired = False   # Вытеснена: закроется, когда users станет 0
+        self._users_lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = open_index(self.store, self.index_mode, **self.index_params)
+            self._index_bytes = _dir_bytes(self.store.path / "index" / self.index_mode)
+        return self._index
+
+    def invalidate(self):
+        """Данные изменились — индекс перестроится при следующем поиске."""
+        self._index = None
+        self._index_bytes = 0
+
+    def memory_bytes(self) -> int:
+        columns = len([name for name in self.store._files() if name.startswith("payload_")])
+        return self.store.count * _row_bytes(self.store.meta, columns) + self._index_bytes
+
+    def prefetch(self):
+        """Читает векторы и масштабы блоками, чтобы первый поиск не ждал диск."""
+        for start in range(0, self.store.count, PREFETCH_BLOCK):
+            end = min(start + PREFETCH_BLOCK, self.store.count)
+            np.asarray(self.store.vectors[start:end]).sum()
+            np.asarray(self.store.scales[start:end]).sum()
+
+    def close(self):
+        self.invalidate()
+        self.store.close()
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            close = self._retired and not self._users
+        if close:
+            self.close()
+
+    def retire(self):
+        """Коллекция больше не в менеджере: закрывается сразу или после последнего поиска по ней."""
+        with self._users_lock:
+            self._retired = True
+            close = not self._users
+        if close:
+            self.close()
+
+
+class CollectionManager:
+    def __init__(self, root, dim: int = 384, dtype: str = "float16", index_mode: str = "flat",
+                 index_params: dict = None, memory_limit_mb: float = 1024, access_log=None,
+                 half_life: float = 24 * 3600):
+        self.root = Path(root)
+        self.dim = dim
+        self.dtype = dtype
+        self.index_mode = index_mode
+        self.index_params = index_params or {}
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.access_log = Path(access_log) if access_log else self.root / "access.jsonl"
+        self.half_life = half_life
+
+        self.lock = threading.RLock()
+        self.loaded = OrderedDict()  # имя -> Collection; порядок = LRU (последний — самый свежий)
+        self._load_locks = {}        # имя -> Lock: одну коллекцию открывает один поток
+        self._log_lock = threading.Lock()
+        self._log_buffer = []        # Строки журнала, ещё не дописанные в файл
+        self._log_flushed = time.time()
+        self._log_lines = None       # Строк в файле журнала (считается при первой дозаписи)
+        self._warm_thread = None
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "warmed": 0}
+
+    # --- коллекции на диске ---
+
+    def path(self, name: str) -> Path:
+        if not _NAME.match(name):
+            raise ValueError(f"Недопустимое имя коллекции: '{name}' (буквы, цифры, '_' и '-')")
+        return self.root / name
+
+    def names(self):
+        """Коллекции на диске (по meta.json в подпапках)."""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "meta.json").exists())
+
+    def exists(self, name: str) -> bool:
+        return (self.path(name) / "meta.json").exists()
+
+    def _read_meta(self, name: str) -> dict:
+        with open(self.path(name) / "meta.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    def count(self, name: str) -> int:
+        """Число векторов в коллекции, не открывая её (0, если коллекции нет)."""
+        with self.lock:
+            collection = self.loaded.get(name)
+        if collection is not None:
+            return collection.store.count
+        return self._read_meta(name)["count"] if self.exists(name) else 0
+
+    # --- доступ ---
+
+    def get(self, name: str, create: bool = False, with_index: bool = True, record: bool = True) -> Collection:
+        """
+        Открытая коллекция (открывается при первом обращении). create=True создаёт пустую.
+        with_index=False — без загрузки индекса (для записи).
+        Коллекцию могут вытеснить и закрыть при следующем get() другой: из нескольких потоков — через use().
+        """
+        collection = self._open(name, create, record)
+        try:
+            return self._prepare(collection, name, with_index)
+        finally:
+            collection.release()
+
+    @contextmanager
+    def use(self, name: str, create: bool = False, with_index: bool = True, record: bool = True):
+        """get(), но коллекция не закрывается вытеснением, пока не вышли из with."""
+        collection = self._open(name, create, record)
+        try:
+            yield self._prepare(collection, name, with_index)
+        finally:
+            collection.release()
+
+    def _open(self, name: str, create: bool, record: bool) -> Collection:
+        """Коллекция из открытых или с диска — уже захваченная (acquire): вытеснение её не закроет."""
+        path = self.path(name)
+        if record:
+            self.record_access(name)
+        with self.lock:
+            collection = self.loaded.get(name)
+            if collection is not None:
+                self.loaded.move_to_end(name)
+                self.counters["hits"] += 1
+                collection.acquire()
+                return collection
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Пока ждали блокировку, коллекцию мог открыть другой поток
+            with self.lock:
+                collection = self.loaded.get(name)
+                if collection is not None:
+                    collection.acquire()
+                    return collection
+            start = time.time()
+            collection = Collection(name, path, self.dim, self.dtype, create, self.index_mode, self.index_params)
+            with self.lock:
+                self.loaded[name] = collection
+                self.counters["misses"] += 1
+                collection.acquire()
+            print(f"📂 Коллекция '{name}' открыта за {(time.time() - start) * 1000:.0f} мс "
+                  f"({collection.store.count} векторов)")
+            return collection
+
+    def _prepare(self, collection: Collection, name: str, with_index: bool) -> Collection:
+        if with_index and collection.store.count:
+            collection.index
+        self._evict(keep=name)
+        return collection
+
+    def invalidate(self, name: str):
+        with self.lock:
+            collection = self.loaded.get(name)
+        if collection is not None:
+            collection.invalidate()
+
+    def memory_bytes(self) -> int:
+        with self.lock:
+            return sum(c.memory_bytes() for c in self.loaded.values())
+
+    def _evict(self, keep: str = None):
+        """Закрывает самые давние коллекции, пока не уложимся в лимит (keep не трогаем)."""
+        evicted = []
+        with self.lock:
+            used = self.memory_bytes()
+            for name in list(self.loaded):
+                if used <= self.memory_limit:
+                    break
+                if name == keep:
+                    continue
+                collection = self.loaded.pop(name)
+                used -= collection.memory_bytes()
+                evicted.append(collection)
+                self.counters["evictions"] += 1
+                print(f"♻️ Коллекция '{name}' выгружена (LRU, лимит {self.memory_limit // 2**20} МБ)")
+        # Поиск в другом потоке мог держать коллекцию (use()) — тогда она закроется после него
+        for collection in evicted:
+            collection.retire()
+
+    def drop(self, name: str):
+        """Убирает коллекцию из открытых и закрывает её (после текущих поисков); файлы на диске остаются."""
+        with self.lock:
+            collection = self.loaded.pop(name, None)
+        if collection is not None:
+            collection.retire()
+
+    def close(self):
+        self.flush_access_log()
+        with self.lock:
+            for name in list(self.loaded):
+                self.drop(name)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                "loaded": list(self.loaded),
+                "memory_mb": round(self.memory_bytes() / 2**20, 1),
+                "limit_mb": round(self.memory_limit / 2**20, 1),
+            }
+
+    # --- журнал обращений и прогрев ---
+
+    def record_access(self, name: str):
+        """Обращение копится в памяти; в файл — пачкой (ACCESS_LOG_FLUSH штук или раз в ACCESS_LOG_FLUSH_SECONDS)."""
+        now = time.time()
+        line = json.dumps({"time": now, "collection": name}, ensure_ascii=False) + "\n"
+        with self._log_lock:
+            self._log_buffer.append(line)
+            if len(self._log_buffer) >= ACCESS_LOG_FLUSH or now - self._log_flushed >= ACCESS_LOG_FLUSH_SECONDS:
+                self._flush_log()
+
+    def flush_access_log(self):
+        with self._log_lock:
+            self._flush_log()
+
+    def _flush_log(self):
+        """Дописывает накопленное и ужимает журнал длиннее ACCESS_LOG_MAX строк. Вызывается под _log_lock."""
+        self._log_flushed = time.time()
+        if not self._log_buffer:
+            return
+        self.access_log.parent.mkdir(parents=True, exist_ok=True)
+        if self._log_lines is None:
+            self._log_lines = 0
+            if self.access_log.exists():
+                with open(self.access_log, encoding="utf-8") as f:
+                    self._log_lines = sum(1 for _ in f)
+        with open(self.access_log, "a", encoding="utf-8") as f:
+            f.writelines(self._log_buffer)
+        self._log_lines += len(self._log_buffer)
+        self._log_buffer = []
+        if self._log_lines > ACCESS_LOG_MAX:
+            # Прогрев читает только последние ACCESS_LOG_WINDOW строк — остальное не нужно
+            with open(self.access_log, encoding="utf-8") as f:
+                lines = deque(f, maxlen=ACCESS_LOG_WINDOW)
+            tmp_path = self.access_log.with_name(self.access_log.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self.access_log)
+            self._log_lines = len(lines)
+
+    def hot_collections(self, now: float = None):
+        """[(имя, вес)] по убыванию: каждое обращение весит 0.5 ** (возраст / half_life)."""
+        self.flush_access_log()
+        if not self.access_log.exists():
+            return []
+        now = now if now is not None else time.time()
+        with open(self.access_log, encoding="utf-8") as f:
+            lines = deque(f, maxlen=ACCESS_LOG_WINDOW)
+        weights = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Недописанная строка (процесс упал посреди записи)
+            age = max(0.0, now - entry["time"])
+            weights[entry["collection"]] = weights.get(entry["collection"], 0.0) + 0.5 ** (age / self.half_life)
+        return sorted(weights.items(), key=lambda item: -item[1])
+
+    def _estimate_bytes(self, name: str) -> int:
+        """Объём ещё не открытой коллекции — по meta.json и файлам индекса, без mmap."""
+        path = self.path(name)
+        meta = self._read_meta(name)
+        columns = len(list(path.glob("payload_*.bin")))
+        return meta["count"] * _row_bytes(meta, columns) + _dir_bytes(path / "index" / self.index_mode)
+
+    def warm(self, limit: int = None):
+        """Открывает самые частые коллекции из журнала, пока они помещаются в лимит памяти."""
+        budget = self.memory_limit - self.memory_bytes()
+        warmed = []
+        for name, _ in self.hot_collections()[:limit]:
+            with self.lock:
+                if name in self.loaded:
+                    continue
+            if not _NAME.match(name) or not self.exists(name):
+                continue
+            size = self._estimate_bytes(name)
+            if size > budget:
+                continue
+            with self.use(name, record=False) as collection:
+                collection.prefetch()
+            budget -= size
+            warmed.append(name)
+        with self.lock:
+            self.counters["warmed"] += len(warmed)
+        if warmed:
+            print(f"🔥 Прогреты коллекции: {', '.join(warmed)}")
+        return warmed
+
+    def start_warming(self, limit: int = None):
+        """Прогрев в фоновом потоке: запросы обслуживаются сразу, не дожидаясь его."""
+        def run():
+            try:
+                self.warm(limit)
+            except Exception as e:
+                print(f"⚠️ Прогрев коллекций прерван: {e}")
+
+        self._warm_thread = threading.Thread(target=run, daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
@@ -18,3 +18,52 @@ VECTORSTORE_DIR = BASE_DIR / "data" / "chroma_db"
 # Настройки чанкинга
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+
+# Сервер Ollama (для замеров можно направить на заглушку: python -m benchmarks.stubs ollama)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# Модель эмбеддингов (Ollama)
+EMBEDDING_MODEL = "all-minilm"
+
+# Модель для ответов (Ollama)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemma3:1b")
+
+# Бюджет контекста для LLM в токенах (чанки склеиваются и обрезаются, см. context_packer)
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", 2000))
+
+# Печатать ответ в чате по мере генерации (иначе — целиком после завершения)
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "true").lower() == "true"
+
+# Манифест инкрементальной индексации (хеши страниц и id чанков), лежит рядом с Chroma
+INDEX_MANIFEST_PATH = BASE_DIR / "data" / "chroma_manifest.json"
+
+# Сколько чанков эмбеддить и отправлять в Chroma за раз
+INDEX_BATCH_SIZE = 64
+
+# Манифест загрузки корпуса (время разбора и ошибки по каждому файлу)
+CORPUS_MANIFEST_PATH = BASE_DIR / "data" / "corpus_manifest.json"
+
+# Процессов для параллельного разбора файлов (None = по числу ядер)
+LOADER_WORKERS = None
+
+# Режим чанкинга: "recursive" (по символам) или "tokens" (по токенам модели эмбеддингов)
+SPLITTER_MODE = os.getenv("SPLITTER_MODE", "recursive")
+
+# Токенизатор модели эмбеддингов (all-minilm в Ollama = all-MiniLM-L6-v2)
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# all-MiniLM обрезает вход на 256 word-piece (включая [CLS] и [SEP])
+CHUNK_TOKENS = 254
+CHUNK_OVERLAP_TOKENS = 32
+
+# Дисковый кеш эмбеддингов (общий для всех скриптов): EMBED_CACHE=true в .env
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "false").lower() == "true"
+EMBED_CACHE_DIR = Path(os.getenv("EMBED_CACHE_DIR", BASE_DIR / "data" / "embed_cache"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX", 200_000))
+EMBED_CACHE_DTYPE = os.getenv("EMBED_CACHE_DTYPE", "float16")
+
+# Семантический чанкинг (SPLITTER_MODE=semantic)
+SEMANTIC_THRESHOLD_TYPE = os.getenv("SEMANTIC_THRESHOLD_TYPE", "percentile")  # percentile | standard_deviation | interquartile | gradient
+SEMANTIC_THRESHOLD_AMOUNT = None  # None = значение по умолчанию для типа порога
+SEMANTIC_BUFFER_SIZE = 1          # Сколько соседних предложений брать в окно при эмбеддинге
+SEMANTIC_BATCH_SIZE = 256         # Сколько предложений эмбеддить за один запрос
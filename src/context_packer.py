@@ -0,0 +1,175 @@
+"""
+Сборка контекста для LLM из найденных чанков с бюджетом токенов.
+
+Чанки нарезаются с перекрытием (chunk_overlap=200), поэтому соседние найденные куски
+повторяют друг друга. Здесь:
+1. Чанки одной страницы одного файла, которые пересекаются или идут подряд, склеиваются:
+   по смещениям start_index (если splitter их сохранил), иначе по совпадению конца одного с началом другого.
+2. Почти одинаковые фрагменты (похожесть по словным 3-граммам >= порога) выкидываются.
+3. Фрагменты добавляются в порядке ранга, пока помещаются в бюджет токенов целевой модели.
+
+Принимает и документы Supabase ({'content', 'metadata'}), и Document из LangChain,
+возвращает тот же тип. Токены считает tiktoken; если его нет — приблизительно (4 символа на токен).
+"""
+import re
+from functools import lru_cache
+
+MIN_TEXT_OVERLAP = 40      # Сколько символов должно совпасть, чтобы склеить чанки без смещений
+MAX_TEXT_OVERLAP = 400     # Дальше перекрытие не ищем (chunk_overlap=200 с запасом)
+DUPLICATE_THRESHOLD = 0.8  # Доля общих 3-грамм, при которой фрагмент считается дубликатом
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Не модель OpenAI (например, gemma в Ollama): cl100k — разумное приближение
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Словарь BPE скачивается при первом обращении: без сети (или с битым кешем) считаем приблизительно
+        print(f"⚠️ tiktoken недоступен ({type(e).__name__}), токены считаются приблизительно")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# --- единый вид для документов Supabase и LangChain ---
+
+def _text(doc):
+    return doc.page_content if hasattr(doc, "page_content") else doc["content"]
+
+
+def _metadata(doc):
+    return (doc.metadata if hasattr(doc, "page_content") else doc.get("metadata")) or {}
+
+
+def _rebuild(doc, text, start):
+    metadata = dict(_metadata(doc))
+    if start is not None:
+        metadata["start_index"] = start
+    if hasattr(doc, "page_content"):
+        return type(doc)(page_content=text, metadata=metadata)
+    return {**doc, "content": text, "metadata": metadata}
+
+
+# --- склейка ---
+
+def _text_overlap(left: str, right: str) -> int:
+    """Длина совпадения конца left с началом right (0, если меньше MIN_TEXT_OVERLAP)."""
+    if len(right) < MIN_TEXT_OVERLAP:
+        return 0
+    probe = right[:MIN_TEXT_OVERLAP]
+    position = left.find(probe, max(0, len(left) - MAX_TEXT_OVERLAP))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def _merge_group(items):
+    """items — [(ранг, документ)] одной страницы одного файла. Возвращает склеенные фрагменты."""
+    with_offsets = [(rank, doc) for rank, doc in items if _metadata(doc).get("start_index") is not None]
+    without_offsets = [(rank, doc) for rank, doc in items if _metadata(doc).get("start_index") is None]
+
+    merged = []
+    # По смещениям: сортируем по началу и склеиваем пересекающиеся / соседние
+    spans = sorted(with_offsets, key=lambda item: _metadata(item[1])["start_index"])
+    for rank, doc in spans:
+        start, text = _metadata(doc)["start_index"], _text(doc)
+        if merged and merged[-1]["start"] is not None and start <= merged[-1]["start"] + len(merged[-1]["text"]):
+            last = merged[-1]
+            tail = start + len(text) - (last["start"] + len(last["text"]))
+            if tail > 0:
+                last["text"] += text[-tail:]
+            last["rank"] = min(last["rank"], rank)
+            last["parts"] += 1
+        else:
+            merged.append({"rank": rank, "doc": doc, "text": text, "start": start, "parts": 1})
+
+    # Без смещений: ищем совпадение конца одного чанка с началом другого
+    for rank, doc in sorted(without_offsets, key=lambda item: item[0]):
+        text = _text(doc)
+        for other in merged:
+            after, before = _text_overlap(other["text"], text), _text_overlap(text, other["text"])
+            if after:
+                other["text"] += text[after:]
+            elif before:
+                other["text"] = text + other["text"][before:]
+                other["start"] = None
+            else:
+                continue
+            other["rank"] = min(other["rank"], rank)
+            other["parts"] += 1
+            break
+        else:
+            merged.append({"rank": rank, "doc": doc, "text": text, "start": None, "parts": 1})
+    return merged
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def pack_context(docs, budget_tokens: int = 3000, model: str = "gpt-3.5-turbo"):
+    """
+    docs — найденные документы, лучшие первыми.
+    Возвращает (packed, stats): packed — фрагменты в порядке ранга, stats —
+    {"chunks", "passages", "merged", "duplicates", "dropped", "input_tokens", "output_tokens", "saved_tokens"}.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        metadata = _metadata(doc)
+        groups.setdefault((metadata.get("source"), metadata.get("page")), []).append((rank, doc))
+
+    passages = sorted((p for items in groups.values() for p in _merge_group(items)), key=lambda p: p["rank"])
+
+    # Почти-дубликаты: оставляем фрагмент с лучшим рангом
+    kept, duplicates = [], 0
+    for passage in passages:
+        shingles = _shingles(passage["text"])
+        if any(len(shingles & other) >= DUPLICATE_THRESHOLD * min(len(shingles), len(other)) for _, other in kept):
+            duplicates += 1
+            continue
+        kept.append((passage, shingles))
+
+    packed, used, dropped = [], 0, 0
+    for passage, _ in kept:
+        tokens = count_tokens(passage["text"], model)
+        if used + tokens > budget_tokens:
+            dropped += 1
+            continue
+        used += tokens
+        packed.append(_rebuild(passage["doc"], passage["text"], passage["start"]))
+
+    input_tokens = sum(count_tokens(_text(doc), model) for doc in docs)
+    stats = {
+        "chunks": len(docs),
+        "passages": len(packed),
+        "merged": sum(p["parts"] - 1 for p in passages),
+        "duplicates": duplicates,
+        "dropped": dropped,
+        "input_tokens": input_tokens,
+        "output_tokens": used,
+        "saved_tokens": input_tokens - used,
+    }
+    return packed, stats
+
+
+def format_stats(stats) -> str:
+    return (f"{stats['input_tokens']} → {stats['output_tokens']} токенов (−{stats['saved_tokens']}), "
+            f"склеено: {stats['merged']}, дубликатов: {stats['duplicates']}, не влезло: {stats['dropped']}")
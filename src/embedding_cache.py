@@ -0,0 +1,333 @@
+"""
+Дисковый кеш эмбеддингов: SQLite (ключ -> строка матрицы) + memory-mapped матрица float16/float32.
+
+Ключ — (модель, sha256 нормализованного текста). При переполнении вытесняются
+давно не использованные записи (LRU по last_access).
+Рядом с матрицей — метки строк (tags.u64, 8 байт ключа): читатель сверяет метку до и после чтения вектора,
+так что строка, которую в этот момент перезаписывает другой процесс, считается промахом, а не чужим вектором.
+Включается через EMBED_CACHE=true; обёртки cached_encoder/cached_embeddings
+возвращают модель как есть, если кеш выключен.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import EMBED_CACHE_ENABLED, EMBED_CACHE_DIR, EMBED_CACHE_MAX_ENTRIES, EMBED_CACHE_DTYPE
+
+# Какую долю кеша освобождать за одно вытеснение
+EVICT_FRACTION = 0.05
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def text_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def key_tag(key: str) -> int:
+    """Метка строки матрицы: первые 8 байт ключа (0 = строка пишется или ещё не помечена)."""
+    return int(key[:16], 16) | 1
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, cache_dir=EMBED_CACHE_DIR, max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 dtype: str = EMBED_CACHE_DTYPE):
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / re.sub(r"[^\w.-]+", "_", model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._matrix = None
+        self._tags = None
+
+        self.db = sqlite3.connect(self.dir / "index.sqlite", check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _meta(self, name, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _open_matrix(self, dim=None):
+        """Матрица создаётся при первой записи: размерность берём из векторов."""
+        if self._matrix is not None:
+            return self._matrix
+        stored_dim = self._meta("dim")
+        if stored_dim is None:
+            if dim is None:
+                return None
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(dim),))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dtype', ?)", (self.dtype.name,))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('capacity', ?)", (str(self.max_entries),))
+        dim = int(self._meta("dim"))
+        # Формат файла фиксируется при создании
+        self.dtype = np.dtype(self._meta("dtype"))
+        self.max_entries = int(self._meta("capacity"))
+        path = self.dir / f"vectors.{self.dtype.name}"
+        mode = "r+" if path.exists() else "w+"
+        self._matrix = np.memmap(path, dtype=self.dtype, mode=mode, shape=(self.max_entries, dim))
+        tags_path = self.dir / "tags.u64"
+        self._tags = np.memmap(tags_path, dtype=np.uint64, mode="r+" if tags_path.exists() else "w+",
+                               shape=(self.max_entries,))
+        return self._matrix
+
+    def get_many(self, texts):
+        """
+        Возвращает список: вектор (float32) для найденных текстов, None для промахов.
+        """
+        keys = [text_key(self.model_name, t) for t in texts]
+        with self.lock:
+            matrix = self._open_matrix()
+            found = {}
+            if matrix is not None:
+                unique = list(set(keys))
+                for start in range(0, len(unique), 500):
+                    part = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    for key, row in self.db.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})", part
+                    ):
+                        found[key] = row
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+            result = [self._read_row(found[k], k) if k in found else None for k in keys]
+            hits = sum(1 for r in result if r is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return result
+
+    def _read_row(self, row, key):
+        """
+        Копия вектора (не окно в memmap: строку может перезаписать вытеснение) или None,
+        если метка строки не совпала до и после чтения — строку занял другой ключ.
+        """
+        tag = key_tag(key)
+        if int(self._tags[row]) != tag:
+            return None
+        vector = np.array(self._matrix[row], dtype=np.float32)
+        return vector if int(self._tags[row]) == tag else None
+
+    def _allocate_row(self, free_rows):
+        """
+        Свободная строка матрицы. Вызывается только внутри BEGIN IMMEDIATE: список свободных строк
+        (free_rows) живёт одну транзакцию, иначе два процесса с общим кешем заняли бы одну строку.
+        """
+        if free_rows:
+            return free_rows.pop()
+        high = int(self._meta("high", 0))
+        if high < self.max_entries:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('high', ?)", (str(high + 1),))
+            return high
+        # Кеш полон. Сначала ищем строки, освобождённые другим процессом/до перезапуска
+        used = {row for (row,) in self.db.execute("SELECT row FROM entries")}
+        free_rows.extend(r for r in range(self.max_entries) if r not in used)
+        if not free_rows:
+            # LRU: выкидываем самые старые записи
+            n = max(1, int(self.max_entries * EVICT_FRACTION))
+            victims = self.db.execute(
+                "SELECT key, row FROM entries ORDER BY last_access LIMIT ?", (n,)
+            ).fetchall()
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+            free_rows.extend(row for _, row in victims)
+            self.evictions += len(victims)
+        return free_rows.pop()
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors)
+        with self.lock:
+            matrix = self._open_matrix(vectors.shape[1])
+            now = time.time()
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                free_rows = []
+                for text, vector in zip(texts, vectors):
+                    key = text_key(self.model_name, text)
+                    existing = self.db.execute("SELECT row FROM entries WHERE key = ?", (key,)).fetchone()
+                    row = existing[0] if existing else self._allocate_row(free_rows)
+                    # Снять метку -> записать вектор -> поставить метку: читатели не примут полузаписанную строку
+                    self._tags[row] = 0
+                    matrix[row] = vector
+                    self._tags[row] = key_tag(key)
+                    self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, row, now))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            matrix.flush()
+            self._tags.flush()
+
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "evictions": self.evictions,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model_name: str) -> EmbeddingCache:
+    """Один экземпляр кеша на модель в процессе."""
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def all_stats():
+    """Статистика всех кешей процесса, в том числе отдельных кешей encode с аргументами (имя — в "model")."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
+
+
+def _encode_with_cache(cache, texts, encode_fn):
+    """Достаёт из кеша всё, что есть; кодирует только промахи (одним вызовом)."""
+    cached = cache.get_many(texts)
+    missing = [i for i, v in enumerate(cached) if v is None]
+    if missing:
+        # Дубликаты внутри пачки кодируем один раз
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = np.asarray(encode_fn(unique_texts), dtype=np.float32)
+        cache.put_many(unique_texts, fresh)
+        by_text = dict(zip(unique_texts, fresh))
+        for i in missing:
+            cached[i] = by_text[texts[i]]
+    return cached
+
+
+# Не влияют на векторы — в ключ кеша не входят
+_NEUTRAL_KWARGS = {"batch_size", "show_progress_bar", "device", "convert_to_numpy"}
+# Значения по умолчанию в SentenceTransformer.encode: такой аргумент равносилен отсутствующему
+_DEFAULT_KWARGS = {"normalize_embeddings": False, "prompt": None, "prompt_name": None, "precision": "float32",
+                   "output_value": "sentence_embedding", "convert_to_tensor": False}
+# Меняют тип результата, а кеш хранит только float32-векторы
+_UNSUPPORTED_KWARGS = {"precision", "output_value", "convert_to_tensor"}
+
+
+def encode_cache_name(model_name: str, kwargs: dict) -> str:
+    """
+    Имя кеша для вызова encode: все аргументы, от которых зависят векторы, входят в ключ
+    (prompt, truncate_dim и т.п. — хешем), аргументы, меняющие тип результата, отклоняются.
+    """
+    options = {k: v for k, v in kwargs.items()
+               if k not in _NEUTRAL_KWARGS and (k not in _DEFAULT_KWARGS or _DEFAULT_KWARGS[k] != v)}
+    unsupported = sorted(set(options) & _UNSUPPORTED_KWARGS)
+    if unsupported:
+        raise ValueError(f"Кеш эмбеддингов не поддерживает encode({', '.join(unsupported)}=...) — "
+                         f"вызывайте модель без cached_encoder")
+    # Нормализованные и обычные векторы — разные записи кеша
+    name = model_name + ("|normalized" if options.pop("normalize_embeddings", False) else "")
+    if options:
+        digest = hashlib.sha256(json.dumps(sorted(options.items()), default=repr).encode("utf-8")).hexdigest()
+        name += f"|{digest[:16]}"
+    return name
+
+
+class CachedEncoder:
+    """
+    Обёртка над SentenceTransformer с тем же encode(): строка -> вектор, список -> матрица.
+    Остальные атрибуты модели доступны как обычно.
+    У каждого набора аргументов encode, меняющих векторы (normalize_embeddings, prompt, ...), свой кеш:
+    cache_for(**kwargs) — кеш для таких аргументов, caches — все кеши, которые encode уже заполнял.
+    """
+
+    def __init__(self, model, model_name: str):
+        self.model = model
+        self.model_name = model_name
+        self._cache_names = {}  # Имена кешей в порядке первого использования (dict как упорядоченное множество)
+        self._last_cache_name = model_name
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        name = encode_cache_name(self.model_name, kwargs)
+        self._cache_names[name] = None
+        self._last_cache_name = name
+        kwargs.pop("convert_to_numpy", None)
+        vectors = _encode_with_cache(
+            get_cache(name), texts,
+            lambda batch: self.model.encode(batch, convert_to_numpy=True, **kwargs),
+        )
+        if single:
+            return vectors[0]
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def cache_for(self, **kwargs) -> EmbeddingCache:
+        """Кеш, в который пишет encode(..., **kwargs)."""
+        return get_cache(encode_cache_name(self.model_name, kwargs))
+
+    @property
+    def caches(self) -> dict:
+        """Имя -> кеш для всех наборов аргументов, с которыми вызывался encode."""
+        return {name: get_cache(name) for name in list(self._cache_names)}
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        """Кеш последнего вызова encode (до первого вызова — кеш encode без аргументов)."""
+        return get_cache(self._last_cache_name)
+
+
+class CachedEmbeddings(Embeddings):
+    """То же для эмбеддингов LangChain (OllamaEmbeddings и т.п.)."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str):
+        self.embeddings = embeddings
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        vectors = _encode_with_cache(get_cache(self.model_name), list(texts), self.embeddings.embed_documents)
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text):
+        vectors = _encode_with_cache(
+            get_cache(self.model_name), [text],
+            lambda batch: [self.embeddings.embed_query(batch[0])],
+        )
+        return vectors[0].tolist()
+
+    @property
+    def cache(self):
+        return get_cache(self.model_name)
+
+
+def cached_encoder(model, model_name: str):
+    """SentenceTransformer с кешем, если EMBED_CACHE=true, иначе сама модель."""
+    return CachedEncoder(model, model_name) if EMBED_CACHE_ENABLED else model
+
+
+def cached_embeddings(embeddings, model_name: str):
+    """Embeddings LangChain с кешем, если EMBED_CACHE=true, иначе они же."""
+    return CachedEmbeddings(embeddings, model_name) if EMBED_CACHE_ENABLED else embeddings
@@ -0,0 +1,84 @@
+"""
+Слияние результатов нескольких поисков (векторный, ключевой, ...) в один список.
+
+Методы:
+    rrf      Reciprocal Rank Fusion: сумма weight / (rank + k) по всем спискам (rank с нуля)
+    minmax   выпуклая комбинация оценок, каждая нога нормируется в [0, 1]
+    zscore   выпуклая комбинация оценок, каждая нога нормируется (x - mean) / std
+
+Дубликаты склеиваются по id документа (dedup="id") или по хешу текста (dedup="content"),
+остаётся первое вхождение. Оценки считаются массивами NumPy, Python-цикл — только по документам
+для извлечения ключей, поэтому тысячи кандидатов на ногу сливаются за миллисекунды.
+"""
+import hashlib
+
+import numpy as np
+
+METHODS = ("rrf", "minmax", "zscore")
+
+
+def doc_key(doc, dedup: str = "id"):
+    if dedup == "content" or doc.get("id") is None:
+        return hashlib.sha1(doc["content"].encode("utf-8")).hexdigest()
+    return doc["id"]
+
+
+def _normalize(scores, method):
+    if method == "minmax":
+        spread = scores.max() - scores.min()
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+    std = scores.std()
+    return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+
+
+def fuse(result_lists, method: str = "rrf", weights=None, k: int = 60, dedup: str = "id",
+         score_key: str = "similarity", limit: int = None, with_scores: bool = False):
+    """
+    result_lists — списки документов каждой ноги, лучшие первыми.
+    weights      — вес каждой ноги (по умолчанию все 1).
+    score_key    — поле с оценкой для minmax / zscore.
+    Возвращает документы по убыванию итоговой оценки (или пары (документ, оценка) при with_scores).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Неизвестный метод слияния: {method}. Доступны: {', '.join(METHODS)}")
+    weights = np.ones(len(result_lists)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # Сопоставляем документы общим столбцам (порядок первого появления)
+    flat_docs = [doc for results in result_lists for doc in results]
+    if not flat_docs:
+        return []
+    keys = [doc.get("id") for doc in flat_docs] if dedup == "id" else [None]
+    if None in keys:
+        keys = [doc_key(doc, dedup) for doc in flat_docs]
+    positions = {}
+    columns = np.fromiter((positions.setdefault(key, len(positions)) for key in keys), dtype=np.int64,
+                          count=len(keys))
+    first = np.full(len(positions), len(keys), dtype=np.int64)
+    np.minimum.at(first, columns, np.arange(len(keys)))
+    docs = [flat_docs[i] for i in first]
+    bounds = np.cumsum([0] + [len(results) for results in result_lists])
+    leg_columns = [columns[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    scores = np.zeros(len(docs), dtype=np.float64)
+    for weight, results, columns in zip(weights, result_lists, leg_columns):
+        if not len(columns):
+            continue
+        if method == "rrf":
+            contribution = 1.0 / (np.arange(len(columns)) + k)
+        else:
+            raw = np.array([doc.get(score_key, 0.0) for doc in results], dtype=np.float64)
+            contribution = _normalize(raw, method)
+        np.add.at(scores, columns, weight * contribution)
+
+    # Стабильная сортировка: при равных оценках выигрывает документ, встреченный раньше
+    order = np.argsort(-scores, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    if with_scores:
+        return [(docs[i], float(scores[i])) for i in order]
+    return [docs[i] for i in order]
+
+
+def rrf_fusion(semantic_results, keyword_results, k: int = 60, limit: int = None):
+    """Прежняя сигнатура из скриптов: RRF двух списков."""
+    return fuse([semantic_results, keyword_results], method="rrf", k=k, limit=limit)
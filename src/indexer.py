@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+
+from .config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    SPLITTER_MODE,
+    EMBEDDING_MODEL,
+    INDEX_MANIFEST_PATH,
+    INDEX_BATCH_SIZE,
+)
+from .vectorstore import load_vectorstore
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    """
+    Отпечаток текста (страницы или чанка).
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(chunk) -> str:
+    """
+    Стабильный id чанка: источник + страница + содержимое.
+    Одинаковый чанк при повторном запуске получает тот же id.
+    """
+    source = str(chunk.metadata.get("source", ""))
+    page = str(chunk.metadata.get("page", ""))
+    return content_hash(f"{source}\x00{page}\x00{chunk.page_content}")
+
+
+def _settings():
+    # Если меняется модель или параметры нарезки — старые векторы несовместимы
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "splitter_mode": SPLITTER_MODE,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+    }
+
+
+def load_manifest():
+    if not INDEX_MANIFEST_PATH.exists():
+        return None
+    with open(INDEX_MANIFEST_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    INDEX_MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = INDEX_MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    # Атомарная замена: прерванный запуск не оставит битый манифест
+    os.replace(tmp_path, INDEX_MANIFEST_PATH)
+
+
+def _empty_manifest():
+    return {"version": MANIFEST_VERSION, "settings": _settings(), "sources": {}}
+
+
+def index_documents(docs, split_fn, prune_missing: bool = False):
+    """
+    Инкрементальная индексация страниц в Chroma.
+
+    Манифест (рядом с папкой Chroma) хранит хеш каждой страницы и id её чанков.
+    Нарезаются и эмбеддятся только новые/изменённые страницы,
+    чанки удалённых/изменённых страниц удаляются из Chroma.
+    docs может быть генератором. prune_missing=True удаляет также источники, которых нет в docs.
+    """
+    vs = load_vectorstore()
+    manifest = load_manifest()
+
+    if manifest is None or manifest.get("settings") != _settings():
+        # Нет манифеста или поменялись настройки — начинаем с чистой коллекции,
+        # иначе в ней останутся дубли от прошлых полных пересборок
+        print("[INDEXER] Манифест отсутствует или устарел — пересобираю коллекцию.")
+        vs.reset_collection()
+        manifest = _empty_manifest()
+
+    # Один проход по docs: можно передать генератор, неизменённые страницы не держим в памяти
+    changed_pages = []
+    old_ids = set()
+    new_entries = defaultdict(dict)
+    total_pages = 0
+
+    for doc in docs:
+        total_pages += 1
+        source = str(doc.metadata.get("source", ""))
+        key = str(doc.metadata.get("page", ""))
+        page_hash = content_hash(doc.page_content)
+        old = manifest["sources"].get(source, {}).get("pages", {}).get(key)
+        if old is not None and old["hash"] == page_hash:
+            new_entries[source][key] = old
+            continue
+        changed_pages.append(doc)
+        new_entries[source][key] = {"hash": page_hash, "chunks": []}
+        if old is not None:
+            old_ids.update(old["chunks"])
+
+    # Страницы, которых больше нет в источнике
+    for source, entry in new_entries.items():
+        for key, old in manifest["sources"].get(source, {}).get("pages", {}).items():
+            if key not in entry:
+                old_ids.update(old["chunks"])
+
+    removed_sources = []
+    if prune_missing:
+        removed_sources = [s for s in manifest["sources"] if s not in new_entries]
+        for source in removed_sources:
+            for old in manifest["sources"][source]["pages"].values():
+                old_ids.update(old["chunks"])
+
+    # Режем только изменённые страницы
+    chunks = split_fn(changed_pages) if changed_pages else []
+
+    to_add = {}
+    for chunk in chunks:
+        cid = chunk_id(chunk)
+        source = str(chunk.metadata.get("source", ""))
+        key = str(chunk.metadata.get("page", ""))
+        page_chunks = new_entries[source][key]["chunks"]
+        if cid not in page_chunks:
+            page_chunks.append(cid)
+        if cid not in old_ids:
+            to_add[cid] = chunk
+
+    new_ids = {cid for entry in new_entries.values() for page in entry.values() for cid in page["chunks"]}
+    stale_ids = sorted(old_ids - new_ids)
+    reused = len(new_ids) - len(to_add)
+
+    print(
+        f"[INDEXER] Страниц: {total_pages}, изменено: {len(changed_pages)} | "
+        f"чанков к эмбеддингу: {len(to_add)}, без изменений (по хешу): {reused}, к удалению: {len(stale_ids)}"
+    )
+
+    if stale_ids:
+        vs.delete(ids=stale_ids)
+
+    ids = list(to_add)
+    for start in range(0, len(ids), INDEX_BATCH_SIZE):
+        batch_ids = ids[start:start + INDEX_BATCH_SIZE]
+        # add_documents в langchain_chroma делает upsert, поэтому повтор после сбоя безопасен
+        vs.add_documents([to_add[cid] for cid in batch_ids], ids=batch_ids)
+        print(f"[INDEXER] Проиндексировано {min(start + INDEX_BATCH_SIZE, len(ids))}/{len(ids)}")
+
+    for source in removed_sources:
+        del manifest["sources"][source]
+    for source, entry in new_entries.items():
+        manifest["sources"][source] = {"pages": entry}
+    save_manifest(manifest)
+
+    return {"added": len(ids), "deleted": len(stale_ids), "unchanged": reused}
@@ -0,0 +1,501 @@
+"""
+Общий клиент LLM (OpenAI-совместимый API) для всех скриптов.
+
+Всё делается на уровне HTTP-транспорта httpx, поэтому одинаково работает под OpenAI SDK
+(sync и async) и под ChatOpenAI из LangChain:
+- пул соединений: один httpx-клиент на процесс, keep-alive вместо нового TLS на каждый вызов;
+- ограничитель на стороне клиента: token bucket на запросы в минуту (LLM_RPM) и токены в минуту (LLM_TPM).
+  Токены запроса оцениваются до отправки (промпт + max_tokens), после ответа сверяются с usage;
+- повтор на 429 / 5xx / обрыв соединения: экспоненциальная пауза со случайным джиттером,
+  заголовок Retry-After уважается;
+- хеджирование (LLM_HEDGE=true): если ответа нет дольше p95 прошлых попыток, уходит второй такой же запрос,
+  берётся первый успешный ответ (ошибка одного не отменяет второй, ещё идущий). Только если ограничитель
+  пускает второй запрос без ожидания. p95 — по времени отдельных успешных отправок, без повторов и пауз между
+  ними, и отсчитывается с момента, когда первый запрос реально ушёл, а не с постановки в пул;
+- async: пул соединений свой у каждого event loop (соединения httpx к циклу привязаны);
+- метрики каждого вызова: задержка, попытки, хедж, токены — llm_metrics() / format_metrics().
+
+Использование:
+    from src.llm_client import get_openai_client, get_chat_openai
+    openai_client = get_openai_client()
+    llm = get_chat_openai(model="gpt-3.5-turbo", temperature=0)
+
+Адрес сервера — OPENAI_BASE_URL (для замеров: python -m benchmarks.stubs openai).
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import httpx
+
+from .context_packer import count_tokens
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.TransportError,)
+DEFAULT_COMPLETION_TOKENS = 512   # Оценка ответа, если в запросе нет max_tokens
+MIN_HEDGE_SAMPLES = 20            # До этого числа вызовов p95 не считаем и не хеджируем
+
+
+class TokenBucket:
+    """
+    Ведро на rate_per_minute единиц, ёмкость — минутный запас.
+    reserve() сразу списывает единицы (баланс может уйти в минус) и говорит, сколько подождать:
+    так ожидающие выстраиваются в очередь без гонок, а sync и async код ждут каждый по-своему.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self.lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def try_reserve(self, amount: float) -> bool:
+        """Списывает, только если хватает без ожидания."""
+        with self.lock:
+            self._refill()
+            if self.level < amount:
+                return False
+            self.level -= amount
+            return True
+
+    def adjust(self, amount: float):
+        """Поправка после ответа: вернуть переоценку (amount < 0) или дописать недооценку."""
+        with self.lock:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class LLMMetrics:
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)  # Вызов целиком: с повторами и паузами между ними
+        self.attempts = deque(maxlen=window)   # Одна успешная отправка — по ней порог хеджа
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.throttled_seconds = 0.0
+
+    def record(self, seconds, status, attempts, hedged=False, hedge_won=False, usage=None, throttled=0.0):
+        with self.lock:
+            self.calls += 1
+            self.errors += status is None or status >= 400
+            self.retries += attempts - 1
+            self.hedges += hedged
+            self.hedge_wins += hedge_won
+            self.throttled_seconds += throttled
+            if status is not None and status < 400:
+                self.latencies.append(seconds)
+            if usage:
+                self.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def record_attempt(self, seconds):
+        with self.lock:
+            self.attempts.append(seconds)
+
+    def percentile(self, q, attempts: bool = False):
+        """Перцентиль задержки вызовов или (attempts=True) отдельных успешных отправок."""
+        with self.lock:
+            samples = self.attempts if attempts else self.latencies
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def snapshot(self):
+        with self.lock:
+            samples = len(self.latencies)
+            snapshot = {
+                "calls": self.calls, "errors": self.errors, "retries": self.retries,
+                "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                "throttled_seconds": self.throttled_seconds,
+            }
+        snapshot.update(p50=self.percentile(50), p95=self.percentile(95), samples=samples,
+                        attempt_p95=self.percentile(95, attempts=True), attempt_samples=len(self.attempts))
+        return snapshot
+
+
+class LLMPolicy:
+    """Общие для sync и async транспортов лимиты, повторы, хеджирование и метрики."""
+
+    def __init__(self, rpm: float = 500, tpm: float = 200_000, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_cap: float = 20.0, hedge: bool = False):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.metrics = LLMMetrics()
+
+    def estimate_tokens(self, request: httpx.Request) -> int:
+        """Промпт (по тексту сообщений) + ожидаемый ответ (max_tokens)."""
+        try:
+            payload = json.loads(request.content or b"{}")
+        except (ValueError, httpx.RequestNotRead):
+            return DEFAULT_COMPLETION_TOKENS
+        model = payload.get("model") or "gpt-3.5-turbo"
+        prompt = 0
+        for message in payload.get("messages") or []:
+            content = message.get("content")
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            prompt += count_tokens(content or "", model) + 4
+        if isinstance(payload.get("input"), str):
+            prompt += count_tokens(payload["input"], model)
+        completion = payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+        return prompt + completion
+
+    def admit(self, tokens: int) -> float:
+        """Сколько ждать перед отправкой, чтобы не выйти за RPM и TPM."""
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def admit_hedge(self, tokens: int) -> bool:
+        if not self.requests.try_reserve(1):
+            return False
+        if not self.tokens.try_reserve(tokens):
+            self.requests.adjust(-1)
+            return False
+        return True
+
+    def hedge_delay(self):
+        """p95 одной отправки: хедж подстраховывает попытку, а не вызов с повторами и паузами."""
+        if not self.hedge or len(self.metrics.attempts) < MIN_HEDGE_SAMPLES:
+            return None
+        return self.metrics.percentile(95, attempts=True)
+
+    def record_attempt(self, seconds, response):
+        if response.status_code < 400:
+            self.metrics.record_attempt(seconds)
+
+    def should_retry(self, response, attempt) -> bool:
+        return attempt < self.max_retries and (response is None or response.status_code in RETRY_STATUSES)
+
+    def backoff(self, response, attempt) -> float:
+        """Full jitter: случайно от 0 до base * 2^attempt; Retry-After сервера — нижняя граница."""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def settle(self, response, estimated):
+        """Читает usage из JSON-ответа (стрим не трогаем) и поправляет ведро токенов."""
+        if response is None or response.status_code >= 400:
+            self.tokens.adjust(-estimated)
+            return None
+        if not response.headers.get("content-type", "").startswith("application/json"):
+            return None
+        try:
+            usage = json.loads(response.content).get("usage") or None
+        except (ValueError, AttributeError):
+            return None
+        if usage and usage.get("total_tokens"):
+            self.tokens.adjust(usage["total_tokens"] - estimated)
+        return usage
+
+
+def _succeeded(future) -> bool:
+    """Запрос завершился ответом, который не нужно повторять (для выбора победителя хеджа)."""
+    if future.cancelled() or future.exception() is not None:
+        return False
+    return future.result().status_code not in RETRY_STATUSES
+
+
+def _first_success(first, second, done):
+    """Успешный из завершившихся (основной — при равенстве) или None."""
+    for future in (first, second):
+        if future in done and _succeeded(future):
+            return future
+    return None
+
+
+class PolicyTransport(httpx.BaseTransport):
+    def __init__(self, policy: LLMPolicy, transport: httpx.BaseTransport, max_in_flight: int = 20):
+        self.policy = policy
+        self.transport = transport
+        # На каждый запрос в полёте — поток основного и поток хеджа: основной не ждёт в очереди пула
+        self.hedge_pool = ThreadPoolExecutor(max_workers=2 * max_in_flight, thread_name_prefix="llm-hedge")
+
+    def _send(self, request, started=None):
+        if started is not None:
+            started.set()
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        if response.headers.get("content-type", "").startswith("application/json"):
+            response.read()
+        self.policy.record_attempt(time.perf_counter() - start, response)
+        return response
+
+    @staticmethod
+    def _discard(future):
+        """Ненужный ответ дочитывается в фоне и закрывается, чтобы вернуть соединение в пул."""
+        future.add_done_callback(lambda f: f.exception() is None and f.result().close())
+
+    def _send_hedged(self, request, estimated):
+        """(response, hedged, hedge_won)."""
+        delay = self.policy.hedge_delay()
+        if delay is None:
+            return self._send(request), False, False
+        started = threading.Event()
+        first = self.hedge_pool.submit(self._send, request, started)
+        started.wait()
+        done, _ = wait([first], timeout=delay)
+        if done or not self.policy.admit_hedge(estimated):
+            return first.result(), False, False
+        second = self.hedge_pool.submit(self._send, request)
+        # Первый успешный ответ; ошибка одного запроса не повод бросать второй, ещё идущий
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = _first_success(first, second, done)
+        if winner is None and pending:
+            done, pending = wait(pending)
+            winner = _first_success(first, second, done)
+        winner = winner or first  # Оба неудачны — решает повтор по ответу основного
+        self._discard(second if winner is first else first)
+        self.policy.tokens.adjust(-estimated)  # Токены хеджа не тратятся на ответ, который выкинем
+        return winner.result(), True, winner is second
+
+    def handle_request(self, request):
+        policy = self.policy
+        estimated = policy.estimate_tokens(request)
+        start = time.perf_counter()
+        throttled = 0.0
+        hedged = hedge_won = False
+        attempt = 0
+        while True:
+            wait_seconds = policy.admit(estimated)
+            if wait_seconds:
+                throttled += wait_seconds
+                time.sleep(wait_seconds)
+            try:
+                response, hedged_now, won = self._send_hedged(request, estimated)
+                hedged, hedge_won = hedged or hedged_now, hedge_won or won
+                error = None
+            except RETRY_ERRORS as e:
+                response, error = None, e
+            if not policy.should_retry(response, attempt):
+                break
+            delay = policy.backoff(response, attempt)
+            if response is not None:
+                response.close()
+            policy.tokens.adjust(-estimated)
+            attempt += 1
+            time.sleep(delay)
+
+        usage = policy.settle(response, estimated)
+        policy.metrics.record(time.perf_counter() - start - throttled, response.status_code if response else None,
+                              attempt + 1, hedged, hedge_won, usage, throttled)
+        if error is not None:
+            raise error
+        return response
+
+    def close(self):
+        self.hedge_pool.shutdown(wait=False)
+        self.transport.close()
+
+
+class AsyncPolicyTransport(httpx.AsyncBaseTransport):
+    """transport_factory() создаёт транспорт httpx: по одному на event loop, в котором идут запросы."""
+
+    def __init__(self, policy: LLMPolicy, transport_factory):
+        self.policy = policy
+        self.transport_factory = transport_factory
+        self.transports = weakref.WeakKeyDictionary()  # event loop -> транспорт
+        self.lock = threading.Lock()
+
+    @property
+    def transport(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            transport = self.transports.get(loop)
+            if transport is None:
+                transport = self.transports[loop] = self.transport_factory()
+            return transport
+
+    async def _send(self, request):
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        if response.headers.get("content-type", "").startswith("application/json"):
+            await response.aread()
+        self.policy.record_attempt(time.perf_counter() - start, response)
+        return response
+
+    async def _send_hedged(self, request, estimated):
+        delay = self.policy.hedge_delay()
+        if delay is None:
+            return await self._send(request), False, False
+        first = asyncio.ensure_future(self._send(request))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done or not self.policy.admit_hedge(estimated):
+            return await first, False, False
+        second = asyncio.ensure_future(self._send(request))
+        done, pending = await asyncio.wait([first, second], return_when=asyncio.FIRST_COMPLETED)
+        winner = _first_success(first, second, done)
+        if winner is None and pending:
+            done, pending = await asyncio.wait(pending)
+            winner = _first_success(first, second, done)
+        winner = winner or first
+        loser = second if winner is first else first
+        if loser.done() and not loser.cancelled() and loser.exception() is None:
+            await loser.result().aclose()
+        loser.cancel()
+        self.policy.tokens.adjust(-estimated)
+        return await winner, True, winner is second
+
+    async def handle_async_request(self, request):
+        policy = self.policy
+        estimated = policy.estimate_tokens(request)
+        start = time.perf_counter()
+        throttled = 0.0
+        hedged = hedge_won = False
+        attempt = 0
+        while True:
+            wait_seconds = policy.admit(estimated)
+            if wait_seconds:
+                throttled += wait_seconds
+                await asyncio.sleep(wait_seconds)
+            try:
+                response, hedged_now, won = await self._send_hedged(request, estimated)
+                hedged, hedge_won = hedged or hedged_now, hedge_won or won
+                error = None
+            except RETRY_ERRORS as e:
+                response, error = None, e
+            if not policy.should_retry(response, attempt):
+                break
+            delay = policy.backoff(response, attempt)
+            if response is not None:
+                await response.aclose()
+            policy.tokens.adjust(-estimated)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        usage = policy.settle(response, estimated)
+        policy.metrics.record(time.perf_counter() - start - throttled, response.status_code if response else None,
+                              attempt + 1, hedged, hedge_won, usage, throttled)
+        if error is not None:
+            raise error
+        return response
+
+    async def aclose(self):
+        # Закрыть можно только соединения текущего цикла; пулы других уходят вместе с их циклами
+        with self.lock:
+            transport = self.transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+# --- общие объекты процесса ---
+
+_lock = threading.Lock()
+_shared = {}
+
+
+def _env_bool(name, default="false"):
+    return os.environ.get(name, default).lower() == "true"
+
+
+def get_policy() -> LLMPolicy:
+    """Настройки читаются при первом вызове (после load_dotenv в скрипте)."""
+    with _lock:
+        if "policy" not in _shared:
+            _shared["policy"] = LLMPolicy(
+                rpm=float(os.environ.get("LLM_RPM", 500)),
+                tpm=float(os.environ.get("LLM_TPM", 200_000)),
+                max_retries=int(os.environ.get("LLM_MAX_RETRIES", 4)),
+                hedge=_env_bool("LLM_HEDGE"),
+            )
+        return _shared["policy"]
+
+
+def _max_connections():
+    return int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+
+
+def _limits():
+    connections = _max_connections()
+    return httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+
+def _timeout():
+    return httpx.Timeout(float(os.environ.get("LLM_TIMEOUT", 60)), connect=5.0)
+
+
+def get_http_client() -> httpx.Client:
+    policy = get_policy()
+    with _lock:
+        if "http" not in _shared:
+            transport = PolicyTransport(policy, httpx.HTTPTransport(limits=_limits()), _max_connections())
+            _shared["http"] = httpx.Client(transport=transport, timeout=_timeout())
+        return _shared["http"]
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Один на процесс; соединения транспорт держит отдельно для каждого event loop."""
+    policy = get_policy()
+    with _lock:
+        if "async_http" not in _shared:
+            transport = AsyncPolicyTransport(policy, lambda: httpx.AsyncHTTPTransport(limits=_limits()))
+            _shared["async_http"] = httpx.AsyncClient(transport=transport, timeout=_timeout())
+        return _shared["async_http"]
+
+
+def get_openai_client(**kwargs):
+    """OpenAI на общем пуле. Повторы делает транспорт, поэтому свои повторы SDK выключены."""
+    from openai import OpenAI
+
+    kwargs.setdefault("api_key", os.environ.get("OPENAI_API_KEY"))
+    return OpenAI(http_client=get_http_client(), max_retries=0, **kwargs)
+
+
+def get_async_openai_client(**kwargs):
+    from openai import AsyncOpenAI
+
+    kwargs.setdefault("api_key", os.environ.get("OPENAI_API_KEY"))
+    return AsyncOpenAI(http_client=get_async_http_client(), max_retries=0, **kwargs)
+
+
+def get_chat_openai(**kwargs):
+    """ChatOpenAI из LangChain на тех же клиентах (invoke и ainvoke)."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(http_client=get_http_client(), http_async_client=get_async_http_client(),
+                      max_retries=0, **kwargs)
+
+
+def llm_metrics():
+    return get_policy().metrics.snapshot()
+
+
+def format_metrics(metrics=None) -> str:
+    m = metrics or llm_metrics()
+    p50 = f"{m['p50']:.2f}s" if m["p50"] is not None else "-"
+    p95 = f"{m['p95']:.2f}s" if m["p95"] is not None else "-"
+    attempt_p95 = f"{m['attempt_p95']:.2f}s" if m.get("attempt_p95") is not None else "-"
+    return (f"вызовов={m['calls']} ошибок={m['errors']} повторов={m['retries']} "
+            f"хеджей={m['hedges']} (выиграли {m['hedge_wins']}) p50={p50} p95={p95} (попытки {attempt_p95}) "
+            f"токены={m['prompt_tokens']}+{m['completion_tokens']} ожидание лимита={m['throttled_seconds']:.1f}s")
@@ -1,7 +1,16 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import (
+    PyPDFLoader,
+    Docx2txtLoader,
+    BSHTMLLoader,
+    TextLoader,
+)
 
-from .config import DOCS_DIR
+from .config import DOCS_DIR, CORPUS_MANIFEST_PATH, LOADER_WORKERS
 
 
 def load_pdf(file_name: str):
@@ -18,3 +27,77 @@ def load_pdf(file_name: str):
     docs = loader.load()
     print(f"[LOAD_PDF] Загружено страниц/документов: {len(docs)}")
     return docs
+
+
+# Расширение файла -> загрузчик LangChain
+LOADERS = {
+    ".pdf": PyPDFLoader,
+    ".docx": Docx2txtLoader,
+    ".html": BSHTMLLoader,
+    ".htm": BSHTMLLoader,
+    ".md": lambda path: TextLoader(path, encoding="utf-8"),
+    ".markdown": lambda path: TextLoader(path, encoding="utf-8"),
+    ".txt": lambda path: TextLoader(path, encoding="utf-8"),
+}
+
+
+def _parse_file(path: str):
+    """
+    Разбирает один файл (выполняется в отдельном процессе).
+    Возвращает (path, docs, секунды, ошибка).
+    """
+    start = time.time()
+    try:
+        stat = os.stat(path)
+        docs = LOADERS[Path(path).suffix.lower()](path).load()
+        for i, doc in enumerate(docs):
+            doc.metadata["source"] = path
+            doc.metadata.setdefault("page", i)
+            doc.metadata["mtime"] = stat.st_mtime
+            doc.metadata["file_type"] = Path(path).suffix.lower().lstrip(".")
+        return path, docs, time.time() - start, None
+    except Exception as e:
+        return path, [], time.time() - start, f"{type(e).__name__}: {e}"
+
+
+def iter_corpus(root=DOCS_DIR, workers: int = LOADER_WORKERS):
+    """
+    Рекурсивно обходит папку и параллельно (в пуле процессов) парсит
+    PDF/DOCX/HTML/Markdown/TXT. Отдаёт Document по мере готовности файлов.
+
+    Время разбора и ошибки по каждому файлу пишутся в манифест CORPUS_MANIFEST_PATH.
+    """
+    paths = sorted(
+        str(p) for p in Path(root).rglob("*")
+        if p.is_file() and p.suffix.lower() in LOADERS
+    )
+    workers = workers or os.cpu_count() or 1
+    print(f"[LOAD_CORPUS] Файлов в {root}: {len(paths)}, процессов: {workers}")
+
+    manifest = {}
+    start = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = iter(paths)
+            in_flight = set()
+            while True:
+                # Держим в полёте не больше 2 файлов на процесс, чтобы не грузить всё в память
+                for path in pending:
+                    in_flight.add(pool.submit(_parse_file, path))
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, docs, seconds, error = future.result()
+                    manifest[path] = {"pages": len(docs), "parse_time": round(seconds, 4), "error": error}
+                    if error:
+                        print(f"[LOAD_CORPUS] Ошибка в {path}: {error}")
+                    yield from docs
+    finally:
+        errors = sum(1 for m in manifest.values() if m["error"])
+        print(f"[LOAD_CORPUS] Разобрано файлов: {len(manifest)} (ошибок: {errors}) за {time.time() - start:.2f} сек")
+        CORPUS_MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(CORPUS_MANIFEST_PATH, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
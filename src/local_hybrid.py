@@ -0,0 +1,450 @@
+"""
+Локальный гибридный индекс (BM25 + векторы) внутри процесса — замена RPC match_documents / kw_match_documents.
+
+- Ключевой поиск: инвертированный индекс, списки документов сжаты (дельты номеров + частоты в varint),
+  ранжирование BM25. Токенизация с учётом русского и казахского: ё -> е, стемминг окончаний (русский — Snowball,
+  у казахских — падеж и множественное число отдельно, язык агглютинативный). Казахским слово считается
+  по особым буквам, по окончанию "множественное + падеж" или если казахский весь текст.
+- Векторный поиск: нормированная матрица NumPy, косинусная близость одним умножением.
+- Результаты в том же виде, что у RPC: {"id", "content", "metadata", "similarity"}.
+- Хранение на диске и дозапись: новые документы получают номер больше старых,
+  поэтому их дельты просто дописываются в конец списков. id строки может быть своим (ingest передаёт
+  стабильный id чанка), строка с уже известным id пропускается.
+
+Папка индекса — сегменты, каждый save() дописывает новый (только документы после прошлого save):
+    meta.json               число документов, суммарная длина в токенах, список сегментов
+    docs_<сегмент>.jsonl    id, content, metadata (по строке на документ)
+    lengths_<сегмент>.npy   длина каждого документа в токенах
+    vectors_<сегмент>.npy   матрица (n, dim) float32, строки нормированы
+    postings_<сегмент>.bin  продолжения списков подряд
+    terms_<сегмент>.json    терм -> [смещение, длина в байтах, прирост числа документов]
+При загрузке куски списков склеиваются по порядку сегментов; compact() сливает сегменты в один.
+Индекс в старом формате (файлы без суффикса) читается как один сегмент.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+_KAZAKH_LETTERS = set("әғқңөұүһі")
+KAZAKH_TEXT_SHARE = 0.2  # Доля слов с казахскими буквами, с которой весь текст считаем казахским
+
+
+def _longest_first(words: str):
+    return sorted(words.split(), key=len, reverse=True)
+
+
+# Русский: алгоритм Snowball. Окончания снимаются только в RV (после первой гласной), группы
+# проверяются по порядку, в группе — самое длинное совпадение. Окончания первого списка пары
+# снимаются только после "а"/"я" внутри RV: иначе "на" из "страна" съедало бы основу
+_RU_VOWELS = set("аеиоуыэюя")
+_RU_GERUND = (_longest_first("в вши вшись"), _longest_first("ив ивши ившись ыв ывши ывшись"))
+_RU_REFLEXIVE = ([], ["ся", "сь"])
+_RU_ADJECTIVE = ([], _longest_first(
+    "ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую юю ая яя ою ею"))
+_RU_PARTICIPLE = (_longest_first("ем нн вш ющ щ"), _longest_first("ивш ывш ующ"))
+_RU_VERB = (_longest_first("ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно"), _longest_first(
+    "ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят ует уют ит ыт ены ить ыть ишь ую ю"))
+_RU_NOUN = ([], _longest_first(
+    "а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам ом о у ах иях ях ы ь ию ью ю ия ья я"))
+
+# Казахский: сначала падеж/притяжательность, потом множественное число (азамат-тар-ына)
+_KK_CASE_SUFFIXES = _longest_first("""
+    сының сінің сына сіне сында сінде сынан сінен сын сін ының інің ына іне ында інде ынан інен ын ін
+    ның нің дың дің тың тің ға ге қа ке на не да де та те нда нде
+    дан ден тан тен нан нен ды ді ты ті ны ні мен бен пен сы сі ы і
+""")
+_KK_PLURAL_SUFFIXES = ["лар", "лер", "дар", "дер", "тар", "тер"]
+# Казахское слово без особых букв (азаматтарына): множественное число + падеж. Падежи — только
+# те, что не встречаются после "-тар" в русском: "гектары", "старта" сюда не попадают
+_KK_PLURAL_CASE = re.compile(r"(лар|лер|дар|дер|тар|тер)"
+                             r"(ының|інің|ына|іне|ында|інде|ынан|інен|ымен|ын|ін|ға|ге|дан|ден|ды|ді|мен)$")
+
+# Служебные слова: есть почти в каждом чанке, idf ~ 0, а список самый длинный
+_STOP_WORDS = set("""
+    и в во на не с со по о об от к ко у за из для до при что как а но или же ли бы то это его ее их он она они
+    мен және да де бұл ол
+""".split())
+
+MIN_STEM = 3
+TOKENIZER_VERSION = 2  # Меняется вместе с токенизацией: индекс со старой версией переиндексируется при load()
+
+
+def _strip(word, suffixes):
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def _remove_ending(rv: str, groups):
+    """RV без самого длинного окончания из групп; None — окончания нет (или нет "а"/"я" перед ним)."""
+    after_a, plain = groups
+    ending = max((e for e in after_a + plain if rv.endswith(e)), key=len, default=None)
+    if ending is None:
+        return None
+    rest = rv[:-len(ending)]
+    if ending in after_a and not rest.endswith(("а", "я")):
+        return None
+    return rest
+
+
+def _region(word: str, start: int) -> int:
+    """Начало R1 (от start): позиция после первой согласной, идущей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _stem_ru(word: str) -> str:
+    start = next((i + 1 for i, c in enumerate(word) if c in _RU_VOWELS), len(word))
+    prefix, rv = word[:start], word[start:]
+
+    rest = _remove_ending(rv, _RU_GERUND)
+    if rest is None:
+        reflexive = _remove_ending(rv, _RU_REFLEXIVE)
+        rv = rv if reflexive is None else reflexive
+        rest = _remove_ending(rv, _RU_ADJECTIVE)
+        if rest is not None:
+            participle = _remove_ending(rest, _RU_PARTICIPLE)
+            rest = rest if participle is None else participle
+        else:
+            rest = _remove_ending(rv, _RU_VERB)
+            if rest is None:
+                rest = _remove_ending(rv, _RU_NOUN)
+        rv = rv if rest is None else rest
+    else:
+        rv = rest
+
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    r2 = _region(word, _region(word, 0) - 1)
+    for ending in ("ость", "ост"):
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    for ending in ("ейше", "ейш"):
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def is_kazakh(word: str) -> bool:
+    return bool(_KAZAKH_LETTERS & set(word)) or bool(_KK_PLURAL_CASE.search(word))
+
+
+def stem(word: str, kazakh: bool = None) -> str:
+    """Основа слова. kazakh=None — язык определяется по самому слову."""
+    if word.isdigit():
+        return word
+    if kazakh is None:
+        kazakh = is_kazakh(word)
+    if kazakh:
+        return _strip(_strip(word, _KK_CASE_SUFFIXES), _KK_PLURAL_SUFFIXES)
+    return _stem_ru(word)
+
+
+def tokenize(text: str):
+    text = unicodedata.normalize("NFKC", text).lower().replace("ё", "е")
+    tokens = [token for token in _TOKEN.findall(text) if token not in _STOP_WORDS]
+    # В казахском тексте и слова без особых букв (азаматтарына, балалар) — казахские
+    kazakh_share = sum(1 for token in tokens if _KAZAKH_LETTERS & set(token)) / max(len(tokens), 1)
+    kazakh = True if kazakh_share >= KAZAKH_TEXT_SHARE else None
+    return [stem(token, kazakh) for token in tokens]
+
+
+# --- сжатие списков: varint (7 бит на байт, старший бит = "дальше ещё байт") ---
+
+def encode_varints(values, out: bytearray):
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data):
+    """Векторизованная распаковка: без цикла Python по байтам."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.zeros(0, dtype=np.int64)
+    is_last = raw < 0x80
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    value_index = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    shift = 7 * (np.arange(len(raw)) - starts[value_index])
+    return np.add.reduceat((raw & 0x7F).astype(np.int64) << shift, starts)
+
+
+class LocalHybridIndex:
+    def __init__(self, path=None, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+
+        self.docs = []                                   # [{"id", "content", "metadata"}]
+        self.known_ids = set()                           # id всех документов: повторная строка пропускается
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.vectors = None                              # (capacity, dim), заполнены первые len(docs) строк
+        self.postings = {}                               # терм -> bytearray (дельта номера, tf, дельта номера, tf, ...)
+        self.df = {}                                     # терм -> число документов
+        self.last_doc = {}                               # терм -> последний номер в списке (для дельты)
+        self.total_length = 0
+        self.segments = []                               # имена сегментов на диске (см. save)
+        self._next_segment = 1
+        self._saved_count = 0                            # сколько документов уже на диске
+        self._saved_postings = {}                        # терм -> сколько байт списка уже на диске
+        self._saved_df = {}
+
+        if self.path and (self.path / "meta.json").exists():
+            self.load()
+
+    @property
+    def count(self) -> int:
+        return len(self.docs)
+
+    # --- запись ---
+
+    def add(self, rows):
+        """
+        rows — как строки таблицы documents в Supabase: {"content", "metadata", "embedding"} и необязательный "id".
+        Строка с уже известным id пропускается (повторная отправка пачки не дублирует документы).
+        Возвращает id строк.
+        """
+        with self.lock:
+            ids = []
+            new_lengths = []
+            embeddings = []
+            for row in rows:
+                # Номер в индексе (1, 2, 3... как bigserial) — по нему идут списки; id строки может быть своим
+                position = len(self.docs) + 1
+                doc_id = row.get("id", position)
+                ids.append(doc_id)
+                if doc_id in self.known_ids:
+                    continue
+                self.known_ids.add(doc_id)
+                tokens = tokenize(row["content"])
+                self.docs.append({"id": doc_id, "content": row["content"], "metadata": row.get("metadata") or {}})
+                new_lengths.append(len(tokens))
+                self.total_length += len(tokens)
+                embeddings.append(row["embedding"])
+                self._add_postings(position, tokens)
+
+            self.lengths = np.concatenate([self.lengths, np.array(new_lengths, dtype=np.float32)])
+            if embeddings:
+                self._append_vectors(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+            return ids
+
+    def _add_postings(self, position: int, tokens):
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            encode_varints((position - self.last_doc.get(term, 0), tf), self.postings.setdefault(term, bytearray()))
+            self.last_doc[term] = position
+            self.df[term] = self.df.get(term, 0) + 1
+
+    def _append_vectors(self, vectors):
+        if not len(vectors):
+            return
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        start = self.count - len(vectors)
+        if self.vectors is None:
+            self.vectors = np.zeros((max(1024, len(vectors)), vectors.shape[1]), dtype=np.float32)
+        if self.count > len(self.vectors):
+            grown = np.zeros((max(self.count, 2 * len(self.vectors)), self.vectors.shape[1]), dtype=np.float32)
+            grown[:start] = self.vectors[:start]
+            self.vectors = grown
+        self.vectors[start:self.count] = vectors
+
+    # --- поиск ---
+
+    def match_documents(self, query_embedding, match_threshold: float = 0.0, match_count: int = 5):
+        """Аналог RPC match_documents: косинусная близость >= match_threshold, лучшие первыми."""
+        if not self.count:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        scores = self.vectors[:self.count] @ q
+        return self._top(scores, match_count, minimum=match_threshold)
+
+    def kw_match_documents(self, query_text: str, match_count: int = 5):
+        """Аналог RPC kw_match_documents: BM25 по термам запроса."""
+        if not self.count:
+            return []
+        scores = np.zeros(self.count + 1, dtype=np.float32)  # индекс = номер документа в индексе
+        avg_length = self.total_length / self.count or 1.0
+        norm = self.k1 * (1 - self.b + self.b * np.concatenate(([0.0], self.lengths)) / avg_length)
+        for term in set(tokenize(query_text)):
+            data = self.postings.get(term)
+            if not data:
+                continue
+            values = decode_varints(data)
+            doc_ids = np.cumsum(values[0::2])
+            tf = values[1::2].astype(np.float32)
+            idf = np.log(1 + (self.count - self.df[term] + 0.5) / (self.df[term] + 0.5))
+            scores[doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm[doc_ids])
+        return self._top(scores[1:], match_count, minimum=1e-9)
+
+    def _top(self, scores, limit, minimum):
+        candidates = np.flatnonzero(scores >= minimum)
+        if not len(candidates):
+            return []
+        limit = min(limit, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.docs[i], "similarity": float(scores[i])} for i in top]
+
+    # --- диск ---
+
+    def save(self):
+        """
+        Дописывает на диск только то, что добавлено после прошлого save(), новым сегментом:
+        цена вызова — размер новой пачки, а не всего индекса. Каждый файл пишется во временный
+        и переименовывается, meta.json со списком сегментов — последним: после падения посреди save()
+        индекс читается в состоянии прошлого save(), недописанный сегмент просто перезапишется.
+        """
+        if not self.path:
+            return
+        with self.lock:
+            start = self._saved_count
+            if start == self.count and self.segments:
+                return
+            self.path.mkdir(parents=True, exist_ok=True)
+            name = f"{self._next_segment:06d}"
+            self._write_segment(name, start, {
+                term: (data[self._saved_postings.get(term, 0):], self.df[term] - self._saved_df.get(term, 0))
+                for term, data in self.postings.items() if len(data) > self._saved_postings.get(term, 0)
+            })
+            self._write_meta(self.segments + [name], self._next_segment + 1)
+            self.segments.append(name)
+            self._next_segment += 1
+            self._mark_saved()
+
+    def compact(self, force: bool = False):
+        """Сливает все сегменты в один (например, в конце загрузки): меньше файлов и быстрее load()."""
+        if not self.path:
+            return
+        with self.lock:
+            if not force and len(self.segments) <= 1 and self._saved_count == self.count:
+                return
+            self.path.mkdir(parents=True, exist_ok=True)
+            old = list(self.segments)
+            name = f"{self._next_segment:06d}"
+            self._write_segment(name, 0, {term: (data, self.df[term]) for term, data in self.postings.items()})
+            self._write_meta([name], self._next_segment + 1)
+            self.segments = [name]
+            self._next_segment += 1
+            self._mark_saved()
+            # Старые сегменты удаляем только после того, как meta.json на них больше не ссылается
+            for segment in old:
+                for path in self._segment_files(segment).values():
+                    path.unlink(missing_ok=True)
+
+    def _segment_files(self, name):
+        # Сегмент "" — формат до сегментов (файлы без суффикса)
+        suffix = f"_{name}" if name else ""
+        return {
+            "docs": self.path / f"docs{suffix}.jsonl",
+            "lengths": self.path / f"lengths{suffix}.npy",
+            "vectors": self.path / f"vectors{suffix}.npy",
+            "postings": self.path / f"postings{suffix}.bin",
+            "terms": self.path / f"terms{suffix}.json",
+        }
+
+    def _write_segment(self, name, start, postings):
+        """Документы [start, count) и куски списков postings: терм -> (байты, прирост df)."""
+        files = self._segment_files(name)
+        _write_atomic(files["docs"], "w", lambda f: f.writelines(
+            json.dumps(doc, ensure_ascii=False) + "\n" for doc in self.docs[start:]))
+        _write_atomic(files["lengths"], "wb", lambda f: np.save(f, self.lengths[start:self.count]))
+        if self.vectors is not None:
+            _write_atomic(files["vectors"], "wb", lambda f: np.save(f, self.vectors[start:self.count]))
+
+        terms, position, chunks = {}, 0, []
+        for term, (data, df) in postings.items():
+            chunks.append(bytes(data))
+            terms[term] = [position, len(data), df]
+            position += len(data)
+        _write_atomic(files["postings"], "wb", lambda f: f.writelines(chunks))
+        _write_atomic(files["terms"], "w", lambda f: json.dump(terms, f, ensure_ascii=False))
+
+    def _write_meta(self, segments, next_segment):
+        # meta.json пишется последним: без него индекс считается пустым, а сегменты вне списка — не существуют
+        _write_atomic(self.path / "meta.json", "w", lambda f: json.dump({
+            "count": self.count, "total_length": self.total_length,
+            "segments": segments, "next_segment": next_segment, "tokenizer": TOKENIZER_VERSION,
+        }, f))
+
+    def _mark_saved(self):
+        self._saved_count = self.count
+        self._saved_postings = {term: len(data) for term, data in self.postings.items()}
+        self._saved_df = dict(self.df)
+
+    def load(self):
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.segments = meta.get("segments", [""])
+        self._next_segment = meta.get("next_segment", 1)
+        docs, lengths, vectors = [], [], []
+        for name in self.segments:
+            files = self._segment_files(name)
+            with open(files["docs"], encoding="utf-8") as f:
+                docs.extend(json.loads(line) for line in f)
+            lengths.append(np.load(files["lengths"]))
+            if files["vectors"].exists():
+                vectors.append(np.load(files["vectors"]))
+
+            with open(files["terms"], encoding="utf-8") as f:
+                terms = json.load(f)
+            data = files["postings"].read_bytes()
+            for term, (start, length, df) in terms.items():
+                # Куски списка из разных сегментов идут подряд: дельты продолжаются без пересчёта
+                self.postings.setdefault(term, bytearray()).extend(data[start:start + length])
+                self.df[term] = self.df.get(term, 0) + df
+
+        self.docs = docs[:meta["count"]]
+        self.known_ids = {doc["id"] for doc in self.docs}
+        self.lengths = np.concatenate(lengths)[:meta["count"]] if lengths else np.zeros(0, dtype=np.float32)
+        self.total_length = meta["total_length"]
+        if vectors:
+            self.vectors = np.concatenate(vectors)
+        for term, data in self.postings.items():
+            # Последний номер нужен для дозаписи: сумма всех дельт списка
+            self.last_doc[term] = int(decode_varints(data)[0::2].sum())
+        self._mark_saved()
+        if meta.get("tokenizer", 1) != TOKENIZER_VERSION:
+            self._retokenize()
+
+    def _retokenize(self):
+        """Списки построены старой токенизацией: строим заново по текстам и переписываем индекс одним сегментом."""
+        print(f"🔄 Индекс {self.path}: токенизация изменилась, переиндексация {self.count} документов")
+        self.postings, self.df, self.last_doc = {}, {}, {}
+        lengths = []
+        for position, doc in enumerate(self.docs, start=1):
+            tokens = tokenize(doc["content"])
+            lengths.append(len(tokens))
+            self._add_postings(position, tokens)
+        self.lengths = np.array(lengths, dtype=np.float32)
+        self.total_length = int(sum(lengths))
+        self.compact(force=True)
+
+
+def _write_atomic(path: Path, mode: str, write):
+    """Пишет во временный файл и переименовывает: файл либо старый, либо целиком новый."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, mode, **({"encoding": "utf-8"} if "b" not in mode else {})) as f:
+        write(f)
+    os.replace(tmp_path, path)
@@ -1,25 +1,41 @@
-from .loaders import load_pdf
+from .loaders import load_pdf, iter_corpus
 from .splitter import split_documents
-from .vectorstore import build_vectorstore
-from .rag_chain import create_rag_chain, ask_question
+from .indexer import index_documents
+from .config import CHAT_STREAMING
+from .rag_chain import create_rag_chain, answer_with_sources, stream_answer_with_sources
 
 
 def prepare_index(pdf_name: str):
     """
-    Полный цикл индексации PDF: загрузка -> чанкинг -> Chroma.
+    Индексация PDF: загрузка -> чанкинг -> Chroma.
+    Инкрементально: эмбеддятся только новые/изменённые страницы (см. indexer).
     """
     print(f"[MAIN] === НАЧАЛО ИНДЕКСАЦИИ ДЛЯ ФАЙЛА: {pdf_name} ===")
     docs = load_pdf(pdf_name)
-    chunks = split_documents(docs)
-    build_vectorstore(chunks)
+    index_documents(docs, split_documents)
     print("[MAIN] === ИНДЕКСАЦИЯ ЗАВЕРШЕНА ===")
 
 
-def chat():
+def prepare_corpus_index():
+    """
+    Индексация всей папки data/docs (PDF/DOCX/HTML/MD/TXT).
+    Файлы парсятся параллельно, удалённые из папки файлы убираются из индекса.
+    """
+    print("[MAIN] === НАЧАЛО ИНДЕКСАЦИИ КОРПУСА ===")
+    index_documents(iter_corpus(), split_documents, prune_missing=True)
+    print("[MAIN] === ИНДЕКСАЦИЯ ЗАВЕРШЕНА ===")
+
+
+def _print_token(text):
+    print(text, end="", flush=True)
+
+
+def chat(streaming: bool = CHAT_STREAMING):
     """
     Простой CLI-чат с RAG-ботом.
+    streaming=True: ответ печатается по мере генерации, после него — источники и скорость.
     """
-    chain, retriever = create_rag_chain()
+    chain, _ = create_rag_chain()
     print("RAG-бот запущен. Введите вопрос (или 'exit'):")
 
     while True:
@@ -27,22 +43,28 @@ def chat():
         if q.lower() in ["exit", "quit", "q"]:
             break
 
-        answer, sources = ask_question(chain, retriever, q)
-
-        print("\nОтвет:")
-        print(answer)
+        if streaming:
+            print("\nОтвет:")
+            answer, sources, timings = stream_answer_with_sources(chain, q, on_token=_print_token)
+            print()
+        else:
+            answer, sources, timings = answer_with_sources(chain, q)
+            print("\nОтвет:")
+            print(answer)
 
         print("\nИсточники (страницы PDF):")
         for s in sources:
             print("-", s.metadata.get("page", "page?"))
+        print(f"\nВремя: поиск {timings['retrieve']:.2f}s | генерация {timings['generate']:.2f}s "
+              f"| всего {timings['total']:.2f}s")
+        if streaming:
+            print(f"Первый токен через {timings['ttft']:.2f}s | {timings['tokens']} токенов, "
+                  f"{timings['tokens_per_sec']:.1f} ток/с")
         print("-" * 40)
 
 
 if __name__ == "__main__":
-    # ДЛЯ ОТЛАДКИ: каждый запуск пересобираем индекс и сразу запускаем чат
+    # Индексация инкрементальная: если PDF не менялся, повторный запуск
+    # ничего не эмбеддит и почти сразу переходит к чату
     prepare_index("sample.pdf")
     chat()
-
-    # Когда убедишься, что индекс создаётся, можно будет сделать так:
-    # 1) один раз вызвать prepare_index("sample.pdf")
-    # 2) потом закомментировать prepare_index и оставить только chat()
@@ -0,0 +1,390 @@
+"""
+Персистентное локальное векторное хранилище на memory-mapped файлах.
+
+Папка хранилища:
+    meta.json      размерность, тип, число записей, ёмкость, версия содержимого (растёт при каждой записи),
+                   поколение (растёт, когда строки переезжают или файлы payload'ов переписаны)
+    vectors.bin    матрица (capacity, dim) float16 или int8 (нормированные векторы)
+    scales.bin     масштаб каждой строки для int8 (float32)
+    ids.bin        id точек (uuid, 16 байт на строку)
+    offsets.bin    (start, length) payload каждой строки в payloads.bin
+    payloads.bin   payload'ы в JSON, дописываются в конец; перезаписанные и удалённые остаются мусором,
+                   пока его доля не превысит COMPACT_GARBAGE — тогда файл переписывается (compact)
+    payload_<поле>.bin  столбцы payload-индекса (int32, см. src/payload_index.py) для фильтров
+
+Удаление (delete) переносит на место удалённой строки последнюю, так что строки всегда идут подряд.
+Читатель (readonly) замечает delete и compact по поколению в refresh() и открывает файлы заново.
+
+Открытие = mmap файлов, без чтения данных: холодный старт почти мгновенный,
+а страницы в режиме "r" делятся между процессами через page cache без копирования.
+"""
+import json
+import mmap
+import os
+import threading
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from .payload_index import PAYLOAD_FIELDS, Vocabulary, column_value, column_mask, matches
+
+# Такой же набор полей, как у ScoredPoint в Qdrant
+Hit = namedtuple("Hit", ["id", "score", "payload"])
+
+DTYPES = ("float16", "int8")
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK = 16384  # Сколько строк переводим в float32 за раз при поиске
+COMPACT_GARBAGE = 0.5        # Доля мусора в payloads.bin, при которой upsert/delete переписывают файл
+COMPACT_MIN_BYTES = 1 << 20  # Файлы payload'ов меньше этого не сжимаем
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class MmapVectorStore:
+    def __init__(self, path, dim: int = None, dtype: str = "float16", readonly: bool = False):
+        self.path = Path(path)
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self._id_rows = None
+        self._payload_file = None
+        self._payload_map = None
+
+        self._meta_stamp = None
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            self._meta_stamp = self._stamp()
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            if readonly or dim is None:
+                raise FileNotFoundError(f"Хранилище не найдено: {self.path}")
+            if dtype not in DTYPES:
+                raise ValueError(f"dtype должен быть одним из {DTYPES}")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.meta = {"dim": dim, "dtype": dtype, "count": 0, "capacity": 0}
+            self._resize(INITIAL_CAPACITY)
+            self._save_meta()
+        self._load_vocab()
+        if not self.readonly and not all((self.path / f"{name}.bin").exists() for name in self._files()):
+            # Хранилище из прошлой версии: создаём столбцы payload-индекса и заполняем по payload'ам
+            self._resize(self.meta["capacity"])
+            self._map()
+            self._reindex_payloads()
+            return
+        self._map()
+
+    # --- файлы ---
+
+    def _files(self):
+        dim = self.meta["dim"]
+        return {
+            "vectors": (np.dtype(self.meta["dtype"]), (dim,)),
+            "scales": (np.dtype(np.float32), ()),
+            "ids": (np.dtype(np.uint8), (16,)),
+            "offsets": (np.dtype(np.uint64), (2,)),
+            **{f"payload_{field}": (np.dtype(np.int32), ()) for field in self._indexed_fields()},
+        }
+
+    def _indexed_fields(self):
+        # У открытого только на чтение старого хранилища столбцов нет — фильтр идёт по payload'ам
+        if self.readonly:
+            return [f for f in PAYLOAD_FIELDS if (self.path / f"payload_{f}.bin").exists()]
+        return list(PAYLOAD_FIELDS)
+
+    def _resize(self, capacity):
+        """Увеличивает файлы до capacity строк (новые байты — нули, файл разреженный)."""
+        for name, (dtype, shape) in self._files().items():
+            row_bytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+            with open(self.path / f"{name}.bin", "ab") as f:
+                f.truncate(row_bytes * capacity)
+        (self.path / "payloads.bin").touch()
+        self.meta["capacity"] = capacity
+
+    def _map(self):
+        mode = "r" if self.readonly else "r+"
+        capacity = self.meta["capacity"]
+        for name, (dtype, shape) in self._files().items():
+            setattr(self, name, np.memmap(self.path / f"{name}.bin", dtype=dtype, mode=mode, shape=(capacity, *shape)))
+        self._payload_map = None
+
+    def _load_vocab(self):
+        vocab = self.meta.setdefault("payload_vocab", {})
+        self.vocab = {field: Vocabulary(vocab.setdefault(field, []))
+                      for field, kind in PAYLOAD_FIELDS.items() if kind == "keyword"}
+
+    def _index_payload(self, row, payload):
+        for field in PAYLOAD_FIELDS:
+            getattr(self, f"payload_{field}")[row] = column_value(field, payload.get(field), self.vocab.get(field))
+
+    def _reindex_payloads(self):
+        for row in range(self.count):
+            self._index_payload(row, self.payload(row))
+        self._flush()
+        self._save_meta()
+
+    def _save_meta(self):
+        tmp_path = self.path / "meta.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        # Счётчик обновляется последним: читатели не увидят недописанные строки
+        os.replace(tmp_path, self.path / "meta.json")
+        self._meta_stamp = self._stamp()
+
+    def _stamp(self):
+        """Отпечаток meta.json: каждое сохранение — новый файл (os.replace), у него другой inode или время."""
+        stat = os.stat(self.path / "meta.json")
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """
+        Перечитывает meta.json (для читателей, пока другой процесс дописывает данные); если он не менялся — ничего.
+        Другая ёмкость или поколение (delete, compact) — файлы отображаются заново: у читателя остались
+        старые отображения, и соответствие строка -> payload в них уже неверное.
+        """
+        stamp = self._stamp()
+        if stamp == self._meta_stamp:
+            return
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        with self.lock:
+            remap = meta["capacity"] != self.meta["capacity"] or meta.get("generation", 0) != self.generation
+            self.meta = meta
+            self._meta_stamp = stamp
+            self._load_vocab()
+            if remap:
+                self._map()
+                self._id_rows = None
+            self._payload_map = None
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+    @property
+    def version(self) -> int:
+        """Версия содержимого: меняется при любой записи, даже если число строк то же (перезапись векторов)."""
+        return self.meta.get("version", 0)
+
+    def _bump_version(self):
+        self.meta["version"] = self.version + 1
+
+    @property
+    def generation(self) -> int:
+        """Поколение файлов: меняется, когда строки переезжают (delete) или payloads.bin переписан (compact)."""
+        return self.meta.get("generation", 0)
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    # --- запись ---
+
+    def upsert(self, ids, vectors, payloads):
+        """
+        Добавляет или перезаписывает точки. ids — строки uuid (как в Qdrant).
+        Payload перезаписанной точки дописывается в конец, старый остаётся мусором в payloads.bin
+        (повторная загрузка тех же документов — сплошной мусор, его убирает compact).
+        """
+        if self.readonly:
+            raise PermissionError("Хранилище открыто только для чтения")
+        vectors = _normalize(vectors)
+        with self.lock:
+            self._load_id_rows()
+
+            needed = self.count + len(ids)
+            if needed > self.meta["capacity"]:
+                self._flush()
+                self._resize(max(needed, self.meta["capacity"] * 2))
+                self._map()
+
+            with open(self.path / "payloads.bin", "ab") as f:
+                position = f.tell()
+                for point_id, vector, payload in zip(ids, vectors, payloads):
+                    key = uuid.UUID(str(point_id)).bytes
+                    row = self._id_rows.get(key)
+                    if row is None:
+                        row = self.meta["count"]
+                        self.meta["count"] += 1
+                        self._id_rows[key] = row
+                        self.ids[row] = np.frombuffer(key, dtype=np.uint8)
+
+                    if self.meta["dtype"] == "int8":
+                        scale = max(float(np.abs(vector).max()) / 127.0, 1e-12)
+                        self.vectors[row] = np.round(vector / scale).astype(np.int8)
+                        self.scales[row] = scale
+                    else:
+                        self.vectors[row] = vector
+                        self.scales[row] = 1.0
+
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                    f.write(data)
+                    self.offsets[row] = (position, len(data))
+                    position += len(data)
+                    self._index_payload(row, payload)
+
+            self._flush()
+            self._bump_version()
+            self._save_meta()
+            self._payload_map = None
+            self._compact_if_needed()
+
+    def _load_id_rows(self):
+        if self._id_rows is None:
+            raw = np.ascontiguousarray(self.ids[:self.count])
+            self._id_rows = {bytes(row): i for i, row in enumerate(raw)}
+
+    def delete(self, filters: dict) -> int:
+        """
+        Удаляет точки под фильтром (как в filter_rows), возвращает их число.
+        На место удалённой строки переезжает последняя: строки не остаются дырами, но номера меняются,
+        поэтому ANN-индекс после удаления нужно перестроить, а читатели видят новое поколение.
+        Payload'ы удалённых точек остаются мусором в payloads.bin, пока его не уберёт compact.
+        """
+        if self.readonly:
+            raise PermissionError("Хранилище открыто только для чтения")
+        with self.lock:
+            rows = self.filter_rows(filters)
+            if not len(rows):
+                return 0
+            self._load_id_rows()
+            # С конца: переезжающая последняя строка никогда не из тех, что ещё предстоит удалить
+            for row in sorted(rows.tolist(), reverse=True):
+                last = self.meta["count"] - 1
+                del self._id_rows[bytes(self.ids[row])]
+                if row != last:
+                    for name in self._files():
+                        column = getattr(self, name)
+                        column[row] = column[last]
+                    self._id_rows[bytes(self.ids[row])] = row
+                self.meta["count"] -= 1
+            self._flush()
+            self._bump_version()
+            self.meta["generation"] = self.generation + 1
+            self._save_meta()
+            self._compact_if_needed()
+            return len(rows)
+
+    def compact(self) -> int:
+        """Переписывает payloads.bin только с живыми payload'ами, в порядке строк. Возвращает освобождённые байты."""
+        if self.readonly:
+            raise PermissionError("Хранилище открыто только для чтения")
+        with self.lock:
+            return self._compact()
+
+    def _compact_if_needed(self):
+        size = os.path.getsize(self.path / "payloads.bin")
+        live = int(self.offsets[:self.count, 1].sum())
+        if size >= COMPACT_MIN_BYTES and size - live > COMPACT_GARBAGE * size:
+            self._compact()
+
+    def _compact(self):
+        payload_path = self.path / "payloads.bin"
+        size = os.path.getsize(payload_path)
+        offsets = np.zeros((self.meta["capacity"], 2), dtype=np.uint64)
+        with open(payload_path, "rb") as src, open(payload_path.with_suffix(".bin.tmp"), "wb") as dst:
+            data = mmap.mmap(src.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+            position = 0
+            for row, (start, length) in enumerate(self.offsets[:self.count].tolist()):
+                dst.write(data[start:start + length])
+                offsets[row] = (position, length)
+                position += length
+            if size:
+                data.close()
+        offsets_path = self.path / "offsets.bin"
+        offsets.tofile(offsets_path.with_suffix(".bin.tmp"))
+        # Новые файлы подменяют старые целиком: у открытых читателей остаются старые, согласованные между собой,
+        # пока refresh() не увидит новое поколение
+        os.replace(offsets_path.with_suffix(".bin.tmp"), offsets_path)
+        os.replace(payload_path.with_suffix(".bin.tmp"), payload_path)
+        if self._payload_file is not None:
+            self._payload_file.close()
+            self._payload_file = None
+        self._map()
+        self.meta["generation"] = self.generation + 1
+        self._save_meta()
+        return size - position
+
+    def _flush(self):
+        for name in self._files():
+            getattr(self, name).flush()
+
+    def close(self):
+        """Отпускает отображения файлов (страницы уходят из памяти процесса)."""
+        with self.lock:
+            if not self.readonly:
+                self._flush()
+            for name in self._files():
+                setattr(self, name, None)
+            if self._payload_file is not None:
+                self._payload_file.close()
+                self._payload_file = None
+            self._payload_map = None
+            self._id_rows = None
+
+    # --- чтение ---
+
+    def payload(self, row: int):
+        if self._payload_map is None:
+            if self._payload_file is not None:
+                self._payload_file.close()
+            self._payload_file = open(self.path / "payloads.bin", "rb")
+            size = os.fstat(self._payload_file.fileno()).st_size
+            self._payload_map = mmap.mmap(self._payload_file.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        start, length = (int(x) for x in self.offsets[row])
+        return json.loads(self._payload_map[start:start + length])
+
+    def point_id(self, row: int) -> str:
+        return str(uuid.UUID(bytes=bytes(self.ids[row])))
+
+    def filter_rows(self, filters: dict):
+        """
+        Строки, подходящие под фильтр (см. src/payload_index.py), по возрастанию.
+        Считается по столбцам int32, векторы не читаются.
+        """
+        indexed = set(self._indexed_fields())
+        mask = np.ones(self.count, dtype=bool)
+        rest = {}
+        for field, condition in filters.items():
+            if field in indexed:
+                column = getattr(self, f"payload_{field}")[:self.count]
+                mask &= column_mask(field, condition, column, self.vocab.get(field))
+            else:
+                rest[field] = condition
+        rows = np.flatnonzero(mask)
+        if rest:
+            # Поля без столбца — проверяем payload уже отобранных строк
+            rows = np.array([r for r in rows if matches(self.payload(int(r)), rest)], dtype=np.int64)
+        return rows
+
+    def scores(self, query, rows=None):
+        """Косинусная близость запроса ко всем строкам (или только к rows), блоками."""
+        q = _normalize(query)
+        n = self.count
+        if rows is not None:
+            block = np.asarray(self.vectors[rows], dtype=np.float32)
+            return (block @ q) * self.scales[rows]
+        out = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK):
+            end = min(start + SEARCH_BLOCK, n)
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            out[start:end] = (block @ q) * self.scales[start:end]
+        return out
+
+    def search(self, query, limit: int = 3, rows=None):
+        """Точный поиск top-limit. rows — необязательный список строк-кандидатов."""
+        if self.count == 0:
+            return []
+        scores = self.scores(query, rows)
+        candidates = np.arange(self.count) if rows is None else np.asarray(rows)
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Hit(self.point_id(int(candidates[i])), float(scores[i]), self.payload(int(candidates[i])))
+            for i in top
+        ]
@@ -0,0 +1,199 @@
+"""
+Фильтры по payload для векторного поиска: что за поля индексируются и как записывается фильтр.
+
+Поля (заполняются при загрузке в semantic_search_pro.py):
+    doc_id    keyword   id документа (из имени файла): "kaspi-3q-2025"
+    source    keyword   имя файла
+    section   keyword   ближайший заголовок раздела над чанком
+    page      integer   номер страницы (с 1)
+    date      date      дата документа "ГГГГ-ММ-ДД" (из имени файла, если есть)
+
+Фильтр — словарь {поле: условие}, все условия должны выполняться:
+    "kaspi-3q-2025"                точное совпадение
+    ["Итоги", "Риски"]             любое из
+    {"gte": 3, "lte": 10}          диапазон (gt / gte / lt / lte), для date — строки "ГГГГ-ММ-ДД"
+
+В MmapVectorStore каждое поле — столбец int32 рядом с векторами (0 = значения нет,
+keyword хранится кодом из словаря в meta.json, date — числом ГГГГММДД), фильтр считается по столбцам
+и отдаёт строки-кандидаты до подсчёта близости. В Qdrant — payload-индексы и models.Filter.
+
+В интерактивном поиске фильтр пишется прямо в вопросе: "выручка @doc_id=kaspi-3q-2025 @page=3..10".
+"""
+import re
+
+import numpy as np
+
+PAYLOAD_FIELDS = {
+    "doc_id": "keyword",
+    "source": "keyword",
+    "section": "keyword",
+    "page": "integer",
+    "date": "date",
+}
+
+RANGE_OPS = ("gt", "gte", "lt", "lte")
+_DATE = re.compile(r"(\d{4})[-_.](\d{2})[-_.](\d{2})")
+_QUARTER = re.compile(r"(?<![0-9a-z])([1-4])q[-_ ]?(\d{4})(?![0-9])")
+_QUARTER_END = {"1": "03-31", "2": "06-30", "3": "09-30", "4": "12-31"}
+_FILTER_ARG = re.compile(r"@(\w+)=(\S+)")
+
+
+def document_id(source: str) -> str:
+    """Имя файла без расширения, в нижнем регистре, всё кроме букв и цифр — дефисы."""
+    stem = source.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return re.sub(r"[\W_]+", "-", stem.lower()).strip("-") or "document"
+
+
+def document_date(source: str):
+    """Дата из имени файла: 2025-09-30 или квартал (3Q 2025 -> конец квартала). None, если не нашлась."""
+    name = source.rsplit("/", 1)[-1].lower()
+    match = _DATE.search(name)
+    if match:
+        return "-".join(match.groups())
+    match = _QUARTER.search(name)
+    if match:
+        return f"{match.group(2)}-{_QUARTER_END[match.group(1)]}"
+    return None
+
+
+def encode_date(value: str) -> int:
+    return int(str(value)[:10].replace("-", ""))
+
+
+def _conditions(value):
+    """Условие поля -> ("eq", [значения]) или ("range", {оп: значение})."""
+    if isinstance(value, dict):
+        unknown = set(value) - set(RANGE_OPS)
+        if unknown:
+            raise ValueError(f"Неизвестные операции диапазона: {', '.join(sorted(unknown))}")
+        return "range", value
+    return "eq", list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def matches(payload: dict, filters: dict) -> bool:
+    """Проверка одного payload (медленный путь для полей без столбца)."""
+    for field, condition in filters.items():
+        value = payload.get(field)
+        if value is None:
+            return False
+        kind, operand = _conditions(condition)
+        if kind == "eq":
+            if value not in operand:
+                return False
+            continue
+        if PAYLOAD_FIELDS.get(field) == "date":
+            value, operand = encode_date(value), {op: encode_date(v) for op, v in operand.items()}
+        if ("gt" in operand and not value > operand["gt"]) or ("gte" in operand and not value >= operand["gte"]) \
+                or ("lt" in operand and not value < operand["lt"]) or ("lte" in operand and not value <= operand["lte"]):
+            return False
+    return True
+
+
+class Vocabulary:
+    """Словарь keyword-поля: значение <-> код (с 1, 0 = значения нет). values хранится в meta.json."""
+
+    def __init__(self, values=None):
+        self.values = values if values is not None else []
+        self.codes = {value: i + 1 for i, value in enumerate(self.values)}
+
+    def code(self, value, add: bool = False) -> int:
+        code = self.codes.get(value, 0)
+        if not code and add:
+            self.values.append(value)
+            code = self.codes[value] = len(self.values)
+        return code
+
+
+def column_value(field: str, value, vocab: Vocabulary = None, add: bool = True) -> int:
+    """Значение payload -> число для столбца (новые keyword дописываются в словарь)."""
+    if value is None:
+        return 0
+    kind = PAYLOAD_FIELDS[field]
+    if kind == "integer":
+        return int(value)
+    if kind == "date":
+        return encode_date(value)
+    return vocab.code(str(value), add=add)
+
+
+def column_mask(field: str, condition, column, vocab: Vocabulary = None):
+    """Маска строк по столбцу поля."""
+    kind, operand = _conditions(condition)
+    if kind == "eq":
+        # Значения, которых нет в словаре, дают код 0 и отбрасываются: ни одна строка им не равна
+        codes = [c for c in (column_value(field, v, vocab, add=False) for v in operand) if c]
+        if not codes:
+            return np.zeros(len(column), dtype=bool)
+        return np.isin(column, codes) if len(codes) > 1 else column == codes[0]
+    if PAYLOAD_FIELDS[field] == "keyword":
+        raise ValueError(f"Диапазон для текстового поля '{field}' не поддерживается")
+    bounds = {op: column_value(field, v) for op, v in operand.items()}
+    mask = column != 0
+    if "gt" in bounds:
+        mask &= column > bounds["gt"]
+    if "gte" in bounds:
+        mask &= column >= bounds["gte"]
+    if "lt" in bounds:
+        mask &= column < bounds["lt"]
+    if "lte" in bounds:
+        mask &= column <= bounds["lte"]
+    return mask
+
+
+def parse_filter_args(text: str):
+    """
+    "выручка @doc_id=kaspi-3q-2025 @page=3..10 @section=Итоги,Риски" ->
+    ("выручка", {"doc_id": "kaspi-3q-2025", "page": {"gte": 3, "lte": 10}, "section": ["Итоги", "Риски"]}).
+    Значения — без пробелов; сложные фильтры передаются словарём в search(filters=...).
+    Нечисловое значение числового поля (@page=abc) — ValueError с именем поля.
+    """
+    filters = {}
+    for field, raw in _FILTER_ARG.findall(text):
+        numeric = PAYLOAD_FIELDS.get(field) == "integer"
+
+        def convert(value, field=field, numeric=numeric):
+            if not numeric:
+                return value
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"@{field}: ожидается целое число или диапазон (3..10), а не '{value}'") from None
+        if ".." in raw:
+            low, high = raw.split("..", 1)
+            filters[field] = {**({"gte": convert(low)} if low else {}), **({"lte": convert(high)} if high else {})}
+        elif "," in raw:
+            filters[field] = [convert(v) for v in raw.split(",") if v]
+        else:
+            filters[field] = convert(raw)
+    return _FILTER_ARG.sub("", text).strip(), filters
+
+
+# --- Qdrant ---
+
+def qdrant_schema(field: str):
+    from qdrant_client.models import PayloadSchemaType
+
+    return {
+        "keyword": PayloadSchemaType.KEYWORD,
+        "integer": PayloadSchemaType.INTEGER,
+        "date": PayloadSchemaType.DATETIME,
+    }[PAYLOAD_FIELDS.get(field, "keyword")]
+
+
+def qdrant_filter(filters: dict):
+    """Тот же фильтр для Qdrant (models.Filter) — применяется внутри поиска по HNSW, а не после."""
+    if not filters:
+        return None
+    from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny, Range, DatetimeRange
+
+    must = []
+    for field, condition in filters.items():
+        kind, operand = _conditions(condition)
+        if kind == "eq":
+            match = MatchValue(value=operand[0]) if len(operand) == 1 else MatchAny(any=operand)
+            must.append(FieldCondition(key=field, match=match))
+        elif PAYLOAD_FIELDS.get(field) == "date":
+            must.append(FieldCondition(key=field, range=DatetimeRange(**operand)))
+        else:
+            must.append(FieldCondition(key=field, range=Range(**operand)))
+    return Filter(must=must)
@@ -0,0 +1,168 @@
+"""
+Прямой доступ к Postgres/pgvector вместо REST (PostgREST) Supabase: RETRIEVAL_BACKEND=postgres.
+
+Через supabase.rpc(...) каждый поиск — HTTPS-запрос, а вектор из 384 чисел едет туда JSON-текстом.
+Здесь:
+- пул соединений psycopg (PG_DSN, размер PG_POOL_MIN..PG_POOL_MAX), без нового TLS и логина на каждый вопрос;
+- запросы к match_documents / kw_match_documents подготавливаются на сервере (prepare=True),
+  разбор и план — один раз на соединение;
+- вектор передаётся в бинарном формате pgvector (float32), без печати и разбора текста;
+- search_both() отправляет обе ноги поиска одним пайплайном: один сетевой обмен вместо двух.
+
+Интерфейс тот же, что у клиента Supabase в скриптах (rpc(...).execute().data, table("documents").insert),
+так что скрипты переключаются одной переменной окружения. Для двух ног сразу — pipelined_legs().
+
+Зависимости (необязательные): pip install "psycopg[binary,pool]" pgvector
+Схема — SCHEMA_SQL ниже (та же, что создаётся в Supabase для match_documents / kw_match_documents).
+"""
+import time
+
+import numpy as np
+
+from .backends import _Call
+
+VECTOR_SQL = "select * from match_documents(%b, %s, %s)"
+KEYWORD_SQL = "select * from kw_match_documents(%s, %s)"
+INSERT_SQL = "insert into documents (content, metadata, embedding) values (%s, %s, %b)"
+UPSERT_SQL = "insert into documents (id, content, metadata, embedding) values (%s, %s, %s, %b) on conflict (id) do "
+UPSERT_ACTIONS = {
+    True: "nothing",
+    False: "update set content = excluded.content, metadata = excluded.metadata, embedding = excluded.embedding",
+}
+
+SCHEMA_SQL = """
+create extension if not exists vector;
+
+create table if not exists documents (
+    id bigserial primary key,
+    content text,
+    metadata jsonb,
+    embedding vector(384)
+);
+
+create or replace function match_documents(query_embedding vector(384), match_threshold float, match_count int)
+returns table (id bigint, content text, metadata jsonb, similarity float)
+language sql stable as $$
+    select id, content, metadata, 1 - (embedding <=> query_embedding) as similarity
+    from documents
+    where 1 - (embedding <=> query_embedding) > match_threshold
+    order by embedding <=> query_embedding
+    limit match_count;
+$$;
+
+create or replace function kw_match_documents(query_text text, match_count int)
+returns table (id bigint, content text, metadata jsonb, similarity real)
+language sql stable as $$
+    select id, content, metadata,
+           ts_rank(to_tsvector('simple', content), plainto_tsquery('simple', query_text)) as similarity
+    from documents
+    where to_tsvector('simple', content) @@ plainto_tsquery('simple', query_text)
+    order by similarity desc
+    limit match_count;
+$$;
+"""
+
+
+def _vector(value):
+    return np.asarray(value, dtype=np.float32)
+
+
+class _PgTable:
+    def __init__(self, client):
+        self.client = client
+
+    def insert(self, rows):
+        rows = rows if isinstance(rows, list) else [rows]
+        return _Call(lambda: self.client.insert_documents(rows))
+
+    def upsert(self, rows, ignore_duplicates: bool = False):
+        rows = rows if isinstance(rows, list) else [rows]
+        return _Call(lambda: self.client.upsert_documents(rows, ignore_duplicates))
+
+
+class PostgresClient:
+    """Supabase-подобный клиент поверх пула psycopg."""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 5.0,
+                 statement_timeout: float = 5.0):
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+        from pgvector.psycopg import register_vector
+
+        self.dict_row = dict_row
+        # autocommit: поиск — только чтение, транзакция на каждый вызов не нужна;
+        # statement_timeout — аналог таймаута ноги в run_legs, только на стороне сервера
+        self.pool = ConnectionPool(dsn, min_size=min_size, max_size=max_size, timeout=timeout, open=True,
+                                   kwargs={"autocommit": True,
+                                           "options": f"-c statement_timeout={int(statement_timeout * 1000)}"},
+                                   configure=register_vector)
+
+    def _fetch(self, sql, params):
+        with self.pool.connection() as conn:
+            with conn.cursor(row_factory=self.dict_row) as cur:
+                cur.execute(sql, params, prepare=True)
+                return cur.fetchall()
+
+    def rpc(self, name, params):
+        if name == "match_documents":
+            return _Call(lambda: self._fetch(VECTOR_SQL, (
+                _vector(params["query_embedding"]), params.get("match_threshold", 0.0), params.get("match_count", 5))))
+        if name == "kw_match_documents":
+            return _Call(lambda: self._fetch(KEYWORD_SQL, (params["query_text"], params.get("match_count", 5))))
+        raise ValueError(f"Postgres-бэкенд не знает RPC '{name}'")
+
+    def search_both(self, query_embedding, query_text, match_threshold: float = 0.0, match_count: int = 5):
+        """Обе ноги одним пайплайном: запросы уходят вместе, ответы приходят за один сетевой обмен."""
+        with self.pool.connection() as conn:
+            with conn.pipeline(), \
+                    conn.cursor(row_factory=self.dict_row) as vector_cur, \
+                    conn.cursor(row_factory=self.dict_row) as keyword_cur:
+                vector_cur.execute(VECTOR_SQL, (_vector(query_embedding), match_threshold, match_count), prepare=True)
+                keyword_cur.execute(KEYWORD_SQL, (query_text, match_count), prepare=True)
+                return vector_cur.fetchall(), keyword_cur.fetchall()
+
+    def insert_documents(self, rows):
+        from psycopg.types.json import Jsonb
+
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            cur.executemany(INSERT_SQL, [
+                (row["content"], Jsonb(row.get("metadata") or {}), _vector(row["embedding"])) for row in rows
+            ])
+        return []
+
+    def upsert_documents(self, rows, ignore_duplicates: bool = False):
+        """Строки со своим id: повторная запись того же id не создаёт дубль."""
+        from psycopg.types.json import Jsonb
+
+        with self.pool.connection() as conn, conn.transaction(), conn.cursor() as cur:
+            cur.executemany(UPSERT_SQL + UPSERT_ACTIONS[ignore_duplicates], [
+                (row["id"], row["content"], Jsonb(row.get("metadata") or {}), _vector(row["embedding"]))
+                for row in rows
+            ])
+        return []
+
+    def table(self, name):
+        if name != "documents":
+            raise ValueError(f"Postgres-бэкенд пишет только в таблицу documents, а не '{name}'")
+        return _PgTable(self)
+
+    def close(self):
+        self.pool.close()
+
+
+def pipelined_legs(client, query_embedding, query_text, match_threshold, match_count):
+    """
+    Те же (results, stats), что у run_legs для ног vector и keyword, но одним запросом search_both.
+    Ошибка не роняет ответ: обе ноги пустые, как у упавших ног в run_legs.
+    """
+    start = time.perf_counter()
+    try:
+        vector, keyword = client.search_both(query_embedding, query_text, match_threshold, match_count)
+        status = "ok"
+    except Exception as e:
+        # QueryCanceled — сработал statement_timeout
+        status = "timeout" if type(e).__name__ == "QueryCanceled" else "error"
+        print(f"⚠️ Поиск в Postgres: {status} ({type(e).__name__}: {str(e)[:80]}) — продолжаю без него.")
+        vector, keyword = [], []
+    seconds = time.perf_counter() - start
+    return {"vector": vector, "keyword": keyword}, {"pipeline": {"status": status, "seconds": seconds}}
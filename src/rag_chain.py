@@ -1,9 +1,58 @@
+import time
+from typing import NamedTuple
+
 from langchain_ollama import OllamaLLM
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
+from .config import LLM_MODEL, OLLAMA_BASE_URL, CONTEXT_TOKENS
+from .context_packer import pack_context
 from .vectorstore import load_vectorstore
 
+
+class RagAnswer(NamedTuple):
+    answer: str
+    sources: list   # Ровно те документы, что попали в контекст LLM
+    timings: dict   # {"retrieve": сек, "generate": сек, "total": сек} (+ ttft, tokens, tokens_per_sec при стриминге)
+
+
+class StageTimer(BaseCallbackHandler):
+    """Засекает время поиска и генерации внутри цепочки через колбэки LangChain."""
+
+    def __init__(self):
+        self.started = {}
+        self.timings = {"retrieve": 0.0, "generate": 0.0}
+        self.eval_count = None  # Сколько токенов сгенерировала модель (Ollama сообщает в конце ответа)
+
+    def _start(self, run_id):
+        self.started[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage):
+        if run_id in self.started:
+            self.timings[stage] += time.perf_counter() - self.started.pop(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieve")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "generate")
+        info = response.generations[0][0].generation_info if response.generations and response.generations[0] else None
+        if info and info.get("eval_count"):
+            self.eval_count = info["eval_count"]
+
+
+def pack_docs(docs):
+    # Соседние чанки страницы склеиваются без повторов перекрытия, контекст ограничен CONTEXT_TOKENS
+    packed, _ = pack_context(docs, budget_tokens=CONTEXT_TOKENS, model=LLM_MODEL)
+    return packed
+
 def format_docs(docs):
     parts = []
     for d in docs:
@@ -11,13 +60,8 @@ def format_docs(docs):
         parts.append(f"Страница {page}:\n{d.page_content}")
     return "\n\n".join(parts)
 
-def create_rag_chain():
-    # Используем вашу Gemma 3
-    llm = OllamaLLM(model="gemma3:1b")
-
-    vectorstore = load_vectorstore()
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
+def create_answer_chain(llm):
+    """prompt | llm | parser: на входе {"question", "context"}, поиск уже сделан."""
     system_prompt = (
         "Ты — помощник. Отвечай ТОЛЬКО на основе контекста PDF.\n"
         "Если информации нет, скажи: 'В документе этого нет'.\n"
@@ -29,16 +73,89 @@ def create_rag_chain():
         ("human", "{question}"),
     ])
 
-    rag_chain = (
-        {"question": RunnablePassthrough(), "context": retriever | format_docs}
-        | prompt
-        | llm
-        | StrOutputParser()
+    return prompt | llm | StrOutputParser()
+
+def create_rag_chain(retriever=None):
+    # Используем вашу Gemma 3 (модель и адрес сервера — в config)
+    llm = OllamaLLM(model=LLM_MODEL, base_url=OLLAMA_BASE_URL)
+
+    if retriever is None:
+        vectorstore = load_vectorstore()
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+
+    answer_chain = create_answer_chain(llm)
+
+    # Поиск и упаковка выполняются один раз: упакованные документы идут и в промпт, и в источники.
+    # На выходе {"question", "docs", "answer"}
+    rag_chain = RunnableParallel(question=RunnablePassthrough(), docs=retriever | RunnableLambda(pack_docs)).assign(
+        answer=(lambda x: {"question": x["question"], "context": format_docs(x["docs"])}) | answer_chain
     )
 
     return rag_chain, retriever
 
+def answer_with_sources(chain, query: str) -> RagAnswer:
+    timer = StageTimer()
+    start = time.perf_counter()
+    result = chain.invoke(query, config={"callbacks": [timer]})
+    return RagAnswer(result["answer"], result["docs"], {**timer.timings, "total": time.perf_counter() - start})
+
+async def aanswer_with_sources(chain, query: str) -> RagAnswer:
+    """Асинхронный вариант для сервера: тот же chain, без блокировки event loop."""
+    timer = StageTimer()
+    start = time.perf_counter()
+    result = await chain.ainvoke(query, config={"callbacks": [timer]})
+    return RagAnswer(result["answer"], result["docs"], {**timer.timings, "total": time.perf_counter() - start})
+
+def _stream_timings(timer, start, first_token, chunks):
+    end = time.perf_counter()
+    tokens = timer.eval_count or chunks
+    decode_time = end - first_token if first_token is not None else 0.0
+    return {
+        **timer.timings,
+        "total": end - start,
+        # Сколько пользователь ждёт до первого символа ответа (поиск + разбор промпта)
+        "ttft": (first_token if first_token is not None else end) - start,
+        "tokens": tokens,
+        "tokens_per_sec": tokens / decode_time if decode_time > 0 else 0.0,
+    }
+
+def stream_answer_with_sources(chain, query: str, on_token=None) -> RagAnswer:
+    """
+    Потоковый вариант: on_token(текст) вызывается на каждый кусок ответа сразу по мере генерации.
+    Поиск по-прежнему один, источники возвращаются вместе с полным ответом.
+    """
+    timer = StageTimer()
+    start = time.perf_counter()
+    first_token, chunks, parts, docs = None, 0, [], []
+    for chunk in chain.stream(query, config={"callbacks": [timer]}):
+        if "docs" in chunk:
+            docs = chunk["docs"]
+        if chunk.get("answer"):
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunks += 1
+            parts.append(chunk["answer"])
+            if on_token:
+                on_token(chunk["answer"])
+    return RagAnswer("".join(parts), docs, _stream_timings(timer, start, first_token, chunks))
+
+async def astream_answer_with_sources(chain, query: str, on_token=None) -> RagAnswer:
+    timer = StageTimer()
+    start = time.perf_counter()
+    first_token, chunks, parts, docs = None, 0, [], []
+    async for chunk in chain.astream(query, config={"callbacks": [timer]}):
+        if "docs" in chunk:
+            docs = chunk["docs"]
+        if chunk.get("answer"):
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunks += 1
+            parts.append(chunk["answer"])
+            if on_token:
+                on_token(chunk["answer"])
+    return RagAnswer("".join(parts), docs, _stream_timings(timer, start, first_token, chunks))
+
 def ask_question(chain, retriever, query: str):
-    answer = chain.invoke(query)
-    sources = retriever.invoke(query)
-    return answer, sources
\ No newline at end of file
+    # retriever оставлен для совместимости: документы уже возвращает сам chain
+    answer, sources, _ = answer_with_sources(chain, query)
+    return answer, sources
@@ -0,0 +1,159 @@
+"""
+Каскадный реранкинг: Cross-Encoder оценивает только "голову" кандидатов и только пока укладывается в бюджет.
+
+1. Дешёвый этап: кандидаты уже отсортированы по RRF / косинусу bi-encoder'а, хвост отбрасывается
+   (кандидат с 20-го места почти никогда не попадает в итоговый топ-3).
+2. Cross-Encoder оценивает голову пачками по batch_size. Перед каждой пачкой проверяем бюджет:
+   если следующая пачка в него не влезет, останавливаемся. Первая пачка оценивается всегда.
+3. Оценки пар (вопрос, документ) кешируются (LRU): повторный вопрос почти не трогает модель.
+
+rerank_many — для пакетного режима: головы всех вопросов пачки оцениваются одним predict, без бюджета.
+
+Неоценённые документы идут после оценённых, в исходном порядке.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def query_key(question: str) -> str:
+    return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def doc_key(doc) -> str:
+    if doc.get("id") is not None:
+        return str(doc["id"])
+    return hashlib.sha1(doc["content"].encode("utf-8")).hexdigest()
+
+
+class CascadeReranker:
+    def __init__(self, model, head_size: int = 10, budget_ms: float = 200, batch_size: int = 16,
+                 cache_size: int = 10_000):
+        self.model = model
+        self.head_size = head_size
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (хеш вопроса, id документа) -> оценка
+        self.lock = threading.Lock()
+
+    def _cached(self, key):
+        with self.lock:
+            score = self.cache.get(key)
+            if score is not None:
+                self.cache.move_to_end(key)
+            return score
+
+    def _remember(self, keys, scores):
+        with self.lock:
+            for key, score in zip(keys, scores):
+                self.cache[key] = score
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _head(self, question, candidates, top_n, prior_scores=None):
+        """(кандидаты по порядку дешёвого этапа, голова, ключи кеша, оценки из кеша или None)."""
+        if prior_scores is not None:
+            order = sorted(range(len(candidates)), key=lambda i: prior_scores[i], reverse=True)
+            candidates = [candidates[i] for i in order]
+        head = candidates[:max(self.head_size, top_n)]
+        qkey = query_key(question)
+        keys = [(qkey, doc_key(doc)) for doc in head]
+        return candidates, head, keys, [self._cached(key) for key in keys]
+
+    @staticmethod
+    def _ranked(candidates, head, scores, top_n):
+        ranked = sorted(
+            ({"doc": doc, "score": score} for doc, score in zip(head, scores) if score is not None),
+            key=lambda item: item["score"], reverse=True,
+        )
+        ranked += [{"doc": doc, "score": None} for doc, score in zip(head, scores) if score is None]
+        if len(ranked) < top_n:
+            ranked += [{"doc": doc, "score": None} for doc in candidates[len(head):top_n]]
+        return ranked[:top_n]
+
+    def rerank(self, question: str, candidates, top_n: int = 3, prior_scores=None):
+        """
+        candidates — документы Supabase ({'id', 'content', ...}).
+        prior_scores — оценки дешёвого этапа (если нет, порядок candidates считается уже отсортированным).
+
+        Возвращает (ranked, info):
+            ranked = [{'doc': ..., 'score': оценка Cross-Encoder или None}], лучшие первыми, длиной top_n
+            info   = {"scored", "cached", "pruned", "skipped", "budget_hit", "seconds"}
+        """
+        start = time.perf_counter()
+        candidates, head, keys, scores = self._head(question, candidates, top_n, prior_scores)
+        cached = sum(s is not None for s in scores)
+
+        # Cross-Encoder только для тех, кого нет в кеше
+        pending = [i for i, s in enumerate(scores) if s is None]
+        budget = self.budget_ms / 1000
+        scored, budget_hit, batch_time = 0, False, 0.0
+        for b in range(0, len(pending), self.batch_size):
+            elapsed = time.perf_counter() - start
+            if b and elapsed + batch_time > budget:
+                budget_hit = True
+                break
+            batch = pending[b:b + self.batch_size]
+            t = time.perf_counter()
+            batch_scores = self.model.predict([[question, head[i]["content"]] for i in batch])
+            batch_time = time.perf_counter() - t
+            batch_scores = [float(s) for s in batch_scores]
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+            self._remember([keys[i] for i in batch], batch_scores)
+            scored += len(batch)
+
+        info = {
+            "scored": scored,
+            "cached": cached,
+            "pruned": len(candidates) - len(head),
+            "skipped": sum(s is None for s in scores),
+            "budget_hit": budget_hit,
+            "seconds": time.perf_counter() - start,
+        }
+        return self._ranked(candidates, head, scores, top_n), info
+
+    def rerank_many(self, requests):
+        """
+        Пакетный режим: requests — [(вопрос, кандидаты, top_n)]. Головы всех вопросов, которых нет в кеше,
+        оцениваются одним model.predict (внутри — пачками по batch_size). Бюджет здесь не действует:
+        пачке важна пропускная способность, а не задержка одного вопроса.
+
+        Возвращает [(ranked, info)] в порядке requests; info как у rerank, "seconds" — общее время пачки.
+        """
+        start = time.perf_counter()
+        heads = [self._head(question, candidates, top_n) for question, candidates, top_n in requests]
+        # Одинаковая пара у повторяющихся в пачке вопросов оценивается один раз
+        pairs, pair_keys, slots = [], {}, []
+        for r, (question, _, _) in enumerate(requests):
+            _, head, keys, scores = heads[r]
+            for i, score in enumerate(scores):
+                if score is None:
+                    if keys[i] not in pair_keys:
+                        pair_keys[keys[i]] = len(pairs)
+                        pairs.append([question, head[i]["content"]])
+                    slots.append((r, i, pair_keys[keys[i]]))
+        if pairs:
+            batch_scores = [float(s) for s in self.model.predict(pairs, batch_size=self.batch_size)]
+            for r, i, p in slots:
+                heads[r][3][i] = batch_scores[p]
+            self._remember(list(pair_keys), batch_scores)
+        seconds = time.perf_counter() - start
+
+        results = []
+        for r, (_, _, top_n) in enumerate(requests):
+            candidates, head, _, scores = heads[r]
+            scored = sum(slot[0] == r for slot in slots)  # включая пары, общие с другим вопросом
+            info = {
+                "scored": scored,
+                "cached": len(head) - scored,
+                "pruned": len(candidates) - len(head),
+                "skipped": 0,
+                "budget_hit": False,
+                "seconds": seconds,
+            }
+            results.append((self._ranked(candidates, head, scores, top_n), info))
+        return results
@@ -0,0 +1,82 @@
+"""
+Параллельный запуск "ног" гибридного поиска (векторной, ключевой и т.д.).
+
+Каждая нога — отдельный RPC-запрос, поэтому выполняем их одновременно в пуле потоков:
+время поиска = max(ноги), а не сумма. Нога, не уложившаяся в таймаут или упавшая,
+просто даёт пустой список — ответ строится по тем, что успели.
+
+Таймаут ноги отсчитывается с момента, когда она начала выполняться, а не с постановки в пул:
+при занятом пуле нога сначала ждёт свободный поток (тоже не дольше таймаута), и это не съедает её время.
+Много одновременных вопросов (пакетный режим) лучше гонять через свой пул: run_legs(..., executor=пул).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# Общий пул на процесс: потоки не создаются заново на каждый вопрос
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="retrieval")
+
+
+class _Leg:
+    """Нога в пуле: запоминает, когда начала выполняться."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.started = threading.Event()
+        self.start = None
+
+    def __call__(self):
+        self.start = time.perf_counter()
+        self.started.set()
+        result = self.fn()
+        return result, time.perf_counter() - self.start
+
+
+def run_legs(legs: dict, timeout=5.0, executor=None):
+    """
+    legs: {"vector": callable, "keyword": callable, ...}
+    timeout: секунды на ногу (число или словарь {имя: секунды}).
+    executor: пул для ног (по умолчанию общий на процесс).
+
+    Возвращает (results, stats):
+        results = {имя: список документов (пустой, если нога не ответила)}
+        stats   = {имя: {"status": "ok" | "timeout" | "error", "seconds": float}}
+    """
+    executor = executor or _executor
+    start = time.perf_counter()
+    running = {name: _Leg(fn) for name, fn in legs.items()}
+    futures = {name: executor.submit(leg) for name, leg in running.items()}
+
+    results, stats = {}, {}
+    for name, future in futures.items():
+        leg = running[name]
+        leg_timeout = timeout.get(name, 5.0) if isinstance(timeout, dict) else timeout
+        # Ждём, пока нога получит поток, затем — только остаток её таймаута от начала выполнения
+        started = leg.started.wait(max(0.0, start + leg_timeout - time.perf_counter()))
+        if not started and future.cancel():
+            results[name] = []
+            stats[name] = {"status": "timeout", "seconds": time.perf_counter() - start}
+            print(f"⚠️ Поиск '{name}' не дождался свободного потока за {leg_timeout} сек — продолжаю без него.")
+            continue
+        leg.started.wait()  # cancel() не удался — нога уже стартовала
+        remaining = max(0.0, leg.start + leg_timeout - time.perf_counter())
+        try:
+            value, seconds = future.result(timeout=remaining)
+            results[name] = value or []
+            stats[name] = {"status": "ok", "seconds": seconds}
+        except TimeoutError:
+            results[name] = []
+            stats[name] = {"status": "timeout", "seconds": time.perf_counter() - start}
+            print(f"⚠️ Поиск '{name}' не уложился в {leg_timeout} сек — продолжаю без него.")
+        except Exception as e:
+            results[name] = []
+            stats[name] = {"status": "error", "seconds": time.perf_counter() - start}
+            print(f"⚠️ Поиск '{name}' упал ({type(e).__name__}: {str(e)[:80]}) — продолжаю без него.")
+    return results, stats
+
+
+def format_leg_stats(stats) -> str:
+    return " | ".join(
+        f"{name}={s['seconds']:.3f}s" + ("" if s["status"] == "ok" else f" ({s['status']})")
+        for name, s in stats.items()
+    )
@@ -0,0 +1,201 @@
+"""
+Семантический кеш ответов: вопрос ищется не по точной строке, а по близости эмбеддинга.
+
+"Кто источник власти?" и "кто является источником власти" дают близкие векторы,
+поэтому второй вопрос получает готовый ответ без поиска, реранкинга и вызова GPT.
+
+- сначала точное совпадение нормализованного вопроса, потом косинусная близость >= threshold;
+- вытеснение LRU + TTL;
+- необязательное сохранение на диск;
+- сброс при смене версии корпуса (после переиндексации документов);
+- счётчики hit / miss / near-miss (близко к порогу, но не дотянули — полезно для настройки порога).
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).lower().replace("ё", "е")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def read_corpus_version(path) -> str:
+    """Версия корпуса, которую пишет ingest_supabase после успешной загрузки."""
+    try:
+        return Path(path).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return ""
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.9, maxsize: int = 1000, ttl: float = 3600,
+                 near_miss_margin: float = 0.05, persist_path=None, version: str = ""):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.near_miss_margin = near_miss_margin
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.version = version
+        self.lock = threading.Lock()
+
+        # ключ (нормализованный вопрос) -> запись; порядок = LRU (последний — самый свежий)
+        self.entries = OrderedDict()
+        self.vectors = None  # матрица (maxsize, dim), строки нормированы
+        self.free_rows = list(range(maxsize - 1, -1, -1))
+        self.counters = {"hits": 0, "semantic_hits": 0, "misses": 0, "near_misses": 0, "evictions": 0,
+                         "expired": 0, "invalidations": 0}
+
+        if self.persist_path and (self.persist_path / "entries.json").exists():
+            self.load()
+
+    # --- служебное ---
+
+    def _release(self, key):
+        entry = self.entries.pop(key)
+        self.free_rows.append(entry["row"])
+
+    def _expire(self, now):
+        expired = [k for k, e in self.entries.items() if now - e["created"] > self.ttl]
+        for key in expired:
+            self._release(key)
+        self.counters["expired"] += len(expired)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    # --- API ---
+
+    def ensure_version(self, version: str):
+        """Если корпус переиндексирован — старые ответы больше не верны, очищаем кеш."""
+        with self.lock:
+            if version == self.version:
+                return
+            if self.entries:
+                print(f"♻️ Корпус изменился — очищаю семантический кеш ({len(self.entries)} ответов).")
+            for key in list(self.entries):
+                self._release(key)
+            self.version = version
+            self.counters["invalidations"] += 1
+
+    def lookup(self, question: str, vector):
+        """
+        Возвращает (ответ или None, info), где info = {"type": "exact" | "semantic" | "near_miss" | "miss",
+        "similarity": float, "question": вопрос из кеша}.
+        """
+        key = normalize_question(question)
+        with self.lock:
+            self._expire(time.time())
+
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                entry = self.entries[key]
+                return entry["answer"], {"type": "exact", "similarity": 1.0, "question": entry["question"]}
+
+            if not self.entries:
+                self.counters["misses"] += 1
+                return None, {"type": "miss", "similarity": 0.0, "question": None}
+
+            keys = list(self.entries)
+            rows = np.array([self.entries[k]["row"] for k in keys])
+            similarities = self.vectors[rows] @ self._unit(vector)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            entry = self.entries[keys[best]]
+
+            if similarity >= self.threshold:
+                self.entries.move_to_end(keys[best])
+                self.counters["hits"] += 1
+                self.counters["semantic_hits"] += 1
+                return entry["answer"], {"type": "semantic", "similarity": similarity, "question": entry["question"]}
+
+            self.counters["misses"] += 1
+            kind = "miss"
+            if similarity >= self.threshold - self.near_miss_margin:
+                self.counters["near_misses"] += 1
+                kind = "near_miss"
+            return None, {"type": kind, "similarity": similarity, "question": entry["question"]}
+
+    def store(self, question: str, vector, answer, sources=None):
+        key = normalize_question(question)
+        vector = self._unit(vector)
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            if key in self.entries:
+                self._release(key)
+            while not self.free_rows:
+                # LRU: выкидываем самый давно использованный ответ
+                self._release(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+            row = self.free_rows.pop()
+            self.vectors[row] = vector
+            self.entries[key] = {
+                "question": question,
+                "answer": answer,
+                "sources": sources or [],
+                "created": time.time(),
+                "row": row,
+            }
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+            }
+
+    # --- диск ---
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self.lock:
+            self.persist_path.mkdir(parents=True, exist_ok=True)
+            keys = list(self.entries)
+            vectors = (
+                self.vectors[[self.entries[k]["row"] for k in keys]]
+                if keys else np.zeros((0, 0), dtype=np.float32)
+            )
+            data = {
+                "version": self.version,
+                "entries": [{"key": k, **{f: v for f, v in self.entries[k].items() if f != "row"}} for k in keys],
+            }
+            np.save(self.persist_path / "vectors.npy", vectors)
+            tmp_path = self.persist_path / "entries.json.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            # entries.json пишется последним: без него векторы не читаются
+            os.replace(tmp_path, self.persist_path / "entries.json")
+
+    def load(self):
+        with open(self.persist_path / "entries.json", encoding="utf-8") as f:
+            data = json.load(f)
+        vectors = np.load(self.persist_path / "vectors.npy")
+        if data["version"] != self.version and self.version:
+            print("♻️ Сохранённый кеш от другой версии корпуса — не загружаю.")
+            return
+        self.version = data["version"]
+        now = time.time()
+        for entry, vector in zip(data["entries"][-self.maxsize:], vectors[-self.maxsize:]):
+            if now - entry["created"] > self.ttl:
+                continue
+            key = entry.pop("key")
+            self.store(entry["question"], vector, entry["answer"], entry.get("sources"))
+            self.entries[key]["created"] = entry["created"]
@@ -0,0 +1,67 @@
+"""
+Процесс-шард ShardedSearch: точный top-k по своему диапазону строк MmapVectorStore.
+
+Отдельный модуль ради запуска: при spawn дочерний процесс импортирует главный модуль родителя,
+а ShardedSearch.start() на это время подставляет этот. Поэтому здесь только numpy и mmap_store —
+никаких тяжёлых импортов на верхнем уровне.
+"""
+import queue
+
+import numpy as np
+
+from .mmap_store import MmapVectorStore, SEARCH_BLOCK
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def search_range(store, queries, ks, start: int, end: int):
+    """
+    Точный top-k пачки запросов по строкам [start, end): [(строки, близость)] на запрос, по убыванию.
+    Диапазон читается один раз на всю пачку, на каждом блоке держим только кандидатов.
+    """
+    queries = _normalize(queries)
+    k_max = max(ks)
+    best_rows = [np.empty(0, dtype=np.int64) for _ in ks]
+    best_scores = [np.empty(0, dtype=np.float32) for _ in ks]
+    for block_start in range(start, end, SEARCH_BLOCK):
+        block_end = min(block_start + SEARCH_BLOCK, end)
+        block = np.asarray(store.vectors[block_start:block_end], dtype=np.float32)
+        scores = (queries @ block.T) * store.scales[block_start:block_end]
+        k = min(k_max, block_end - block_start)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for i in range(len(ks)):
+            best_rows[i] = np.concatenate([best_rows[i], top[i] + block_start])
+            best_scores[i] = np.concatenate([best_scores[i], scores[i, top[i]]])
+    out = []
+    for rows, scores, k in zip(best_rows, best_scores, ks):
+        order = np.argsort(-scores)[:k]
+        out.append((rows[order], scores[order]))
+    return out
+
+
+def _shard_worker(shard: int, path: str, start: int, end: int, requests, results, batch: int):
+    store = MmapVectorStore(path, readonly=True)
+    results.put(("ready", shard, None))
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+        items, stop = [item], False
+        # Всё, что успело накопиться в очереди, считаем одним проходом по диапазону
+        while len(items) < batch:
+            try:
+                item = requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            items.append(item)
+        query_ids, vectors, ks = zip(*items)
+        found = search_range(store, np.stack(vectors), ks, start, end)
+        results.put(("result", shard, list(zip(query_ids, found))))
+        if stop:
+            return
@@ -0,0 +1,169 @@
+"""
+Шардированный поиск по MmapVectorStore: scatter-gather по процессам-воркерам.
+
+Хранилище делится на N диапазонов строк [start, end), каждый обслуживает свой процесс.
+Воркеры открывают те же файлы только на чтение — страницы делятся через page cache, копии корпуса нет.
+
+    координатор --запрос--> все шарды (очередь на шард)
+    шард: точный top-k по своему диапазону (блоками, пачкой из накопившихся в очереди запросов)
+    шарды --(строки, близость)--> общая очередь ответов -> поток-диспетчер -> heapq.merge в общий top-k
+
+Шард, не ответивший за timeout, пропускается: возвращается частичный результат (answered < shards),
+его поздний ответ отбрасывается. Задержка одного запроса делится на число шардов (ядер),
+а пачки запросов в воркере дают пропускную способность при многих одновременных вопросах.
+
+Диапазоны фиксируются при start(): после дозаписи в хранилище поиск нужно перезапустить.
+Воркеры запускаются через spawn, а не fork: к моменту start() в процессе уже есть потоки torch/токенизатора,
+и fork копирует их блокировки в занятом состоянии. При spawn дочерний процесс заново импортирует главный модуль
+родителя (у semantic_search_pro это torch, sentence_transformers и qdrant_client — секунды запуска и сотни МБ
+на шард), поэтому на время запуска главным модулем объявляется лёгкий src/shard_worker.py: numpy и mmap_store.
+"""
+import heapq
+import itertools
+import multiprocessing as mp
+import sys
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from . import shard_worker
+from .mmap_store import MmapVectorStore, Hit
+from .shard_worker import search_range, _shard_worker
+
+ShardedResult = namedtuple("ShardedResult", ["hits", "answered", "shards"])
+WORKER_BATCH = 32     # Сколько ожидающих запросов воркер считает за один проход по диапазону
+START_TIMEOUT = 60.0  # Сколько ждём готовности воркеров при start()
+START_METHOD = "spawn"  # Не fork: родитель многопоточный (модели, пулы)
+
+
+def shard_ranges(count: int, shards: int):
+    """Диапазоны строк [start, end) почти равного размера."""
+    bounds = np.linspace(0, count, shards + 1).astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+@contextmanager
+def _worker_main():
+    """
+    На время start() главный модуль — src.shard_worker: spawn берёт из него, что импортировать в дочернем
+    процессе вместо __main__ родителя. Process.start() готовит эти данные синхронно, после него подмена снята.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = shard_worker
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class _Pending:
+    def __init__(self, shards: int):
+        self.parts = []
+        self.left = shards
+        self.done = threading.Event()
+
+
+class ShardedSearch:
+    def __init__(self, path, shards: int = None, timeout: float = 1.0, batch: int = WORKER_BATCH):
+        self.path = str(path)
+        self.store = MmapVectorStore(path, readonly=True)  # Координатору — для id и payload найденных строк
+        self.shards = max(1, min(shards or mp.cpu_count(), self.store.count or 1))
+        self.timeout = timeout
+        self.batch = batch
+        self.ranges = shard_ranges(self.store.count, self.shards)
+
+        self.lock = threading.Lock()
+        self.pending = {}  # id запроса -> _Pending
+        self._ids = itertools.count()
+        self.counters = {"queries": 0, "partial": 0, "late": 0}
+        self.workers = []
+        self.requests = []
+        self.results = None
+        self._dispatcher = None
+
+    def start(self):
+        context = mp.get_context(START_METHOD)
+        self.results = context.Queue()
+        for shard, (start, end) in enumerate(self.ranges):
+            requests = context.Queue()
+            worker = context.Process(target=_shard_worker, daemon=True,
+                                args=(shard, self.path, start, end, requests, self.results, self.batch))
+            with _worker_main():
+                worker.start()
+            self.requests.append(requests)
+            self.workers.append(worker)
+        for _ in self.workers:
+            self.results.get(timeout=START_TIMEOUT)  # ("ready", шард, None) от каждого воркера
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        print(f"🧩 Шардированный поиск: {self.shards} процессов по {self.store.count} векторам")
+        return self
+
+    def _dispatch(self):
+        """Раскладывает ответы шардов по ожидающим запросам."""
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            _, shard, found = message
+            with self.lock:
+                for query_id, part in found:
+                    pending = self.pending.get(query_id)
+                    if pending is None:
+                        self.counters["late"] += 1  # Запрос уже ответил частично — ответ опоздал
+                        continue
+                    pending.parts.append(part)
+                    pending.left -= 1
+                    if not pending.left:
+                        pending.done.set()
+
+    def search_rows(self, query, k: int = 10, timeout: float = None):
+        """(строки, близость, сколько шардов ответило) — общий top-k по ответам шардов."""
+        query = np.asarray(query, dtype=np.float32)
+        query_id = next(self._ids)
+        pending = _Pending(self.shards)
+        with self.lock:
+            self.pending[query_id] = pending
+        for requests in self.requests:
+            requests.put((query_id, query, k))
+        pending.done.wait(self.timeout if timeout is None else timeout)
+        with self.lock:
+            del self.pending[query_id]
+            parts = list(pending.parts)
+            self.counters["queries"] += 1
+            if len(parts) < self.shards:
+                self.counters["partial"] += 1
+
+        # Списки шардов уже отсортированы по убыванию: слияние кучей, берём первые k
+        merged = list(itertools.islice(heapq.merge(
+            *(zip(scores.tolist(), rows.tolist()) for rows, scores in parts), key=lambda pair: -pair[0]), k))
+        rows = np.array([row for _, row in merged], dtype=np.int64)
+        scores = np.array([score for score, _ in merged], dtype=np.float32)
+        return rows, scores, len(parts)
+
+    def search(self, query, k: int = 10, timeout: float = None) -> ShardedResult:
+        rows, scores, answered = self.search_rows(query, k, timeout)
+        self.store.refresh()  # Payload'ы могли переписать (compact) — строки читаем по свежим файлам
+        hits = [Hit(self.store.point_id(int(r)), float(s), self.store.payload(int(r))) for r, s in zip(rows, scores)]
+        return ShardedResult(hits, answered, self.shards)
+
+    def close(self):
+        for requests in self.requests:
+            requests.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if self.results is not None:
+            self.results.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=5)
+        self.workers, self.requests = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
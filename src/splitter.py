@@ -1,15 +1,226 @@
+import re
+from bisect import bisect_left
+import numpy as np
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from .config import CHUNK_SIZE, CHUNK_OVERLAP
+from .config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    SPLITTER_MODE,
+    TOKENIZER_NAME,
+    CHUNK_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    SEMANTIC_THRESHOLD_TYPE,
+    SEMANTIC_THRESHOLD_AMOUNT,
+    SEMANTIC_BUFFER_SIZE,
+    SEMANTIC_BATCH_SIZE,
+)
 
+# Граница предложения (после . ! ? …) или абзаца (пустая строка)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
 
-def split_documents(docs):
+_tokenizer = None
+
+
+def get_tokenizer():
+    """
+    Быстрый (Rust) токенизатор той же модели, что считает эмбеддинги.
+    Загружается один раз на процесс.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        from tokenizers import Tokenizer
+        _tokenizer = Tokenizer.from_pretrained(TOKENIZER_NAME)
+        _tokenizer.no_truncation()
+        _tokenizer.no_padding()
+    return _tokenizer
+
+
+def split_documents(docs, mode: str = SPLITTER_MODE):
     """
     Разбивает документы на чанки.
+    mode="recursive" — по символам (CHUNK_SIZE), mode="tokens" — по токенам модели эмбеддингов,
+    mode="semantic" — по смысловым границам между предложениями.
+    """
+    if mode == "tokens":
+        chunks = split_documents_by_tokens(docs)
+    elif mode == "semantic":
+        chunks = split_documents_semantic(docs)
+    else:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            add_start_index=True,
+        )
+        chunks = splitter.split_documents(docs)
+    print(f"[SPLITTER] Число чанков после разбиения ({mode}): {len(chunks)}")
+    return chunks
+
+
+def token_spans(text: str, encoding, max_tokens: int, overlap_tokens: int):
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-    )
-    chunks = splitter.split_documents(docs)
-    print(f"[SPLITTER] Число чанков после разбиения: {len(chunks)}")
+    Режет уже токенизированный текст на куски по max_tokens токенов,
+    стараясь резать по границам предложений/абзацев.
+    Возвращает [(start_char, end_char, n_tokens), ...].
+    """
+    offsets = encoding.offsets
+    n = len(offsets)
+    if n == 0:
+        return []
+    starts = [o[0] for o in offsets]
+
+    # Границы предложений в индексах токенов
+    bounds = [0]
+    for m in _SENTENCE_END.finditer(text):
+        t = bisect_left(starts, m.end())
+        if bounds[-1] < t < n:
+            bounds.append(t)
+    bounds.append(n)
+
+    # Предложения длиннее лимита режем по токенам
+    units = []
+    for a, b in zip(bounds, bounds[1:]):
+        while b - a > max_tokens:
+            units.append((a, a + max_tokens))
+            a += max_tokens
+        units.append((a, b))
+
+    spans = []
+    i = 0
+    while i < len(units):
+        start = units[i][0]
+        j = i + 1
+        while j < len(units) and units[j][1] - start <= max_tokens:
+            j += 1
+        end = units[j - 1][1]
+        spans.append((offsets[start][0], offsets[end - 1][1], end - start))
+        if j == len(units):
+            break
+        # Перекрытие целыми предложениями, не больше overlap_tokens
+        k = j
+        while k - 1 > i and end - units[k - 1][0] <= overlap_tokens:
+            k -= 1
+        i = k
+    return spans
+
+
+def split_documents_by_tokens(docs, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """
+    Чанки размером в токенах модели эмбеддингов (ничего не обрезается при эмбеддинге).
+    В metadata добавляются start_index/end_index (смещения в тексте страницы) и tokens.
+    """
+    docs = list(docs)
+    tokenizer = get_tokenizer()
+    # Токенизируем все страницы одним пакетным вызовом (параллельно внутри Rust)
+    encodings = tokenizer.encode_batch([d.page_content for d in docs], add_special_tokens=False)
+
+    chunks = []
+    for doc, encoding in zip(docs, encodings):
+        text = doc.page_content
+        for start, end, n_tokens in token_spans(text, encoding, max_tokens, overlap_tokens):
+            metadata = dict(doc.metadata)
+            metadata.update({"start_index": start, "end_index": end, "tokens": n_tokens})
+            chunks.append(Document(page_content=text[start:end], metadata=metadata))
+    return chunks
+
+
+# Значения порога по умолчанию (как в SemanticChunker из langchain_experimental)
+DEFAULT_THRESHOLDS = {
+    "percentile": 95,
+    "standard_deviation": 3,
+    "interquartile": 1.5,
+    "gradient": 95,
+}
+
+
+def sentence_spans(text: str):
+    """
+    Предложения/абзацы текста как [(start_char, end_char), ...] без крайних пробелов.
+    """
+    spans = []
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        if text[start:m.start()].strip():
+            spans.append((start, m.start()))
+        start = m.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+def breakpoints(distances, threshold_type: str = SEMANTIC_THRESHOLD_TYPE, amount=SEMANTIC_THRESHOLD_AMOUNT):
+    """
+    Индексы i, после которых нужно резать (distances[i] — расстояние между предложениями i и i+1).
+    """
+    if len(distances) == 0:
+        return np.empty(0, dtype=int)
+    if amount is None:
+        amount = DEFAULT_THRESHOLDS[threshold_type]
+    if threshold_type == "percentile":
+        values, threshold = distances, np.percentile(distances, amount)
+    elif threshold_type == "standard_deviation":
+        values, threshold = distances, distances.mean() + amount * distances.std()
+    elif threshold_type == "interquartile":
+        q1, q3 = np.percentile(distances, [25, 75])
+        values, threshold = distances, distances.mean() + amount * (q3 - q1)
+    elif threshold_type == "gradient":
+        values = np.gradient(distances) if len(distances) > 1 else distances
+        threshold = np.percentile(values, amount)
+    else:
+        raise ValueError(f"Неизвестный тип порога: {threshold_type}")
+    return np.flatnonzero(values > threshold)
+
+
+def split_documents_semantic(docs, embeddings=None, threshold_type: str = SEMANTIC_THRESHOLD_TYPE,
+                             amount=SEMANTIC_THRESHOLD_AMOUNT, max_tokens: int = CHUNK_TOKENS):
+    """
+    Семантический чанкинг: режем там, где соседние предложения далеки по смыслу.
+
+    Эмбеддинги всех предложений всех страниц считаются большими пачками
+    (а не по одному HTTP-запросу), косинусные расстояния — одной операцией NumPy.
+    Чанки длиннее max_tokens дорезаются по токенам.
+    """
+    if embeddings is None:
+        from .vectorstore import get_embeddings
+        embeddings = get_embeddings()
+    docs = list(docs)
+
+    # 1. Предложения всех страниц + окна с соседями (buffer_size) для эмбеддинга
+    doc_spans = [sentence_spans(d.page_content) for d in docs]
+    windows = []
+    for doc, spans in zip(docs, doc_spans):
+        for i in range(len(spans)):
+            lo = max(0, i - SEMANTIC_BUFFER_SIZE)
+            hi = min(len(spans) - 1, i + SEMANTIC_BUFFER_SIZE)
+            windows.append(doc.page_content[spans[lo][0]:spans[hi][1]])
+
+    # 2. Эмбеддинги пачками
+    vectors = []
+    for start in range(0, len(windows), SEMANTIC_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(windows[start:start + SEMANTIC_BATCH_SIZE]))
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(windows), -1)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    # 3. Границы по порогу на массиве косинусных расстояний, потом ограничение по токенам
+    tokenizer = get_tokenizer()
+    chunks = []
+    offset = 0
+    for doc, spans in zip(docs, doc_spans):
+        text = doc.page_content
+        page_vectors = vectors[offset:offset + len(spans)]
+        offset += len(spans)
+        if not spans:
+            continue
+        distances = 1.0 - np.einsum("ij,ij->i", page_vectors[:-1], page_vectors[1:])
+        cuts = breakpoints(distances, threshold_type, amount)
+        group_starts = np.concatenate(([0], cuts + 1))
+        group_ends = np.concatenate((cuts, [len(spans) - 1]))
+
+        groups = [(spans[a][0], spans[b][1]) for a, b in zip(group_starts, group_ends)]
+        encodings = tokenizer.encode_batch([text[a:b] for a, b in groups], add_special_tokens=False)
+        for (start, end), encoding in zip(groups, encodings):
+            for sub_start, sub_end, n_tokens in token_spans(text[start:end], encoding, max_tokens, 0):
+                metadata = dict(doc.metadata)
+                metadata.update({"start_index": start + sub_start, "end_index": start + sub_end, "tokens": n_tokens})
+                chunks.append(Document(page_content=text[start + sub_start:start + sub_end], metadata=metadata))
     return chunks
@@ -1,11 +1,15 @@
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
-from .config import VECTORSTORE_DIR
+from .config import VECTORSTORE_DIR, EMBEDDING_MODEL, OLLAMA_BASE_URL
+from .embedding_cache import cached_embeddings
+
+def get_embeddings():
+    # Используем вашу скачанную модель all-minilm (с дисковым кешем, если он включён)
+    return cached_embeddings(OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_BASE_URL), EMBEDDING_MODEL)
 
 def build_vectorstore(chunks):
     print(f"[VECTORSTORE] Создаю Chroma в {VECTORSTORE_DIR}")
-    # Используем вашу скачанную модель all-minilm
-    embeddings = OllamaEmbeddings(model="all-minilm") 
+    embeddings = get_embeddings()
     vs = Chroma.from_documents(
         chunks,
         embedding=embeddings,
@@ -16,7 +20,7 @@ def build_vectorstore(chunks):
 
 def load_vectorstore():
     print(f"[VECTORSTORE] Загружаю Chroma из {VECTORSTORE_DIR}")
-    embeddings = OllamaEmbeddings(model="all-minilm")
+    embeddings = get_embeddings()
     vs = Chroma(
         embedding_function=embeddings,
         persist_directory=str(VECTORSTORE_DIR)
@@ -0,0 +1,27 @@
+from src.local_hybrid import stem, tokenize
+
+
+def test_kazakh_without_special_letters():
+    """Казахское слово без особых букв стеммится по-казахски (падеж, затем множественное число)"""
+    assert tokenize("азаматтарына") == ["азамат"]
+
+
+def test_kazakh_forms_share_stem():
+    """Разные падежи казахского слова дают одну основу"""
+    assert tokenize("азаматтарына азаматтарға азаматтың") == ["азамат"] * 3
+
+
+def test_kazakh_text_detected_as_whole():
+    """В казахском тексте и голое множественное число считается казахским"""
+    assert tokenize("Қазақстан азаматтар")[1] == "азамат"
+
+
+def test_russian_noun_forms_share_stem():
+    """Окончания "на", "ны" у существительного не съедают основу: страна/страны/стране/странами"""
+    stems = {stem(word) for word in ["страна", "страны", "стране", "странами"]}
+    assert stems == {"стран"}
+
+
+def test_russian_not_mistaken_for_kazakh():
+    """Русские слова на -тары/-лары не принимаются за казахские"""
+    assert tokenize("доллары гектары") == ["доллар", "гектар"]